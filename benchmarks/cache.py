@@ -0,0 +1,42 @@
+"""Parsing against loading from the parse cache, for synthetic shapes graphs.
+
+Run from the repository root:
+
+    python -m benchmarks.cache [shapes ...]
+"""
+import sys
+import tempfile
+import time
+
+from slsparser.shapels import parse
+from slsparser.cache import ParseCache, fingerprint
+
+from benchmarks.generate import shapes_graph
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [100, 1000, 5000]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ParseCache(directory)
+        for size in sizes:
+            graph = shapes_graph(size)
+            expected, parsing = _timed(parse, graph)
+            _, fingerprinting = _timed(fingerprint, graph)
+            _, miss = _timed(cache.parse, graph)
+            graph = shapes_graph(size)  # the same graph, new blank nodes
+            (definitions, _), hit = _timed(cache.parse, graph)
+            assert len(definitions) == len(expected[0])
+            print(f'{size:6} shapes ({len(graph)} triples): parse {parsing:6.3f} s   '
+                  f'miss {miss:6.3f} s   hit {hit:6.3f} s '
+                  f'(fingerprint {fingerprinting:6.3f} s)')
+        print(f'{cache.hits} hits, {cache.misses} misses, {cache.invalidations} invalidations')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Path evaluation over the CSR backend against rdflib traversal.
+
+Needs numpy. Run from the repository root:
+
+    python -m benchmarks.csr
+"""
+import time
+
+from rdflib import Namespace, RDF, RDFS
+
+from slsparser.pathls import PANode, POp
+from slsparser.pathevaluate import PathEvaluator
+from slsparser.csr import CSRGraph, CSRPathEvaluator
+
+from benchmarks.generate import synthetic_data_graph
+
+EX = Namespace('http://ex.tt/')
+
+
+def _prop(predicate):
+    return PANode(POp.PROP, [predicate])
+
+
+PATHS = [
+    ('rdf:type/rdfs:subClassOf*', PANode(POp.COMP, [
+        _prop(RDF.type), PANode(POp.KLEENE, [_prop(RDFS.subClassOf)])]), 1.0),
+    ('knows/knows', PANode(POp.COMP, [_prop(EX.knows), _prop(EX.knows)]), 1.0),
+    ('^knows/(knows|^knows)', PANode(POp.COMP, [
+        PANode(POp.INV, [_prop(EX.knows)]),
+        PANode(POp.ALT, [_prop(EX.knows), PANode(POp.INV, [_prop(EX.knows)])])]), 1.0),
+    ('knows{0,3}', PANode(POp.COMP, [PANode(POp.ZEROORONE, [_prop(EX.knows)])] * 3), 0.1),
+]
+
+
+def _time(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    for instances in (2000, 20000):
+        graph = synthetic_data_graph(instances)
+        build, csr = _time(lambda: CSRGraph(graph))
+        print(f'{len(graph)} triples (CSR build {build * 1000:.0f} ms):')
+        for label, path, fraction in PATHS:
+            starts = [EX[f'i{i}'] for i in range(int(instances * fraction))]
+            rdflib_time, expected = _time(lambda: PathEvaluator(graph).pairs(path, starts))
+            csr_time, result = _time(lambda: CSRPathEvaluator(csr).pairs(path, starts))
+            assert result == expected
+            print(f'  {label:28} {len(starts):6} starts   rdflib {rdflib_time * 1000:8.0f} ms'
+                  f'   csr {csr_time * 1000:8.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Synthetic shapes graphs for the benchmarks."""
+import random
+
+from rdflib import Graph, Namespace, BNode, Literal, RDF, RDFS, SH, XSD
+from rdflib.collection import Collection
+
+EX = Namespace('http://ex.tt/')
+
+
+def shapes_graph(shapes: int, fanout: int = 3, list_length: int = 2,
+                 path_depth: int = 1, reference_depth: int = 2, seed: int = 0) -> Graph:
+    """A shapes graph of node shapes with exactly fanout property shapes each,
+    and one sh:and, sh:or or sh:xone list of list_length members. Every path
+    is nested path_depth levels deep (1 is a plain predicate). The shapes form
+    sh:node chains of reference_depth references (0 for none): expanding the
+    first shape of a chain inlines the next reference_depth shapes."""
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(shapes):
+        shape = EX[f'shape{i}']
+        graph.add((shape, RDF.type, SH.NodeShape))
+        graph.add((shape, SH.targetClass, EX[f'Class{i % 50}']))
+        for j in range(fanout):
+            prop = BNode()
+            graph.add((shape, SH.property, prop))
+            graph.add((prop, SH.path, _nested_path(graph, rng, path_depth)))
+            graph.add((prop, SH.minCount, Literal(rng.randint(0, 2))))
+            if rng.random() < 0.5:
+                graph.add((prop, SH.datatype, rng.choice([XSD.string, XSD.integer])))
+            else:
+                graph.add((prop, SH['class'], EX[f'Class{rng.randrange(50)}']))
+            if j == 0 and reference_depth and (i + 1) % (reference_depth + 1):
+                graph.add((prop, SH.node, EX[f'shape{i + 1}']))
+        if list_length:
+            members = []
+            for _ in range(list_length):
+                member = BNode()
+                if rng.random() < 0.5:
+                    graph.add((member, SH.minLength, Literal(rng.randint(1, 9))))
+                else:
+                    graph.add((member, SH['class'], EX[f'Class{rng.randrange(50)}']))
+                members.append(member)
+            head = BNode()
+            Collection(graph, head, members)
+            graph.add((shape, rng.choice([SH['and'], SH['or'], SH.xone]), head))
+    return graph
+
+
+def _nested_path(graph, rng, depth: int):
+    if depth <= 1:
+        return EX[f'p{rng.randrange(20)}']
+    roll = rng.random()
+    path = BNode()
+    if roll < 0.5:  # a sequence or an alternative
+        Collection(graph, path, [_nested_path(graph, rng, depth - 1) for _ in range(2)])
+        if roll < 0.25:
+            alternatives = BNode()
+            graph.add((alternatives, SH.alternativePath, path))
+            return alternatives
+        return path
+    parameter = rng.choice([SH.inversePath, SH.zeroOrMorePath, SH.oneOrMorePath,
+                            SH.zeroOrOnePath])
+    graph.add((path, parameter, _nested_path(graph, rng, depth - 1)))
+    return path
+
+
+def synthetic_data_graph(instances: int, classes: int = 200, knows: int = 3,
+                         seed: int = 0) -> Graph:
+    """A random class tree (ex:C0 is its root), typed instances and a random
+    ex:knows network between them."""
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(1, classes):
+        graph.add((EX[f'C{i}'], RDFS.subClassOf, EX[f'C{rng.randrange(i)}']))
+    for i in range(instances):
+        graph.add((EX[f'i{i}'], RDF.type, EX[f'C{rng.randrange(classes)}']))
+        for _ in range(knows):
+            graph.add((EX[f'i{i}'], EX.knows, EX[f'i{rng.randrange(instances)}']))
+    return graph
@@ -0,0 +1,57 @@
+"""Incremental against full revalidation of a synthetic data graph, under a
+stream of single triple updates.
+
+Run from the repository root:
+
+    python -m benchmarks.incremental [instances] [updates]
+"""
+import random
+import sys
+import time
+
+from rdflib import Graph
+
+from slsparser.shapels import parse
+from slsparser.validate import validate
+from slsparser.incremental import IncrementalValidator
+
+from benchmarks.generate import EX, synthetic_data_graph
+from benchmarks.validate import SHAPES
+
+
+def main():
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    data = synthetic_data_graph(instances)
+    shapes = Graph()
+    shapes.parse(data=SHAPES, format='turtle')
+    definitions, target = parse(shapes)
+    print(f'{len(data)} triples, {updates} updates')
+
+    start = time.perf_counter()
+    validator = IncrementalValidator(data, definitions, target)
+    print(f'  initial validation  {time.perf_counter() - start:7.2f} s')
+
+    rng = random.Random(0)
+    rechecked = 0
+    start = time.perf_counter()
+    for _ in range(updates):
+        triple = (EX[f'i{rng.randrange(instances)}'], EX.knows,
+                  EX[f'i{rng.randrange(instances)}'])
+        if triple in data:
+            rechecked += len(validator.update(removed=[triple]))
+        else:
+            rechecked += len(validator.update(added=[triple]))
+    elapsed = time.perf_counter() - start
+    print(f'  per update          {elapsed / updates * 1000:7.2f} ms   '
+          f'{rechecked / updates:.1f} results rechecked')
+
+    start = time.perf_counter()
+    full = {(shapename, focus): conforms
+            for shapename, focus, conforms in validate(data, definitions, target)}
+    print(f'  full revalidation   {time.perf_counter() - start:7.2f} s')
+    assert full == validator.results
+
+
+if __name__ == '__main__':
+    main()
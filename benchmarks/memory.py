@@ -0,0 +1,63 @@
+"""Peak memory of parsing and expanding the test corpus.
+
+Run from the repository root:
+
+    python -m benchmarks.memory
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+
+from rdflib import Graph
+
+from slsparser.shapels import parse, SANode
+from slsparser.pathls import PANode
+from slsparser.utilities import expand_shape
+
+CORPUS = Path(__file__).parent.parent / 'tests' / 'sls_testfiles'
+
+
+def count_nodes(node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if type(current) in (SANode, PANode):
+            count += 1
+            stack.extend(current.children)
+    return count
+
+
+def corpus_graphs():
+    for ttl in sorted(CORPUS.glob('*.ttl')):
+        graph = Graph()
+        graph.parse(str(ttl))
+        yield ttl.name, graph
+
+
+def main():
+    graphs = list(corpus_graphs())
+
+    tracemalloc.start()
+    trees = []
+    for _, graph in graphs:
+        definitions, target = parse(graph)
+        trees += list(definitions.values()) + list(target.values())
+        for definition in definitions.values():
+            trees.append(expand_shape(definitions, definition))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = sum(count_nodes(tree) for tree in trees)
+    node_size = sys.getsizeof(SANode(None, []))
+    if hasattr(SANode(None, []), '__dict__'):
+        node_size += sys.getsizeof(SANode(None, []).__dict__)
+
+    print(f'files:          {len(graphs)}')
+    print(f'tree nodes:     {nodes}')
+    print(f'bytes per node: {node_size} (excluding children)')
+    print(f'peak memory:    {peak / 1024:.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Serial against process pool parsing of a large synthetic shapes graph.
+
+Run from the repository root (the worker counts default to 1..cpu_count):
+
+    python -m benchmarks.parallel_parse [shapes] [workers ...]
+"""
+import os
+import sys
+import time
+
+from slsparser.shapels import parse
+
+from benchmarks.generate import shapes_graph
+
+
+def main():
+    shapes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = [int(w) for w in sys.argv[2:]] or list(range(1, (os.cpu_count() or 1) + 1))
+    graph = shapes_graph(shapes)
+    print(f'{shapes} node shapes, {len(graph)} triples, {os.cpu_count()} cores')
+
+    start = time.perf_counter()
+    serial = parse(graph)
+    baseline = time.perf_counter() - start
+    print(f'  serial          {baseline:7.2f} s')
+    for count in workers:
+        start = time.perf_counter()
+        parallel = parse(graph, workers=count)
+        elapsed = time.perf_counter() - start
+        assert parallel == serial
+        print(f'  workers={count:<6}  {elapsed:7.2f} s   speed-up {baseline / elapsed:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Timing and peak memory of parse, expand_shape, negation_normal_form and
+clean_parsetree on synthetic shapes graphs, written to a JSON file.
+
+Every generator parameter is varied in turn around a base configuration.
+Run from the repository root:
+
+    python -m benchmarks.suite [--output FILE] [--quick] [--compare BASELINE]
+
+With --compare, every result is compared with the same benchmark in an
+earlier results file, and the exit status is 1 if one got slower than the
+threshold allows.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import slsparser
+from slsparser.shapels import parse, SANode, Op
+from slsparser.utilities import expand_shape, negation_normal_form, clean_parsetree
+
+from benchmarks.generate import shapes_graph
+from benchmarks.memory import count_nodes
+
+FORMAT = 1
+
+BASE = {'shapes': 500, 'fanout': 3, 'list_length': 2, 'path_depth': 1,
+        'reference_depth': 2}
+VARIATIONS = {
+    'shapes': [2000],
+    'fanout': [1, 8],
+    'list_length': [5, 10],
+    'path_depth': [3, 5],
+    'reference_depth': [0, 8],
+}
+
+
+def configurations():
+    yield dict(BASE)
+    for parameter, values in VARIATIONS.items():
+        for value in values:
+            yield dict(BASE, **{parameter: value})
+
+
+def stages(graph):
+    """The benchmarked stages, each a function of the output of the one
+    before it"""
+    def expand(definitions):
+        return [expand_shape(definitions, node) for node in definitions.values()]
+
+    def nnf(trees):
+        return [negation_normal_form(SANode(Op.NOT, [tree])) for tree in trees]
+
+    def clean(trees):
+        return [clean_parsetree(tree) for tree in trees]
+
+    return [('parse', lambda _: parse(graph)[0], graph),
+            ('expand_shape', expand, None),
+            ('negation_normal_form', nnf, None),
+            ('clean_parsetree', clean, None)]
+
+
+def measure(function, argument, repeat: int):
+    # the best time of repeat runs, and the peak memory of one more
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def run(quick: bool):
+    results = []
+    for parameters in configurations():
+        if quick:
+            parameters['shapes'] = max(parameters['shapes'] // 10, 1)
+        graph = shapes_graph(**parameters)
+        output = None
+        for name, function, argument in stages(graph):
+            output, seconds, peak = measure(function, output if argument is None else argument,
+                                            1 if quick else 3)
+            trees = output.values() if isinstance(output, dict) else output
+            results.append({'benchmark': name, 'parameters': parameters,
+                            'seconds': seconds, 'peak_bytes': peak,
+                            'nodes': sum(count_nodes(tree) for tree in trees)})
+            print(f'{name:22} {_describe(parameters):60} {seconds:8.3f} s '
+                  f'{peak / 2 ** 20:8.1f} MiB', flush=True)
+    return {'format': FORMAT,
+            'slsparser': slsparser.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'quick': quick,
+            'results': results}
+
+
+def compare(report, baseline, threshold: float) -> bool:
+    """Print the time ratio of every benchmark to the baseline. True if none
+    is slower than threshold times its baseline."""
+    before = {_key(result): result for result in baseline['results']}
+    passed = True
+    for result in report['results']:
+        old = before.get(_key(result))
+        if old is None or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        memory = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else 1
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            passed = False
+        print(f'{result["benchmark"]:22} {_describe(result["parameters"]):60} '
+              f'time x{ratio:5.2f}  memory x{memory:5.2f}{flag}')
+    return passed
+
+
+def _key(result):
+    return result['benchmark'], tuple(sorted(result['parameters'].items()))
+
+
+def _describe(parameters) -> str:
+    return ' '.join(f'{name}={value}' for name, value in parameters.items())
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument('--output', default='benchmark-results.json',
+                           help='the JSON file to write (default: %(default)s)')
+    arguments.add_argument('--quick', action='store_true',
+                           help='graphs ten times smaller, a single run each')
+    arguments.add_argument('--compare', metavar='BASELINE',
+                           help='an earlier results file to compare with')
+    arguments.add_argument('--threshold', type=float, default=1.25,
+                           help='the slowdown counted as a regression (default: %(default)s)')
+    options = arguments.parse_args(argv)
+
+    report = run(options.quick)
+    with open(options.output, 'w') as output:
+        json.dump(report, output, indent=1)
+    print(f'results written to {options.output}')
+
+    if options.compare:
+        with open(options.compare) as baseline:
+            baseline = json.load(baseline)
+        if baseline.get('format') != FORMAT:
+            sys.exit(f'{options.compare} has results format {baseline.get("format")}, '
+                     f'expected {FORMAT}')
+        if not compare(report, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Explicit-stack tree transformations against the recursive originals.
+
+Run from the repository root:
+
+    python -m benchmarks.traversal
+"""
+import sys
+import timeit
+
+from rdflib import Literal, Namespace, BNode
+
+from slsparser.shapels import SANode, Op
+from slsparser.pathls import PANode, POp
+from slsparser.utilities import expand_shape, negation_normal_form, clean_parsetree
+
+EX = Namespace('http://ex.tt/')
+
+
+# The recursive implementations the explicit-stack versions replaced.
+
+def recursive_expand_shape(definitions, node):
+    if node.op == Op.HASSHAPE:
+        if node.children[0] not in definitions:
+            return SANode(Op.TOP, [])
+        return recursive_expand_shape(definitions, definitions[node.children[0]])
+
+    new_children = []
+    for child in node.children:
+        new_child = child
+        if type(child) == SANode:
+            new_child = recursive_expand_shape(definitions, child)
+        new_children.append(new_child)
+    return SANode(node.op, new_children)
+
+
+def recursive_negation_normal_form(node):
+    if node.op != Op.NOT:
+        return SANode(node.op, [recursive_negation_normal_form(c) if type(c) == SANode
+                                else c for c in node.children])
+
+    nnode = node.children[0]
+    if nnode.op in (Op.AND, Op.OR):
+        flipped = Op.OR if nnode.op == Op.AND else Op.AND
+        return SANode(flipped, [recursive_negation_normal_form(SANode(Op.NOT, [c]))
+                                for c in nnode.children])
+    if nnode.op == Op.NOT:
+        return nnode.children[0]
+    if nnode.op == Op.FORALL:
+        return SANode(Op.COUNTRANGE, [Literal(1), None, nnode.children[0],
+                                      recursive_negation_normal_form(
+                                          SANode(Op.NOT, [nnode.children[1]]))])
+    return node  # COUNTRANGE is not part of the benchmark trees
+
+
+def recursive_clean_parsetree(sanode, full=True):
+    new_children = [recursive_clean_parsetree(c, full) if type(c) == SANode else c
+                    for c in sanode.children]
+    if full and sanode.constraintComponent is not None:
+        return sanode
+    new_node = SANode(sanode.op, new_children)
+    if new_node.op == Op.NOT and new_node.children[0].op in (Op.TOP, Op.BOT):
+        return SANode(Op.BOT if new_node.children[0].op == Op.TOP else Op.TOP, [])
+    if new_node.op == Op.AND:
+        if any(c.op == Op.BOT for c in new_node.children):
+            return SANode(Op.BOT, [])
+        new_node.children = [c for c in new_node.children if c.op != Op.TOP]
+        if not new_node.children:
+            return SANode(Op.TOP, [])
+    if new_node.op == Op.OR:
+        if any(c.op == Op.TOP for c in new_node.children):
+            return SANode(Op.TOP, [])
+        new_node.children = [c for c in new_node.children if c.op != Op.BOT]
+        if not new_node.children:
+            return SANode(Op.BOT, [])
+    if new_node.op in (Op.AND, Op.OR) and len(new_node.children) == 1:
+        return new_node.children[0]
+    return new_node
+
+
+def recursive_equal(left, right):
+    if type(left) != type(right) or len(left.children) != len(right.children):
+        return False
+    same_children = True
+    for child_left, child_right in zip(left.children, right.children):
+        if type(child_left) == BNode and type(child_right) == BNode:
+            continue
+        if type(child_left) in (SANode, PANode):
+            same_children = same_children and recursive_equal(child_left, child_right)
+        else:
+            same_children = same_children and child_left == child_right
+    return left._header() == right._header() and same_children
+
+
+def recursive_repr(node):
+    if type(node) not in (SANode, PANode):
+        return node.__repr__()
+    out = '\n('
+    out += node._repr_header()
+    for c in node.children:
+        for line in recursive_repr(c).split('\n'):
+            out += ' ' + line + '\n'
+    out = out[:-1] + ')'
+    return out
+
+
+def wide_tree(depth, fanout=3):
+    # a balanced AND/OR/NOT/FORALL tree, shallow enough for recursion
+    if depth == 0:
+        return SANode(Op.HASSHAPE, [EX.leaf])
+    children = [wide_tree(depth - 1, fanout) for _ in range(fanout)]
+    ops = [Op.AND, Op.OR]
+    node = SANode(ops[depth % 2], children + [SANode(Op.TOP, [])])
+    if depth % 3 == 0:
+        node = SANode(Op.NOT, [SANode(Op.FORALL, [PANode(POp.PROP, [EX.p]), node])])
+    return node
+
+
+def deep_tree(depth):
+    tree = SANode(Op.HASSHAPE, [EX.leaf])
+    for _ in range(depth):
+        tree = SANode(Op.NOT, [SANode(Op.AND, [tree, SANode(Op.TOP, [])])])
+    return tree
+
+
+def bench(name, tree, number, repr_number):
+    definitions = {EX.leaf: SANode(Op.HASVALUE, [EX.one])}
+    expanded = expand_shape(definitions, tree)
+    other = expand_shape(definitions, tree)
+    cases = [
+        ('expand_shape', lambda: expand_shape(definitions, tree),
+         lambda: recursive_expand_shape(definitions, tree), number),
+        ('negation_normal_form', lambda: negation_normal_form(expanded),
+         lambda: recursive_negation_normal_form(expanded), number),
+        ('clean_parsetree', lambda: clean_parsetree(expanded, False),
+         lambda: recursive_clean_parsetree(expanded, False), number),
+        ('==', lambda: expanded == other,
+         lambda: recursive_equal(expanded, other), number),
+        ('repr', lambda: repr(expanded),
+         lambda: recursive_repr(expanded), repr_number),
+    ]
+    print(f'{name}:')
+    for label, iterative, recursive, n in cases:
+        it = timeit.timeit(iterative, number=n) / n
+        try:
+            rec = f'{timeit.timeit(recursive, number=n) / n * 1000:9.2f} ms'
+        except RecursionError:
+            rec = '  RecursionError'
+        print(f'  {label:22} explicit stack {it * 1000:9.2f} ms   recursive {rec}')
+
+
+def main():
+    sys.setrecursionlimit(10000)
+    bench('wide tree (depth 7, fan-out 3)', wide_tree(7), 10, 3)
+    bench('deep chain (depth 800)', deep_tree(800), 10, 1)
+    sys.setrecursionlimit(1000)
+    bench('deep chain (depth 5000, default recursion limit)', deep_tree(5000), 3, 1)
+
+
+if __name__ == '__main__':
+    main()
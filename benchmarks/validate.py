@@ -0,0 +1,53 @@
+"""Serial against process pool validation of a synthetic data graph.
+
+Run from the repository root (the worker counts default to 1..cpu_count):
+
+    python -m benchmarks.validate [instances] [workers ...]
+"""
+import os
+import sys
+import time
+
+from rdflib import Graph
+
+from slsparser.shapels import parse
+from slsparser.validate import validate
+
+from benchmarks.generate import synthetic_data_graph
+
+SHAPES = """
+    @prefix ex: <http://ex.tt/> .
+    @prefix sh: <http://www.w3.org/ns/shacl#> .
+    ex:KnowsShape a sh:NodeShape ;
+        sh:targetClass ex:C0 ;
+        sh:property [ sh:path ex:knows ; sh:minCount 1 ; sh:maxCount 3 ;
+                      sh:class ex:C0 ] .
+    ex:FriendOfFriendShape a sh:NodeShape ;
+        sh:targetSubjectsOf ex:knows ;
+        sh:property [ sh:path ( ex:knows ex:knows ) ; sh:node ex:KnowsShape ] .
+"""
+
+
+def main():
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = [int(w) for w in sys.argv[2:]] or list(range(1, (os.cpu_count() or 1) + 1))
+    data = synthetic_data_graph(instances)
+    shapes = Graph()
+    shapes.parse(data=SHAPES, format='turtle')
+    definitions, target = parse(shapes)
+    print(f'{len(data)} triples, {os.cpu_count()} cores')
+
+    start = time.perf_counter()
+    serial = set(validate(data, definitions, target))
+    baseline = time.perf_counter() - start
+    print(f'  serial          {baseline:7.2f} s   {len(serial)} results')
+    for count in workers:
+        start = time.perf_counter()
+        parallel = set(validate(data, definitions, target, workers=count))
+        elapsed = time.perf_counter() - start
+        assert parallel == serial
+        print(f'  workers={count:<6}  {elapsed:7.2f} s   speed-up {baseline / elapsed:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,23 +4,59 @@ Parses a SHACL shapes graph into a parse tree of the SHACL Logical Syntax.
 See the README for details on the SANode/PANode data structures.
 """
 
-from slsparser.shapels import parse, SANode, Op
+from slsparser.shapels import parse, parse_iter, parse_shapes, SANode, Op, ShapesGraphIndex, LazyShapes
+from slsparser.incremental import IncrementalParser, IncrementalValidator
+from slsparser.cache import ParseCache, fingerprint
+from slsparser.profiling import profile_parse, ParseProfile
 from slsparser.pathls import PANode, POp
+from slsparser.interning import NodeInterner, eliminate_common_subexpressions
+from slsparser.evaluate import Evaluator
+from slsparser.pathevaluate import PathEvaluator
+from slsparser.automaton import PathAutomaton, compile_path
+from slsparser.predicates import compile_test
+from slsparser.csr import CSRGraph, CSRPathEvaluator
+from slsparser.targets import target_sets
+from slsparser.validate import validate
 from slsparser.utilities import (
     expand_shape,
+    expand_definitions,
     negation_normal_form,
     clean_parsetree,
+    normalize,
 )
 
 __version__ = "1.0.0"
 
 __all__ = [
     "parse",
+    "parse_iter",
+    "parse_shapes",
+    "IncrementalParser",
+    "IncrementalValidator",
+    "ParseCache",
+    "fingerprint",
+    "profile_parse",
+    "ParseProfile",
     "SANode",
     "Op",
+    "ShapesGraphIndex",
+    "LazyShapes",
     "PANode",
     "POp",
+    "NodeInterner",
+    "eliminate_common_subexpressions",
+    "Evaluator",
+    "PathEvaluator",
+    "PathAutomaton",
+    "compile_path",
+    "compile_test",
+    "CSRGraph",
+    "CSRPathEvaluator",
+    "target_sets",
+    "validate",
     "expand_shape",
+    "expand_definitions",
     "negation_normal_form",
     "clean_parsetree",
+    "normalize",
 ]
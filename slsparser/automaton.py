@@ -0,0 +1,144 @@
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+from rdflib import Graph
+from rdflib.term import Node, URIRef
+
+from slsparser.pathls import PANode, POp, inverse
+from slsparser.traversal import fold
+
+# a transition label: a predicate, traversed backwards if the flag is set
+Label = Tuple[URIRef, bool]
+
+
+class PathAutomaton:
+    """A nondeterministic automaton without epsilon transitions, accepting the
+    sequences of (inverse) predicates that match a path expression.
+
+    State 0 is the initial state. edges[state] maps every label to the states
+    it leads to. Use compile_path to build one.
+    """
+    __slots__ = ('edges', 'accepting')
+
+    def __init__(self, edges: List[Dict[Label, FrozenSet[int]]], accepting: FrozenSet[int]):
+        self.edges = edges
+        self.accepting = accepting
+
+    def __len__(self):
+        return len(self.edges)
+
+    def reachable(self, graph: Graph, start: Node) -> Set[Node]:
+        """The nodes reachable from start through the path, found by a
+        breadth-first search of the product of graph and automaton. Every
+        (node, state) pair is visited at most once."""
+        out = set()
+        visited = {(start, 0)}
+        frontier = [(start, 0)]
+        while frontier:
+            next_frontier = []
+            for node, state in frontier:
+                if state in self.accepting:
+                    out.add(node)
+                for (predicate, backwards), targets in self.edges[state].items():
+                    if backwards:
+                        neighbours = graph.subjects(predicate, node)
+                    else:
+                        neighbours = graph.objects(node, predicate)
+                    for neighbour in neighbours:
+                        for target in targets:
+                            if (neighbour, target) not in visited:
+                                visited.add((neighbour, target))
+                                next_frontier.append((neighbour, target))
+            frontier = next_frontier
+        return out
+
+
+def compile_path(path: PANode) -> PathAutomaton:
+    """Compile a path expression into a PathAutomaton.
+
+    A Thompson construction (linear in the size of the path) followed by the
+    removal of epsilon transitions.
+    """
+    epsilon: List[List[int]] = []
+    labelled: List[List[Tuple[Label, int]]] = []
+
+    def new_state() -> int:
+        epsilon.append([])
+        labelled.append([])
+        return len(epsilon) - 1
+
+    def visit(node: PANode):
+        # a fragment is the (entry, end) pair of states of a subpath
+        if node.pop == POp.PROP or (node.pop == POp.INV and node.children[0].pop == POp.PROP):
+            def finish(_):
+                entry, end = new_state(), new_state()
+                if node.pop == POp.PROP:
+                    labelled[entry].append(((node.children[0], False), end))
+                else:
+                    labelled[entry].append(((node.children[0].children[0], True), end))
+                return entry, end
+            return [], finish
+
+        if node.pop == POp.INV:
+            return [inverse(node.children[0])], lambda fragments: fragments[0]
+
+        def finish(fragments):
+            entry, end = new_state(), new_state()
+            if node.pop == POp.COMP:
+                previous = entry
+                for first, last in fragments:
+                    epsilon[previous].append(first)
+                    previous = last
+                epsilon[previous].append(end)
+            elif node.pop == POp.ALT:
+                for first, last in fragments:
+                    epsilon[entry].append(first)
+                    epsilon[last].append(end)
+            else:  # ID, ZEROORONE and KLEENE can all skip their subpath
+                epsilon[entry].append(end)
+                if node.pop in (POp.ZEROORONE, POp.KLEENE):
+                    first, last = fragments[0]
+                    epsilon[entry].append(first)
+                    epsilon[last].append(end)
+                    if node.pop == POp.KLEENE:
+                        epsilon[last].append(first)
+            return entry, end
+        return list(node.children), finish
+
+    first, last = fold(path, visit)
+    return _without_epsilon(first, last, epsilon, labelled)
+
+
+def _without_epsilon(first: int, last: int, epsilon, labelled) -> PathAutomaton:
+    # Only keeps the states reachable from first, renumbered so first is 0.
+    numbers = {first: 0}
+    order = [first]
+    edges = []
+    accepting = set()
+    position = 0
+    while position < len(order):
+        state = order[position]
+        position += 1
+        closure = _epsilon_closure(state, epsilon)
+        if last in closure:
+            accepting.add(numbers[state])
+        targets: Dict[Label, Set[int]] = {}
+        for member in closure:
+            for label, target in labelled[member]:
+                if target not in numbers:
+                    numbers[target] = len(order)
+                    order.append(target)
+                targets.setdefault(label, set()).add(numbers[target])
+        edges.append({label: frozenset(states) for label, states in targets.items()})
+    return PathAutomaton(edges, frozenset(accepting))
+
+
+def _epsilon_closure(state: int, epsilon) -> Set[int]:
+    closure = {state}
+    stack = [state]
+    while stack:
+        for target in epsilon[stack.pop()]:
+            if target not in closure:
+                closure.add(target)
+                stack.append(target)
+    return closure
+
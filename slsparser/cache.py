@@ -0,0 +1,451 @@
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from rdflib import Graph
+from rdflib.term import BNode, Literal, Node, URIRef
+
+from slsparser.shapels import SANode, Op, parse
+from slsparser.pathls import PANode, POp
+from slsparser.interning import NodeInterner
+from slsparser import pool
+
+
+class ParseCache:
+    """Parse results stored on disk, keyed by the fingerprint of the shapes
+    graph.
+
+    cache.parse(graph) returns what parse(graph) would, loading it from the
+    directory if an isomorphic shapes graph was parsed before (with the same
+    full flag), and storing it otherwise. Blank nodes are matched through
+    their canonical labels (see fingerprint), so a shapes graph that is read
+    again from the same file is a hit, although its blank nodes are new.
+
+    hits, misses and invalidations count the lookups that were answered from
+    the directory, that found no entry, and the entries that were dropped:
+    unreadable (an other format version, a truncated file) or removed by
+    invalidate.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def parse(self, graph: Graph, full: bool = True,
+              interner: Optional[NodeInterner] = None,
+              workers: Optional[int] = None) -> Tuple[Dict, Dict]:
+        """parse(graph, full, interner, workers), from the cache if possible"""
+        digest, labels = fingerprint(graph)
+        path = self._path(digest, full)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            data = None
+
+        parsed = None
+        if data is not None:
+            try:
+                parsed = loads(data, {label: bnode for bnode, label in labels.items()})
+                self.hits += 1
+            except ValueError:
+                self.invalidations += 1
+        if parsed is None:
+            parsed = parse(graph, full, workers=workers)
+            # a temporary file of its own, so that concurrent writers do not
+            # mix their entries and readers never see a partial one
+            entry = dumps(*parsed, labels)
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp',
+                                             delete=False) as temporary:
+                temporary.write(entry)
+            os.replace(temporary.name, path)
+
+        definitions, target = parsed
+        if interner is not None:
+            for shapename in definitions:
+                definitions[shapename] = interner.intern(definitions[shapename])
+                target[shapename] = interner.intern(target[shapename])
+        return definitions, target
+
+    def invalidate(self, graph: Optional[Graph] = None):
+        """Remove the entries of graph, or all entries"""
+        if graph is None:
+            paths = list(self.directory.glob('*' + _SUFFIX))
+        else:
+            digest, _ = fingerprint(graph)
+            paths = [self._path(digest, full) for full in (True, False)]
+        for path in paths:
+            try:
+                path.unlink()
+                self.invalidations += 1
+            except FileNotFoundError:
+                pass
+
+    def _path(self, digest: str, full: bool) -> Path:
+        return self.directory / (digest + ('' if full else '-core') + _SUFFIX)
+
+
+_SUFFIX = '.slsc'
+
+
+# Fingerprints. Blank nodes get canonical labels by colour refinement: the
+# colour of a blank node starts as a hash of its triples with other terms,
+# and is then repeatedly replaced by a hash of itself and the colours of its
+# blank node neighbours, until no colour is split any more (a unique colour
+# can never be split, so only shared colours are recomputed). Blank nodes
+# that still share a colour are told apart by changing the colour of one of
+# them and refining again. The choice matters when the blank nodes are not
+# interchangeable, so every member of the shared colour is tried and the
+# labelling with the smallest hash is kept. Only blank nodes on a cycle of
+# blank nodes need this: in a forest, blank nodes that share a refined
+# colour are interchangeable, so one of them is enough (shapes graphs hardly
+# have cycles of blank nodes). The fingerprint is the hash of the sorted
+# triples under the canonical labels, so two graphs have the same
+# fingerprint exactly when they are isomorphic (barring hash collisions).
+
+def fingerprint(graph: Graph) -> Tuple[str, Dict[BNode, str]]:
+    """A hash of graph that does not depend on the labels of its blank nodes,
+    and the canonical label of every blank node"""
+    triples = list(graph)
+    rendered: Dict[Node, str] = {}
+    edges: Dict[BNode, List[str]] = {}  # to other terms
+    neighbours: Dict[BNode, List[Tuple[str, BNode]]] = {}
+    for s, p, o in triples:
+        for term in (s, p, o):
+            if type(term) != BNode and term not in rendered:
+                rendered[term] = term.n3()
+        if type(s) == BNode:
+            if type(o) == BNode:
+                neighbours.setdefault(s, []).append(('>' + rendered[p] + ' ', o))
+                neighbours.setdefault(o, []).append(('<' + rendered[p] + ' ', s))
+            else:
+                edges.setdefault(s, []).append('>' + rendered[p] + ' ' + rendered[o])
+        elif type(o) == BNode:
+            edges.setdefault(o, []).append('<' + rendered[p] + ' ' + rendered[s])
+
+    bnodes = set(edges) | set(neighbours)
+    cyclic = _on_cycles(bnodes, neighbours)
+    best = None
+    # depth-first search over the blank nodes to tell apart
+    stack = [_refine({bnode: _hash('\n'.join(sorted(edges.get(bnode, ()))))
+                      for bnode in bnodes}, neighbours)]
+    while stack:
+        colours = stack.pop()
+        groups = _groups(colours)
+        if len(groups) == len(colours):
+            digest = _digest(triples, rendered, colours)
+            if best is None or digest < best[0]:
+                best = digest, colours
+            continue
+        colour = min(colour for colour, members in groups.items() if len(members) > 1)
+        members = groups[colour]
+        if not any(bnode in cyclic for bnode in members):
+            members = members[:1]
+        for bnode in members:
+            individualized = dict(colours)
+            individualized[bnode] = _hash(colour + '*')
+            stack.append(_refine(individualized, neighbours))
+    return best
+
+
+def _digest(triples: List, rendered: Dict[Node, str], colours: Dict[BNode, str]) -> str:
+    # the hash of the sorted triples, with blank nodes written as their colour
+    def term(node):
+        return '_:' + colours[node] if type(node) == BNode else rendered[node]
+
+    return _hash('\n'.join(sorted(f'{term(s)} {rendered[p]} {term(o)}' for s, p, o in triples)))
+
+
+def _on_cycles(bnodes, neighbours: Dict[BNode, List[Tuple[str, BNode]]]) -> Set[BNode]:
+    # The blank nodes whose component of blank nodes (ignoring the direction
+    # of the triples) has a cycle
+    seen = set()
+    cyclic = set()
+    for start in bnodes:
+        if start in seen:
+            continue
+        seen.add(start)
+        members = [start]
+        links = 0
+        for bnode in members:  # grows while it is read
+            for _, neighbour in neighbours.get(bnode, ()):
+                links += 1
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    members.append(neighbour)
+        if links // 2 >= len(members):  # a tree has one link less than members
+            cyclic.update(members)
+    return cyclic
+
+
+def _refine(colours: Dict[BNode, str],
+            neighbours: Dict[BNode, List[Tuple[str, BNode]]]) -> Dict[BNode, str]:
+    groups = _groups(colours)
+    while True:
+        refined = dict(colours)
+        refined_groups = {}
+        for colour, members in groups.items():
+            if len(members) == 1:
+                refined_groups[colour] = members
+                continue
+            for bnode in members:
+                refined[bnode] = _hash(colour + '\n' + '\n'.join(sorted(
+                    edge + colours[neighbour]
+                    for edge, neighbour in neighbours.get(bnode, ()))))
+                refined_groups.setdefault(refined[bnode], []).append(bnode)
+        if len(refined_groups) == len(groups):  # stable: no colour was split
+            return colours
+        colours, groups = refined, refined_groups
+
+
+def _groups(colours: Dict[BNode, str]) -> Dict[str, List[BNode]]:
+    groups: Dict[str, List[BNode]] = {}
+    for bnode, colour in colours.items():
+        groups.setdefault(colour, []).append(bnode)
+    return groups
+
+
+def _hash(text: str) -> str:
+    return blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+# The binary format: the magic bytes, the format version and the length of a
+# UTF-8 text block holding all strings, then a sequence of unsigned 32 bit
+# little-endian integers. These give the names of the Op and POp members (so
+# nodes refer to their operator by position), the length of every string,
+# and a table of objects (terms, strings, lists, tuples, frozensets and
+# nodes) in which every object follows its parts, so a single pass decodes
+# it. Shared subtrees are stored once. Objects are referred to by position, starting at
+# 1: 0 stands for None. The definitions and targets close the sequence.
+
+_MAGIC = b'SLSC'
+# also bumped when parse output changes (2: sh:xone is a CHILDRANGE, 3: sh:in
+# is an IN node, whose frozenset needed a new kind)
+_VERSION = 3
+_HEADER = struct.Struct('<4sII')
+
+# object kinds
+_URIREF = 0
+_BNODE = 1
+_LITERAL = 2
+_STR = 3
+_LIST = 4
+_TUPLE = 5
+_SANODE = 6
+_PANODE = 7
+_FROZENSET = 8
+
+
+def dumps(definitions: Dict[Node, SANode], target: Dict[Node, SANode],
+          labels: Dict[BNode, str]) -> bytes:
+    """definitions and target in the binary format, with blank nodes written
+    as their labels"""
+    writer = _Writer(labels)
+    mappings = [len(definitions)]
+    for shapename, node in definitions.items():
+        mappings += [writer.reference(shapename), writer.reference(node)]
+    mappings.append(len(target))
+    for shapename, node in target.items():
+        mappings += [writer.reference(shapename), writer.reference(node)]
+
+    strings = [member.name for member in Op] + [member.name for member in POp] + writer.strings
+    text = ''.join(strings).encode()
+    numbers = array('I', [len(Op), len(POp), len(strings)])
+    numbers.extend(len(string) for string in strings)
+    numbers.append(writer.count)
+    numbers.extend(writer.objects)
+    numbers.extend(mappings)
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    return _HEADER.pack(_MAGIC, _VERSION, len(text)) + text + numbers.tobytes()
+
+
+class _Writer:
+    # numbers the objects, writing each one after its parts
+
+    def __init__(self, labels: Dict[BNode, str]):
+        self.labels = labels
+        self.strings: List[str] = []
+        self.objects = array('I')
+        self.count = 0
+        self._strings: Dict[str, int] = {}
+        self._terms: Dict[Node, int] = {}
+        self._values: Dict[str, int] = {}
+        self._nodes: Dict[int, int] = {}  # by id: shared subtrees are kept
+        self._ops = {member: position for position, member in enumerate(Op)}
+        self._pops = {member: position for position, member in enumerate(POp)}
+
+    def reference(self, root) -> int:
+        """The number of root, written (with its parts) if it is new"""
+        if type(root) not in (SANode, PANode):
+            return self._value(root)
+        nodes = self._nodes
+        stack = [root]
+        while stack:
+            node = stack[-1]
+            if id(node) in nodes:
+                stack.pop()
+                continue
+            pending = [child for child in _subnodes(node.children) if id(child) not in nodes]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            if type(node) == SANode:
+                fields = (_SANODE, self._ops[node.op],
+                          self._value(node.constraintComponent), self._value(node.children))
+            else:
+                fields = (_PANODE, self._pops[node.pop], self._value(node.children))
+            self.objects.extend(fields)
+            self.count += 1
+            nodes[id(node)] = self.count
+        return nodes[id(root)]
+
+    def _value(self, value) -> int:
+        # the number of a value that is not a new node
+        kind = type(value)
+        if kind == SANode or kind == PANode:
+            return self._nodes[id(value)]
+        if value is None:
+            return 0
+        if kind == list or kind == tuple or kind == frozenset:
+            items = [self._value(item) for item in value]
+            self.objects.extend((_COLLECTIONS[kind], len(items)))
+            self.objects.extend(items)
+        elif kind == str:
+            number = self._values.get(value)
+            if number is not None:
+                return number
+            self.objects.extend((_STR, self._string(value)))
+            self._values[value] = self.count + 1
+        elif kind in (URIRef, BNode, Literal):
+            number = self._terms.get(value)
+            if number is not None:
+                return number
+            if kind == URIRef:
+                self.objects.extend((_URIREF, self._string(value)))
+            elif kind == BNode:
+                self.objects.extend((_BNODE, self._string(self.labels[value])))
+            else:
+                self.objects.extend((_LITERAL, self._string(value),
+                                     self._string(value.datatype or ''),
+                                     self._string(value.language or '')))
+            self._terms[value] = self.count + 1
+        else:
+            raise ValueError(f'Unable to store a value of type {kind.__name__}')
+        self.count += 1
+        return self.count
+
+    def _string(self, string: str) -> int:
+        number = self._strings.get(string)
+        if number is None:
+            number = self._strings[string] = len(self.strings) + len(Op) + len(POp)
+            self.strings.append(str(string))
+        return number
+
+
+_COLLECTIONS = {list: _LIST, tuple: _TUPLE, frozenset: _FROZENSET}
+
+
+def _subnodes(values) -> list:
+    # the nodes among values, also inside nested lists and tuples
+    out = []
+    for value in values:
+        kind = type(value)
+        if kind == SANode or kind == PANode:
+            out.append(value)
+        elif kind == list or kind == tuple:
+            out.extend(_subnodes(value))
+    return out
+
+
+def loads(data: bytes, bnodes: Dict[str, BNode]) -> Tuple[Dict, Dict]:
+    """The definitions and target stored by dumps, with the blank node labels
+    replaced by bnodes. Raises ValueError if data is not in the format."""
+    if len(data) < _HEADER.size:
+        raise ValueError('Truncated parse cache entry')
+    magic, version, size = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError('Not a parse cache entry')
+    if version != _VERSION:
+        raise ValueError(f'Parse cache format version {version}, expected {_VERSION}')
+    try:
+        with pool.paused_gc():  # the many small nodes would trigger collections
+            return _decode(data, size, bnodes)
+    except (IndexError, KeyError, UnicodeDecodeError) as error:
+        raise ValueError(f'Corrupt parse cache entry ({error!r})') from None
+
+
+def _decode(data: bytes, size: int, bnodes: Dict[str, BNode]) -> Tuple[Dict, Dict]:
+    text = data[_HEADER.size:_HEADER.size + size].decode()
+    numbers = array('I')
+    if (len(data) - _HEADER.size - size) % numbers.itemsize:
+        raise ValueError('Truncated parse cache entry')
+    numbers.frombytes(data[_HEADER.size + size:])
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    numbers = numbers.tolist()
+
+    operators, path_operators, count = numbers[:3]
+    strings = []
+    position = 0
+    for length in numbers[3:3 + count]:
+        strings.append(text[position:position + length])
+        position += length
+    ops = [Op[name] for name in strings[:operators]]
+    pops = [POp[name] for name in strings[operators:operators + path_operators]]
+
+    objects = [None]
+    append = objects.append
+    i = 3 + count
+    count = numbers[i]
+    i += 1
+    for _ in range(count):
+        kind = numbers[i]
+        if kind == _SANODE:
+            append(SANode(ops[numbers[i + 1]], objects[numbers[i + 3]], objects[numbers[i + 2]]))
+            i += 4
+        elif kind == _LIST or kind == _TUPLE or kind == _FROZENSET:
+            items = [objects[item] for item in numbers[i + 2:i + 2 + numbers[i + 1]]]
+            append(items if kind == _LIST else tuple(items) if kind == _TUPLE else frozenset(items))
+            i += 2 + numbers[i + 1]
+        elif kind == _PANODE:
+            append(PANode(pops[numbers[i + 1]], objects[numbers[i + 2]]))
+            i += 3
+        elif kind == _URIREF:
+            append(URIRef(strings[numbers[i + 1]]))
+            i += 2
+        elif kind == _BNODE:
+            label = strings[numbers[i + 1]]
+            append(bnodes.get(label) or BNode(label))
+            i += 2
+        elif kind == _LITERAL:
+            datatype, language = strings[numbers[i + 2]], strings[numbers[i + 3]]
+            append(Literal(strings[numbers[i + 1]], lang=language or None,
+                           datatype=URIRef(datatype) if datatype else None))
+            i += 4
+        elif kind == _STR:
+            append(strings[numbers[i + 1]])
+            i += 2
+        else:
+            raise ValueError(f'Unknown object kind {kind}')
+
+    mappings = []
+    for _ in range(2):
+        mapping = {}
+        for _ in range(numbers[i]):
+            mapping[objects[numbers[i + 1]]] = objects[numbers[i + 2]]
+            i += 2
+        i += 1
+        mappings.append(mapping)
+    if i != len(numbers):
+        raise ValueError('Trailing data in parse cache entry')
+    return mappings[0], mappings[1]
@@ -0,0 +1,186 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+from rdflib.term import Node, URIRef
+
+from slsparser.pathls import PANode, POp, inverse
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency
+    np = None
+
+
+class CSRGraph:
+    """A read-only, integer-encoded copy of a data graph for path evaluation.
+
+    Every term is encoded as an integer (its position in terms). Every
+    predicate is stored as a forward (subject -> objects) and an inverse
+    (object -> subjects) adjacency in compressed sparse row form: the
+    neighbours of node i are indices[indptr[i]:indptr[i + 1]].
+
+    triples is any iterable of (subject, predicate, object), e.g. an rdflib
+    Graph. Needs numpy (pip install slsparser[csr]).
+    """
+
+    def __init__(self, triples: Iterable[Tuple[Node, Node, Node]]):
+        if np is None:
+            raise ImportError('The CSR backend needs numpy: pip install slsparser[csr]')
+        self.terms: List[Node] = []
+        self.ids: Dict[Node, int] = {}
+        edges: Dict[URIRef, Tuple[List[int], List[int]]] = {}
+        for s, p, o in triples:
+            subjects, objects = edges.setdefault(p, ([], []))
+            subjects.append(self._encode(s))
+            objects.append(self._encode(o))
+
+        self._forward = {}
+        self._inverse = {}
+        size = len(self.terms)
+        for predicate, (subjects, objects) in edges.items():
+            subjects = np.asarray(subjects, dtype=np.int64)
+            objects = np.asarray(objects, dtype=np.int64)
+            self._forward[predicate] = _csr(subjects, objects, size)
+            self._inverse[predicate] = _csr(objects, subjects, size)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _encode(self, term: Node) -> int:
+        number = self.ids.get(term)
+        if number is None:
+            number = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return number
+
+    def step(self, sources, targets, predicate: URIRef, backwards: bool):
+        """Follow predicate (backwards) from every target: the (source, neighbour)
+        pairs, as two arrays. Targets that are not in the graph have no
+        neighbours."""
+        adjacency = (self._inverse if backwards else self._forward).get(predicate)
+        if adjacency is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        indptr, indices = adjacency
+        known = targets < len(indptr) - 1
+        sources, targets = sources[known], targets[known]
+        begins = indptr[targets]
+        lengths = indptr[targets + 1] - begins
+        return np.repeat(sources, lengths), indices[_slices(begins, lengths)]
+
+
+def _slices(begins, lengths):
+    # the positions in the slices [begin, begin + length), concatenated
+    offsets = np.repeat(begins - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(int(lengths.sum()))
+
+
+def _decode(terms: List[Node], local: List[Node], number: int) -> Node:
+    return terms[number] if number < len(terms) else local[number - len(terms)]
+
+
+def _csr(rows, columns, size: int):
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, columns[order]
+
+
+class CSRPathEvaluator:
+    """Evaluates path expressions over a CSRGraph, with the same interface
+    as PathEvaluator.
+
+    A path is applied to a relation of (start, reached node) pairs stored as
+    two integer arrays, so every step is one vectorized expansion of the
+    whole frontier, for all start nodes together. Start nodes that are not in
+    the graph only reach themselves (through ID, ZEROORONE or KLEENE).
+    """
+
+    def __init__(self, graph: CSRGraph):
+        self.graph = graph
+        self._width = 1  # the number of terms, including local numbers
+
+    def values(self, path: PANode, node: Node) -> Set[Node]:
+        """The nodes reachable from node through path"""
+        return self.pairs(path, [node])[node]
+
+    def pairs(self, path: PANode, starts: Iterable[Node]) -> Dict[Node, Set[Node]]:
+        """For every start node, the set of nodes reachable through path"""
+        starts = list(dict.fromkeys(starts))
+        terms = self.graph.terms
+        ids = self.graph.ids
+        local = []  # start nodes outside the graph, numbered after its terms
+        numbers = []
+        for start in starts:
+            number = ids.get(start)
+            if number is None:
+                number = len(terms) + len(local)
+                local.append(start)
+            numbers.append(number)
+        numbers = np.asarray(numbers, dtype=np.int64)
+
+        self._width = max(len(terms) + len(local), 1)
+        sources, targets = self._relation(path, numbers, numbers)
+        out = {start: set() for start in starts}
+        for source, target in zip(sources.tolist(), targets.tolist()):
+            out[_decode(terms, local, source)].add(_decode(terms, local, target))
+        return out
+
+    def _relation(self, path: PANode, sources, targets):
+        # Extends the (source, target) pairs by path: the (source, node)
+        # pairs such that node is reachable from target through path.
+        pop = path.pop
+
+        if pop == POp.ID:
+            return sources, targets
+
+        if pop == POp.PROP:
+            return self._unique(*self.graph.step(sources, targets, path.children[0], False))
+
+        if pop == POp.INV:
+            child = path.children[0]
+            if child.pop == POp.PROP:
+                return self._unique(*self.graph.step(sources, targets, child.children[0], True))
+            return self._relation(inverse(child), sources, targets)
+
+        if pop == POp.COMP:
+            for step in path.children:
+                sources, targets = self._relation(step, sources, targets)
+            return sources, targets
+
+        if pop == POp.ALT:
+            results = [self._relation(alternative, sources, targets)
+                       for alternative in path.children]
+            return self._unique(np.concatenate([s for s, _ in results]),
+                                np.concatenate([t for _, t in results]))
+
+        if pop == POp.ZEROORONE:
+            s, t = self._relation(path.children[0], sources, targets)
+            return self._unique(np.concatenate([sources, s]), np.concatenate([targets, t]))
+
+        if pop == POp.KLEENE:
+            # the closure of every distinct target, then joined with the pairs
+            distinct = np.unique(targets)
+            reached = self._keys(distinct, distinct)
+            frontier = distinct, distinct
+            while len(frontier[0]):
+                s, t = self._relation(path.children[0], *frontier)
+                new = np.setdiff1d(self._keys(s, t), reached)
+                reached = np.union1d(reached, new)
+                frontier = self._pairs(new)
+            closure_sources, closure_targets = self._pairs(reached)  # sorted
+            begins = np.searchsorted(closure_sources, targets, 'left')
+            lengths = np.searchsorted(closure_sources, targets, 'right') - begins
+            return self._unique(np.repeat(sources, lengths),
+                                closure_targets[_slices(begins, lengths)])
+
+        raise ValueError(f'Unknown path operator {pop}')
+
+    # pairs are deduplicated as single int64 keys source * width + target
+
+    def _keys(self, sources, targets):
+        return sources * self._width + targets
+
+    def _pairs(self, keys):
+        return np.divmod(keys, self._width)
+
+    def _unique(self, sources, targets):
+        return self._pairs(np.unique(self._keys(sources, targets)))
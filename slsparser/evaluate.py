@@ -0,0 +1,197 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from rdflib import Graph
+from rdflib.term import Literal, Node
+
+from slsparser.shapels import SANode, Op
+from slsparser.pathls import PANode
+from slsparser.pathevaluate import PathEvaluator
+from slsparser.predicates import compile_test, compare
+
+
+class Evaluator:
+    """Decides whether a focus node of a data graph satisfies an SANode.
+
+    Results are memoized per (node, focus node), so subformulas shared between
+    shapes (HASSHAPE references, interned subtrees) are only decided once for
+    every focus node. Paths are evaluated by a PathEvaluator, which caches the
+    closures of zero-or-more paths for the whole data graph. AND, OR,
+    COUNTRANGE and CHILDRANGE stop as soon as their outcome is known. The
+    evaluation runs on an explicit stack, so there is no limit on the depth of
+    the shapes.
+
+    Recursive shapes are decided under the assumption that a shape holds for
+    a focus node while it is being checked for that focus node. Results that
+    rest on such an assumption are not memoized until the recursion is closed.
+    """
+
+    def __init__(self, graph: Graph, definitions: Optional[Dict] = None,
+                 paths: Optional[PathEvaluator] = None):
+        self.graph = graph
+        self.definitions = definitions if definitions is not None else {}
+        self.paths = paths if paths is not None else PathEvaluator(graph)
+        self._memo: Dict[Tuple[int, Node], bool] = {}
+        self._pinned: Dict[int, SANode] = {}  # keeps memoized ids valid
+        self._tests: Dict[int, Callable[[Node], bool]] = {}  # compiled TEST nodes, by id
+        self._references: Dict[Node, SANode] = {}  # HASSHAPE nodes of conforms
+
+    def conforms(self, shapename: Node, focus: Node) -> bool:
+        """Whether focus satisfies the shape named shapename"""
+        reference = self._references.get(shapename)
+        if reference is None:
+            reference = self._references[shapename] = SANode(Op.HASSHAPE, [shapename])
+        return self.holds(reference, focus)
+
+    def holds(self, node: SANode, focus: Node) -> bool:
+        """Whether focus satisfies node"""
+        value = self._request(node, focus)
+        if value is not None:
+            return value
+
+        # Stack of [generator, memo key, low]: every generator yields the
+        # (node, focus) pairs it needs and is sent back their truth value.
+        # active maps the keys on the stack to their depth, and low is the
+        # smallest depth of an active key the result was assumed for. Only
+        # results that assumed nothing below their own depth are memoized,
+        # the others depend on an assumption that may still turn out false.
+        self._pinned[id(node)] = node
+        stack = [[self._evaluate(node, focus), (id(node), focus), _NO_ASSUMPTION]]
+        active = {stack[0][1]: 0}
+        value = None
+        while stack:
+            entry = stack[-1]
+            generator, key, low = entry
+            try:
+                request = generator.send(value)
+            except StopIteration as stop:
+                stack.pop()
+                depth = active.pop(key)
+                value = stop.value
+                if low >= depth:  # the recursion through key is closed
+                    self._memo[key] = value
+                elif stack:
+                    stack[-1][2] = min(stack[-1][2], low)
+                continue
+
+            subnode, subfocus = request
+            value = self._request(subnode, subfocus)
+            if value is None:
+                subkey = (id(subnode), subfocus)
+                if subkey in active:  # recursion: assume the shape holds
+                    value = True
+                    entry[2] = min(low, active[subkey])
+                else:
+                    self._pinned[id(subnode)] = subnode
+                    active[subkey] = len(stack)
+                    stack.append([self._evaluate(subnode, subfocus), subkey, _NO_ASSUMPTION])
+        return value
+
+    def values(self, path: PANode, focus: Node) -> Set[Node]:
+        """The nodes reachable from focus through path"""
+        return self.paths.values(path, focus)
+
+    def _request(self, node: SANode, focus: Node) -> Optional[bool]:
+        # The truth value if it is known without evaluating subformulas
+        op = node.op
+        if op == Op.TOP:
+            return True
+        if op == Op.BOT:
+            return False
+        if op == Op.HASVALUE:
+            return focus == node.children[0]
+        if op == Op.IN:
+            return focus in node.children[0]
+        if op == Op.TEST:
+            test = self._tests.get(id(node))
+            if test is None:
+                test = self._tests[id(node)] = compile_test(node)
+                self._pinned[id(node)] = node
+            return test(focus)
+        if op == Op.HASSHAPE and node.children[0] not in self.definitions:
+            return True  # mimics real SHACL semantics
+        return self._memo.get((id(node), focus))
+
+    def _evaluate(self, node: SANode, focus: Node):
+        # Generator deciding node for focus (see holds)
+        op = node.op
+        if op == Op.HASSHAPE:
+            return (yield self.definitions[node.children[0]], focus)
+
+        if op == Op.NOT:
+            return not (yield node.children[0], focus)
+
+        if op == Op.AND:
+            for child in node.children:
+                if not (yield child, focus):
+                    return False
+            return True
+
+        if op == Op.OR:
+            for child in node.children:
+                if (yield child, focus):
+                    return True
+            return False
+
+        if op == Op.FORALL:
+            for value in self.values(node.children[0], focus):
+                if not (yield node.children[1], value):
+                    return False
+            return True
+
+        if op == Op.COUNTRANGE:
+            shape = node.children[3]
+            return (yield from _in_range(
+                node, [(shape, value) for value in self.values(node.children[2], focus)]))
+
+        if op == Op.CHILDRANGE:
+            return (yield from _in_range(node, [(child, focus) for child in node.children[2:]]))
+
+        if op == Op.EQ:
+            return self.values(node.children[0], focus) == \
+                self.values(node.children[1], focus)
+
+        if op == Op.DISJ:
+            return self.values(node.children[0], focus).isdisjoint(
+                self.values(node.children[1], focus))
+
+        if op in (Op.LESSTHAN, Op.LESSTHANEQ):
+            allowed = (-1,) if op == Op.LESSTHAN else (-1, 0)
+            right = self.values(node.children[1], focus)
+            return all(compare(x, y) in allowed
+                       for x in self.values(node.children[0], focus)
+                       for y in right)
+
+        if op == Op.UNIQUELANG:
+            languages = [value.language for value in self.values(node.children[0], focus)
+                         if type(value) == Literal and value.language]
+            return len(languages) == len(set(languages))
+
+        if op == Op.CLOSED:
+            allowed = {path.children[0] for path in node.children}
+            return all(predicate in allowed
+                       for predicate in self.graph.predicates(focus))
+
+        raise ValueError(f'Unable to evaluate operator {op}')
+
+
+_NO_ASSUMPTION = float('inf')
+
+
+def _in_range(node: SANode, requests: List[Tuple[SANode, Node]]):
+    # Generator deciding whether the number of requests that hold is in the
+    # range of node (a COUNTRANGE or CHILDRANGE), stopping as soon as it is known
+    lower = int(node.children[0])
+    upper = None if node.children[1] is None else int(node.children[1])
+    remaining = len(requests)
+    count = 0
+    for request in requests:
+        if count >= lower and upper is None:
+            return True
+        if count + remaining < lower:
+            return False
+        remaining -= 1
+        if (yield request):
+            count += 1
+            if upper is not None and count > upper:
+                return False
+    return count >= lower and (upper is None or count <= upper)
@@ -0,0 +1,307 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from rdflib import Graph, SH, RDF, Literal
+from rdflib.term import Node
+
+from slsparser.shapels import ShapesGraphIndex, SANode, Op, parse_shapes
+from slsparser.pathls import PANode, POp, inverse
+from slsparser.pathevaluate import PathEvaluator
+from slsparser.evaluate import Evaluator
+from slsparser.targets import target_sets
+
+Triple = Tuple[Node, Node, Node]
+
+# parameters that refer to a shape by its name only
+_BY_NAME = frozenset([SH.property, SH.node, SH.qualifiedValueShape, SH['not']])
+
+
+class IncrementalParser:
+    """Keeps the parse of a shapes graph up to date while it is edited.
+
+    definitions and target are the dictionaries parse(graph, full) would
+    return. update(added, removed) applies triples to the graph and reparses
+    only the shapes they affect: the shapes whose own triples changed, or the
+    triples of a blank node, rdf list or path they read; new shapes; the
+    property shapes that share a parent with an affected property shape
+    (for sh:qualifiedValueShapesDisjoint); and the closed parents of an
+    affected property shape (sh:closed reads the paths of the property
+    shapes).
+    """
+
+    def __init__(self, graph: Graph, full: bool = True):
+        self.graph = graph
+        self.full = full
+        self.index = ShapesGraphIndex(graph)
+        self.definitions: Dict[Node, SANode]
+        self.target: Dict[Node, SANode]
+        self.definitions, self.target = parse_shapes(self.index, self.index.shapes, full)
+
+    def update(self, added: Iterable[Triple] = (), removed: Iterable[Triple] = ()) -> Set[Node]:
+        """Add and remove triples, and update the parse. Returns the names of
+        the shapes whose definition was reparsed or dropped."""
+        added = [triple for triple in dict.fromkeys(added) if triple not in self.graph]
+        removed = [triple for triple in dict.fromkeys(removed) if triple in self.graph]
+        changed = [s for s, _, _ in added + removed]
+
+        affected = self._owners(changed)  # what reached the old triples
+        shapes = set(self.index.shapes)
+        for triple in removed:
+            self.graph.remove(triple)
+        for triple in added:
+            self.graph.add(triple)
+        self.index.update(added, removed)
+        affected |= self._owners(changed)
+
+        dropped = shapes - self.index.shapes
+        affected |= self.index.shapes - shapes
+        affected |= self._siblings(affected, added + removed)
+        affected |= self._closed_parents(affected)
+        affected &= self.index.shapes
+
+        for shapename in dropped:
+            del self.definitions[shapename]
+            del self.target[shapename]
+        definitions, target = parse_shapes(self.index, affected, self.full)
+        self.definitions.update(definitions)
+        self.target.update(target)
+        return affected | dropped
+
+    def _owners(self, nodes: List[Node]) -> Set[Node]:
+        # The shapes whose parse reads the triples of nodes: the shapes that
+        # reach them through blank nodes, rdf lists and paths, but not
+        # through references to a shape by its name
+        owners = set()
+        seen = set(nodes)
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            shape = node in self.index.shapes
+            if shape:
+                owners.add(node)
+            for subject, predicate in self.graph.subject_predicates(node):
+                if predicate in _BY_NAME or subject in seen:
+                    continue
+                if shape and predicate == RDF.first and self.index.in_shape_list(subject):
+                    continue
+                seen.add(subject)
+                stack.append(subject)
+        return owners
+
+    def _siblings(self, shapes: Set[Node], triples: List[Triple]) -> Set[Node]:
+        # The property shapes that share a parent with one of shapes, or
+        # whose parent got or lost a property shape
+        parents = {s for s, p, _ in triples if p == SH.property}
+        for shapename in shapes:
+            parents.update(self.index.parents.get(shapename, []))
+        siblings = set()
+        for parent in parents:
+            siblings.update(self.index.parameters(parent).get(SH.property, []))
+        return siblings
+
+    def _closed_parents(self, shapes: Set[Node]) -> Set[Node]:
+        # The closed shapes that read the sh:path of one of shapes
+        return {parent for shapename in shapes
+                for parent in self.index.parents.get(shapename, [])
+                if Literal(True) in self.index.parameters(parent).get(SH.closed, [])}
+
+
+# a definition (name, False) or a target formula (name, True)
+Formula = Tuple[Node, bool]
+
+
+class IncrementalValidator:
+    """Keeps the validation results of a data graph up to date while it is
+    edited.
+
+    definitions and target are the dictionaries returned by parse. focus maps
+    every shape name to its focus nodes and results maps every (shape name,
+    focus node) pair to whether the focus node conforms, as validate would.
+    update(added, removed) applies triples to the data graph and rechecks only
+    the pairs they can affect; the results of all other pairs are kept, and
+    so are the cached closures of the paths that do not use a changed
+    predicate.
+
+    The affected nodes are found from the structure of the formulas: every
+    PROP (or INV PROP) step of a path and every CLOSED shape looks up the
+    triples of the nodes it is evaluated at, which are reached from the focus
+    node through the enclosing paths. A changed triple can only affect the
+    focus nodes that reach its subject (or object, for an inverse step) that
+    way in the graph before the update. HASSHAPE references pass the affected
+    nodes of the referenced shape back through the same paths, and TEST and
+    HASVALUE constants read no triples at all.
+    """
+
+    def __init__(self, data_graph: Graph, definitions: Dict[Node, SANode],
+                 target: Dict[Node, SANode]):
+        self.graph = data_graph
+        self.definitions = definitions
+        self.target = target
+        self.focus: Dict[Node, Set[Node]] = target_sets(data_graph, target)
+        self._paths = PathEvaluator(data_graph)
+        evaluator = Evaluator(data_graph, definitions, self._paths)
+        self.results: Dict[Tuple[Node, Node], bool] = {
+            (shapename, node): evaluator.conforms(shapename, node)
+            for shapename, focus in self.focus.items() for node in focus}
+
+        formulas = {(name, False): definition for name, definition in definitions.items()}
+        formulas.update({(name, True): formula for name, formula in target.items()})
+        self._lookups = _Lookups(formulas)
+
+    def update(self, added: Iterable[Triple] = (),
+               removed: Iterable[Triple] = ()) -> Set[Tuple[Node, Node]]:
+        """Add and remove triples, and update the results. Returns the
+        (shape name, focus node) pairs that were rechecked or dropped."""
+        added = [triple for triple in dict.fromkeys(added) if triple not in self.graph]
+        removed = [triple for triple in dict.fromkeys(removed) if triple in self.graph]
+        nodes = {node for s, _, o in added + removed for node in (s, o)}
+        present = {node for node in nodes if self._in_graph(node)}
+
+        touched = self._lookups.touched(self._paths, added + removed)
+        for triple in removed:
+            self.graph.remove(triple)
+        for triple in added:
+            self.graph.add(triple)
+        self._paths.forget({p for _, p, _ in added + removed})
+        # nodes entering or leaving the graph can enter or leave a target
+        moved = {node for node in nodes if self._in_graph(node) != (node in present)}
+
+        evaluator = Evaluator(self.graph, self.definitions, self._paths)
+        out = set()
+        for shapename, formula in self.target.items():
+            focus = self.focus[shapename]
+            constants = _constants(formula)
+            candidates = touched.get((shapename, True), set()) | moved
+            recheck = touched.get((shapename, False), set()) & focus
+            for node in candidates:
+                targeted = node in constants or \
+                    (self._in_graph(node) and evaluator.holds(formula, node))
+                if targeted and node not in focus:
+                    focus.add(node)
+                    recheck.add(node)
+                elif not targeted and node in focus:
+                    focus.discard(node)
+                    recheck.discard(node)
+                    del self.results[(shapename, node)]
+                    out.add((shapename, node))
+            for node in recheck:
+                self.results[(shapename, node)] = evaluator.conforms(shapename, node)
+                out.add((shapename, node))
+        return out
+
+    def _in_graph(self, node: Node) -> bool:
+        return (node, None, None) in self.graph or (None, None, node) in self.graph
+
+
+def _constants(formula: SANode) -> Set[Node]:
+    # the focus nodes of the sh:targetNode declarations of a target formula
+    alternatives = formula.children if formula.op == Op.OR else [formula]
+    return {alternative.children[0] for alternative in alternatives
+            if alternative.op == Op.HASVALUE}
+
+
+_ID = PANode(POp.ID, [])
+
+
+class _Lookups:
+    # Where formulas look up the triples of the data graph. For every
+    # (predicate, backwards) pair, the formulas that look it up with the
+    # inverse of the path from their focus node to the node looked up at; the
+    # predicate None stands for all predicates (CLOSED). For every formula,
+    # the formulas referring to it with the inverse of the path to the node
+    # it is evaluated at.
+
+    def __init__(self, formulas: Dict[Formula, SANode]):
+        self.lookups: Dict[Tuple[Optional[Node], bool], List[Tuple[Formula, PANode]]] = {}
+        self.references: Dict[Formula, List[Tuple[Formula, PANode]]] = {}
+        for key, formula in formulas.items():
+            stack = [(formula, ())]
+            while stack:
+                node, context = stack.pop()
+                op = node.op
+                if op == Op.HASSHAPE:
+                    referenced = (node.children[0], False)
+                    if referenced in formulas:
+                        self.references.setdefault(referenced, []).append(
+                            (key, _reverse(context)))
+                elif op in (Op.NOT, Op.AND, Op.OR):
+                    stack.extend((child, context) for child in node.children)
+                elif op == Op.CHILDRANGE:
+                    stack.extend((child, context) for child in node.children[2:])
+                elif op in (Op.FORALL, Op.COUNTRANGE):
+                    path, shape = node.children[-2:]
+                    self._add_path(key, context, path)
+                    stack.append((shape, context + (path,)))
+                elif op in (Op.EQ, Op.DISJ, Op.LESSTHAN, Op.LESSTHANEQ, Op.UNIQUELANG):
+                    for path in node.children:
+                        self._add_path(key, context, path)
+                elif op == Op.CLOSED:
+                    self.lookups.setdefault((None, False), []).append((key, _reverse(context)))
+
+    def _add_path(self, key: Formula, context: Tuple[PANode, ...], path: PANode):
+        for prefix, predicate, backwards in _steps(path):
+            self.lookups.setdefault((predicate, backwards), []).append(
+                (key, _reverse(context + prefix)))
+
+    def touched(self, paths: PathEvaluator, triples: List[Triple]) -> Dict[Formula, Set[Node]]:
+        """For every formula, the nodes at which its evaluation looks up one
+        of triples, in the graph of paths"""
+        anchors: Dict[Tuple[Optional[Node], bool], Set[Node]] = {}
+        for s, p, o in triples:
+            anchors.setdefault((p, False), set()).add(s)
+            anchors.setdefault((p, True), set()).add(o)
+            anchors.setdefault((None, False), set()).add(s)
+
+        out: Dict[Formula, Set[Node]] = {}
+        for lookup, nodes in anchors.items():
+            for key, reverse in self.lookups.get(lookup, ()):
+                out.setdefault(key, set()).update(_reaching(paths, reverse, nodes))
+
+        stack = list(out.items())  # pass new nodes back through the references
+        while stack:
+            key, nodes = stack.pop()
+            for referrer, reverse in self.references.get(key, ()):
+                new = _reaching(paths, reverse, nodes) - out.get(referrer, set())
+                if new:
+                    out.setdefault(referrer, set()).update(new)
+                    stack.append((referrer, new))
+        return out
+
+
+def _steps(path: PANode) -> List[Tuple[Tuple[PANode, ...], Node, bool]]:
+    # The (prefix, predicate, backwards) steps of a path: the predicate is
+    # looked up (backwards) at the nodes reached through the prefix paths
+    out = []
+    stack = [(path, ())]
+    while stack:
+        path, prefix = stack.pop()
+        pop = path.pop
+        if pop == POp.PROP:
+            out.append((prefix, path.children[0], False))
+        elif pop == POp.INV and path.children[0].pop == POp.PROP:
+            out.append((prefix, path.children[0].children[0], True))
+        elif pop == POp.INV:
+            stack.append((inverse(path.children[0]), prefix))
+        elif pop == POp.COMP:
+            for i, step in enumerate(path.children):
+                stack.append((step, prefix + tuple(path.children[:i])))
+        elif pop in (POp.ALT, POp.ZEROORONE):
+            stack.extend((child, prefix) for child in path.children)
+        elif pop == POp.KLEENE:
+            stack.append((path.children[0], prefix + (path,)))
+    return out
+
+
+def _reverse(context: Tuple[PANode, ...]) -> PANode:
+    # the inverse of the path from a focus node through context
+    if not context:
+        return _ID
+    return inverse(context[0] if len(context) == 1 else PANode(POp.COMP, list(context)))
+
+
+def _reaching(paths: PathEvaluator, reverse: PANode, nodes: Set[Node]) -> Set[Node]:
+    if reverse.pop == POp.ID:
+        return set(nodes)
+    out = set()
+    for values in paths.pairs(reverse, nodes).values():
+        out |= values
+    return out
@@ -0,0 +1,207 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from rdflib.term import Node, URIRef
+
+from slsparser.shapels import SANode, Op
+from slsparser.pathls import PANode, POp
+from slsparser.traversal import fold
+
+
+class NodeInterner:
+    """Hash-consing factory for SANode and PANode trees.
+
+    The factory hands out one shared instance per structurally identical node.
+    Interned nodes carry a precomputed hash and store their children in a
+    tuple: they must be treated as immutable. Two interned nodes from the same
+    factory are structurally identical iff they are the same object, so '=='
+    between them short-circuits on identity (and on differing hashes).
+
+    Unlike '==', interning distinguishes blank node children: two HASSHAPE
+    nodes referring to different blank node shapes are not merged.
+    """
+
+    def __init__(self):
+        self._table: Dict[Tuple, Union[SANode, PANode]] = {}
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def sanode(self, op: Op, children: List,
+               constraintComponent: Union[URIRef, Tuple[URIRef, ...], None] = None) -> SANode:
+        """The shared SANode for op, children and constraintComponent.
+        SANode/PANode children are interned first."""
+        return self._sanode(op, tuple(self.intern(c) for c in children),
+                            constraintComponent)
+
+    def panode(self, pop: POp, children: List) -> PANode:
+        """The shared PANode for pop and children.
+        PANode children are interned first."""
+        return self._panode(pop, tuple(self.intern(c) for c in children))
+
+    def intern(self, node):
+        """The shared instance of a (not necessarily interned) tree.
+        Values that are not SANode/PANode are returned as is."""
+        return fold(node, self._intern_visit)
+
+    def _intern_visit(self, node):
+        if type(node) not in (SANode, PANode) or self._owns(node):
+            return [], lambda _: node
+        if type(node) == SANode:
+            return list(node.children), lambda children: self._sanode(
+                node.op, tuple(children), node.constraintComponent)
+        return list(node.children), lambda children: self._panode(
+            node.pop, tuple(children))
+
+    def _sanode(self, op, children: Tuple, constraintComponent) -> SANode:
+        # children must already be interned
+        key = (SANode, op, _key(children), constraintComponent)
+        node = self._table.get(key)
+        if node is None:
+            node = SANode(op, children, constraintComponent)
+            node._hash = hash(node)  # cheap: the children hashes are cached
+            self._table[key] = node
+        return node
+
+    def _panode(self, pop, children: Tuple) -> PANode:
+        # children must already be interned
+        key = (PANode, pop, _key(children))
+        node = self._table.get(key)
+        if node is None:
+            node = PANode(pop, children)
+            node._hash = hash(node)
+            self._table[key] = node
+        return node
+
+    def _owns(self, node) -> bool:
+        if node._hash is None:
+            return False
+        if type(node) == SANode:
+            key = (SANode, node.op, _key(node.children), node.constraintComponent)
+        else:
+            key = (PANode, node.pop, _key(node.children))
+        return self._table.get(key) is node
+
+
+def _key(children) -> Tuple:
+    # Exact key of a children tuple: interned nodes by identity, terms by
+    # type and value (so blank nodes stay distinct), lists as tuples.
+    out = []
+    for c in children:
+        if type(c) in (SANode, PANode):
+            out.append(id(c))
+        elif isinstance(c, (list, tuple)):
+            out.append((list, _key(c)))
+        else:
+            out.append((type(c), c))
+    return tuple(out)
+
+
+class SharingReport(NamedTuple):
+    """The shrinking achieved by eliminate_common_subexpressions"""
+    before: int  # distinct node objects in the definitions given
+    after: int  # distinct node objects in the definitions returned
+    names: int  # synthetic definitions added
+
+    def __str__(self):
+        saved = 1 - self.after / self.before if self.before else 0
+        return (f'{self.before} nodes -> {self.after} nodes ({saved:.0%} fewer), '
+                f'{self.names} shared subformulas named')
+
+
+# prefix of the synthetic shape names of shared subformulas
+SUBFORMULA = 'urn:slsparser:subformula:'
+
+# subformulas not worth naming: a reference is no smaller
+_LEAVES = frozenset([Op.TEST, Op.HASVALUE, Op.IN, Op.HASSHAPE, Op.TOP, Op.BOT])
+
+
+def eliminate_common_subexpressions(definitions: Dict, names: bool = False,
+                                    interner: Optional[NodeInterner] = None
+                                    ) -> Tuple[Dict, SharingReport]:
+    """Share the structurally equal subtrees of all definitions.
+
+    Every SANode/PANode subtree is replaced by one shared (interned) instance,
+    so an Evaluator, whose memo is per node object, decides every distinct
+    subformula once per focus node. With names=True, every SANode that is not
+    a leaf and occurs in more than one place is moved to a definition of its
+    own: its occurrences become HASSHAPE references to an existing definition
+    equal to it, or otherwise to a synthetic name (a URIRef starting with
+    SUBFORMULA). Returns the new definitions and a SharingReport.
+    """
+    before = _count(definitions.values())
+    if interner is None:
+        interner = NodeInterner()
+    shared = {shapename: interner.intern(node) for shapename, node in definitions.items()}
+    if not names:
+        return shared, SharingReport(before, _count(shared.values()), 0)
+
+    references: Dict[int, int] = {}
+    for node in _distinct(shared.values()):
+        for child in node.children:
+            if type(child) == SANode:
+                references[id(child)] = references.get(id(child), 0) + 1
+    for node in shared.values():
+        references[id(node)] = references.get(id(node), 0) + 1
+
+    named: Dict[int, Node] = {}  # by id: a shared subformula and its name
+    for shapename, node in shared.items():
+        named.setdefault(id(node), shapename)
+    added = 0
+    for node in _distinct(shared.values()):
+        if type(node) == SANode and node.op not in _LEAVES and \
+                references[id(node)] > 1 and id(node) not in named:
+            named[id(node)] = URIRef(f'{SUBFORMULA}{added}')
+            added += 1
+
+    roots = {shapename: node for shapename, node in shared.items()}
+    for node in _distinct(shared.values()):
+        name = named.get(id(node))
+        if name is not None and name not in roots:
+            roots[name] = node
+    out = {}
+    rebuilt: Dict[int, object] = {}
+    for shapename, node in roots.items():
+        out[shapename] = _referring(node, named, rebuilt, interner)
+    return out, SharingReport(before, _count(out.values()), added)
+
+
+def _referring(root, named: Dict[int, Node], rebuilt: Dict[int, object],
+               interner: NodeInterner):
+    # root with its named proper subformulas replaced by HASSHAPE references
+    def visit(node):
+        if type(node) not in (SANode, PANode):
+            return [], lambda _: node
+        if node is not root and id(node) in named:
+            return [], lambda _: interner.sanode(Op.HASSHAPE, [named[id(node)]])
+        if node is not root and id(node) in rebuilt:
+            return [], lambda _: rebuilt[id(node)]
+
+        def finish(children):
+            if type(node) == SANode:
+                new = interner.sanode(node.op, children, node.constraintComponent)
+            else:
+                new = interner.panode(node.pop, children)
+            if node is not root:
+                rebuilt[id(node)] = new
+            return new
+        return list(node.children), finish
+    return fold(root, visit)
+
+
+def _distinct(roots) -> List:
+    # every node reachable from roots, once, in depth-first order
+    out = []
+    seen = set()
+    stack = list(reversed(list(roots)))
+    while stack:
+        node = stack.pop()
+        if type(node) not in (SANode, PANode) or id(node) in seen:
+            continue
+        seen.add(id(node))
+        out.append(node)
+        stack.extend(reversed(node.children))
+    return out
+
+
+def _count(roots) -> int:
+    return len(_distinct(roots))
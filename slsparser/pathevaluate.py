@@ -0,0 +1,130 @@
+from typing import Dict, FrozenSet, Iterable, Set
+
+from rdflib import Graph
+from rdflib.term import Node
+
+from slsparser.pathls import PANode, POp, inverse
+from slsparser.automaton import PathAutomaton, compile_path
+
+
+class PathEvaluator:
+    """Evaluates PANode path expressions over a data graph, a set at a time.
+
+    pairs(path, starts) returns, for every start node, the nodes it reaches
+    through path. Every step of a sequence path is evaluated once for the
+    union of the nodes reached so far, not once per start node.
+
+    The closures of zero-or-more paths are cached per evaluator (so per data
+    graph): rdf:type/rdfs:subClassOf* computes the superclasses of every class
+    only once. The cache assumes the graph is not modified, or that forget is
+    called with the predicates of the triples that changed.
+
+    With automata=True, every path is instead compiled once into a
+    PathAutomaton and evaluated by a search of the product of graph and
+    automaton, which visits every (node, automaton state) pair at most once,
+    however deeply the zero-or-more paths are nested.
+    """
+
+    def __init__(self, graph: Graph, automata: bool = False):
+        self.graph = graph
+        self.automata = automata
+        self._closures: Dict[PANode, Dict[Node, FrozenSet[Node]]] = {}
+        self._automata: Dict[PANode, PathAutomaton] = {}
+
+    def values(self, path: PANode, node: Node) -> Set[Node]:
+        """The nodes reachable from node through path"""
+        return self.pairs(path, [node])[node]
+
+    def pairs(self, path: PANode, starts: Iterable[Node]) -> Dict[Node, Set[Node]]:
+        """For every start node, the set of nodes reachable through path"""
+        starts = set(starts)
+        if self.automata:
+            automaton = self._automata.get(path)
+            if automaton is None:
+                automaton = self._automata[path] = compile_path(path)
+            return {start: automaton.reachable(self.graph, start) for start in starts}
+
+        pop = path.pop
+
+        if pop == POp.ID:
+            return {start: {start} for start in starts}
+
+        if pop == POp.PROP:
+            return self._step(path.children[0], starts, False)
+
+        if pop == POp.INV:
+            child = path.children[0]
+            if child.pop == POp.PROP:
+                return self._step(child.children[0], starts, True)
+            return self.pairs(inverse(child), starts)
+
+        if pop == POp.COMP:
+            reached = {start: {start} for start in starts}
+            for step in path.children:
+                frontier = set().union(*reached.values())
+                step_pairs = self.pairs(step, frontier)
+                reached = {start: set().union(*(step_pairs[node] for node in nodes))
+                           for start, nodes in reached.items()}
+            return reached
+
+        if pop == POp.ALT:
+            reached = {start: set() for start in starts}
+            for alternative in path.children:
+                for start, nodes in self.pairs(alternative, starts).items():
+                    reached[start] |= nodes
+            return reached
+
+        if pop == POp.ZEROORONE:
+            reached = self.pairs(path.children[0], starts)
+            for start in starts:
+                reached[start].add(start)
+            return reached
+
+        if pop == POp.KLEENE:
+            closures = self._closure(path.children[0], starts)
+            return {start: set(closures[start]) for start in starts}
+
+        raise ValueError(f'Unknown path operator {pop}')
+
+    def forget(self, predicates: Iterable[Node]):
+        """Drop the cached closures of the paths that use one of predicates"""
+        predicates = set(predicates)
+        for path in list(self._closures):
+            stack = [path]
+            while stack:
+                node = stack.pop()
+                if node.pop == POp.PROP:
+                    if node.children[0] in predicates:
+                        del self._closures[path]
+                        break
+                else:
+                    stack.extend(node.children)
+
+    def _step(self, predicate, starts: Set[Node], inverse: bool) -> Dict[Node, Set[Node]]:
+        if inverse:
+            return {start: set(self.graph.subjects(predicate, start)) for start in starts}
+        return {start: set(self.graph.objects(start, predicate)) for start in starts}
+
+    def _closure(self, path: PANode, starts: Set[Node]) -> Dict[Node, FrozenSet[Node]]:
+        # the reflexive transitive closure of path, from the cache if possible
+        cache = self._closures.setdefault(path, {})
+        for start in starts:
+            if start in cache:
+                continue
+            reached = {start}
+            frontier = {start}
+            while frontier:
+                step_pairs = self.pairs(path, frontier)
+                frontier = set()
+                for nodes in step_pairs.values():
+                    for node in nodes:
+                        if node in reached:
+                            continue
+                        reached.add(node)
+                        if node in cache:  # a complete closure: no need to expand
+                            reached |= cache[node]
+                        else:
+                            frontier.add(node)
+            cache[start] = frozenset(reached)
+        return cache
+
@@ -7,6 +7,8 @@ from rdflib import SH, RDF
 from rdflib.term import URIRef, BNode
 from rdflib.collection import Collection
 
+from slsparser.traversal import TreeNode
+
 
 class POp(Enum):  # Path Operator
     PROP = auto()
@@ -18,41 +20,23 @@ class POp(Enum):  # Path Operator
     ID = auto() # for EQ and DISJ, no child
 
 
-class PANode:  # Path Algebra Node
+class PANode(TreeNode):  # Path Algebra Node
     """Ordered tree representing a path expression"""
+    __slots__ = ('pop', 'children', '_hash')
 
     def __init__(self, pop: POp, children: List):
         self.pop = pop
         self.children = children
+        self._hash = None  # only set on interned (immutable) nodes
 
-    def __eq__(self, other):
-        """ Overwrite the '==' operator """
-        if not isinstance(other, PANode):
-            return False
-
-        if self.pop == POp.PROP:
-            return self.pop == other.pop and \
-              self.children[0] == other.children[0]
-
-        if len(self.children) != len(other.children):
-            return False
-        same_children = True
-        for child_self, child_other in zip(self.children, other.children):
-            if type(child_self) == BNode and type(child_other) == BNode:
-                continue
-            same_children = same_children and child_self == child_other
+    def _header(self):
+        return (self.pop,)
 
-        return self.pop == other.pop and same_children
+    def _repr_header(self):
+        return str(self.pop) + ' '
 
-    def __repr__(self):
-        """ Pretty representation of the PANode tree """
-        out = '\n('
-        out += str(self.pop) + ' '
-        for c in self.children:
-            for line in c.__repr__().split('\n'):
-                out += ' ' + line + '\n'
-        out = out[:-1] + ')'
-        return out
+    def __reduce__(self):
+        return PANode, (self.pop, self.children)
 
 
 def parse(graph: Graph, path) -> PANode:
@@ -110,3 +94,16 @@ def _parse_path(graph: Graph, path: BNode) -> PANode:
         return PANode(POp.ALT, children)
 
     raise ValueError(f'The path {path} is not well-formed')
+
+
+def inverse(path: PANode) -> PANode:
+    """A path expression for the inverse of path"""
+    if path.pop == POp.PROP:
+        return PANode(POp.INV, [path])
+    if path.pop == POp.ID:
+        return path
+    if path.pop == POp.INV:
+        return path.children[0]
+    if path.pop == POp.COMP:
+        return PANode(POp.COMP, [inverse(step) for step in reversed(path.children)])
+    return PANode(path.pop, [inverse(child) for child in path.children])
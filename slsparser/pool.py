@@ -0,0 +1,59 @@
+"""Helpers shared by the process pool parse and validation."""
+import gc
+import multiprocessing
+from array import array
+from contextlib import contextmanager
+from typing import List, Tuple
+
+from rdflib import Graph
+from rdflib.term import Node
+
+# Where processes can be forked, workers inherit the parent's graphs (copy on
+# write) and nothing needs to be shipped to them.
+FORK = 'fork' in multiprocessing.get_all_start_methods()
+
+
+def context():
+    """The multiprocessing context for worker pools"""
+    return multiprocessing.get_context('fork') if FORK else None
+
+
+def encode_triples(graph: Graph) -> Tuple[List[Node], array]:
+    """A compact copy of graph: its terms, and its triples as an array of term
+    numbers. The triples are grouped by subject, in the order of graph."""
+    numbers = {}
+    terms = []
+    triples = array('q')
+    for subject in graph.subjects(unique=True):
+        for predicate, obj in graph.predicate_objects(subject):
+            for term in (subject, predicate, obj):
+                number = numbers.get(term)
+                if number is None:
+                    number = numbers[term] = len(terms)
+                    terms.append(term)
+                triples.append(number)
+    return terms, triples
+
+
+def decode_triples(terms: List[Node], triples: array) -> Graph:
+    """The graph of a copy made by encode_triples"""
+    graph = Graph()
+    for i in range(0, len(triples), 3):
+        graph.add((terms[triples[i]], terms[triples[i + 1]], terms[triples[i + 2]]))
+    return graph
+
+
+@contextmanager
+def paused_gc():
+    """Pause the garbage collector while a pool runs or many nodes are
+    decoded: unpickling many small nodes otherwise triggers many collections,
+    and forked workers would scan (and so copy) the whole inherited heap."""
+    collecting = gc.isenabled()
+    gc.disable()
+    gc.freeze()
+    try:
+        yield
+    finally:
+        gc.unfreeze()
+        if collecting:
+            gc.enable()
@@ -0,0 +1,192 @@
+"""Compilation of Op.TEST nodes into predicates on a single term.
+
+compile_test does the work that does not depend on the value once: regular
+expressions are compiled (and shared through a cache keyed by pattern and
+flags), numeric bounds are converted to Python values, length bounds to
+integers and language tags to lower case, and datatypes and node kinds are
+looked up in tables. What remains per value is a few type checks and
+comparisons.
+"""
+import re
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from rdflib import SH, RDF, XSD
+from rdflib.term import URIRef, Literal, BNode, Node
+
+from slsparser.shapels import SANode, Op
+
+Predicate = Callable[[Node], bool]
+
+
+def compile_test(node: SANode) -> Predicate:
+    """A function deciding node, an Op.TEST node, for a value"""
+    if node.op != Op.TEST:
+        raise ValueError(f'Unable to compile operator {node.op}')
+    test = node.children[0]
+
+    if test == SH.DatatypeConstraintComponent:
+        return _datatype_test(node.children[1])
+
+    if test == SH.NodeKindConstraintComponent:
+        kinds = _NODE_KINDS.get(node.children[1], ())
+        return lambda value: type(value) in kinds
+
+    if test == SH.PatternConstraintComponent:
+        # the parser stores the pattern with every backslash doubled
+        pattern = node.children[1].replace('\\\\', '\\')
+        search = _regex(pattern, _regex_flags(node.children[2])).search
+        return lambda value: type(value) != BNode and search(str(value)) is not None
+
+    if test == SH.LanguageInConstraintComponent:
+        return _language_test([str(tag).lower() for tag in node.children[1]])
+
+    if test == 'numeric_range':
+        return _range_test([(_RANGE_OUTCOMES[component], bound)
+                            for component, bound in zip(node.children[1::2], node.children[2::2])])
+
+    if test == 'length_range':
+        lower, upper = 0, None
+        for component, bound in zip(node.children[1::2], node.children[2::2]):
+            if component == SH.MinLengthConstraintComponent:
+                lower = max(lower, int(bound))
+            else:
+                upper = int(bound) if upper is None else min(upper, int(bound))
+        if upper is None:
+            return lambda value: type(value) != BNode and len(str(value)) >= lower
+        return lambda value: type(value) != BNode and lower <= len(str(value)) <= upper
+
+    raise ValueError(f'Unknown test {test}')
+
+
+_NODE_KINDS = {
+    SH.IRI: frozenset([URIRef]),
+    SH.BlankNode: frozenset([BNode]),
+    SH.Literal: frozenset([Literal]),
+    SH.BlankNodeOrIRI: frozenset([BNode, URIRef]),
+    SH.BlankNodeOrLiteral: frozenset([BNode, Literal]),
+    SH.IRIOrLiteral: frozenset([URIRef, Literal]),
+}
+
+# outcomes of compare(value, bound) that satisfy the numeric range component
+_RANGE_OUTCOMES = {
+    SH.MinExclusiveConstraintComponent: (1,),
+    SH.MinInclusiveConstraintComponent: (0, 1),
+    SH.MaxExclusiveConstraintComponent: (-1,),
+    SH.MaxInclusiveConstraintComponent: (-1, 0),
+}
+
+
+def _datatype_test(datatype: URIRef) -> Predicate:
+    if datatype == RDF.langString:
+        return lambda value: type(value) == Literal and value.language is not None
+
+    def has_datatype(value):
+        return type(value) == Literal and value.language is None and \
+            (value.datatype or XSD.string) == datatype and \
+            not getattr(value, 'ill_typed', False)
+    return has_datatype
+
+
+_REGEX_FLAGS = {'i': re.IGNORECASE, 's': re.DOTALL, 'm': re.MULTILINE, 'x': re.VERBOSE}
+
+_regexes: Dict[Tuple[str, int], Pattern] = {}  # shared by all compiled tests
+
+
+def _regex(pattern: str, flags: int) -> Pattern:
+    compiled = _regexes.get((pattern, flags))
+    if compiled is None:
+        compiled = _regexes[(pattern, flags)] = re.compile(pattern, flags)
+    return compiled
+
+
+def _regex_flags(flags) -> int:
+    out = 0
+    for flag_string in flags:
+        for flag in str(flag_string):
+            out |= _REGEX_FLAGS.get(flag, 0)
+    return out
+
+
+def _language_test(tags: List[str]) -> Predicate:
+    # basic language range matching (RFC 4647)
+    if '*' in tags:
+        return lambda value: type(value) == Literal and value.language is not None
+    exact = frozenset(tags)
+    prefixes = tuple(tag + '-' for tag in tags)
+
+    def language_in(value):
+        if type(value) != Literal or value.language is None:
+            return False
+        language = value.language.lower()
+        return language in exact or language.startswith(prefixes)
+    return language_in
+
+
+_NUMBERS = (int, float, Decimal)
+
+
+def _range_test(bounds: List[Tuple[Tuple[int, ...], Node]]) -> Predicate:
+    checks = []
+    for outcomes, bound in bounds:
+        comparable = _comparable_with(bound)
+        if comparable is None:  # no value is comparable with the bound
+            return lambda value: False
+        checks.append((outcomes, bound.toPython(), comparable))
+    if not checks:
+        return lambda value: True
+
+    def in_range(value):
+        if type(value) != Literal or getattr(value, 'ill_typed', False):
+            return False
+        x = value.toPython()
+        for outcomes, y, comparable in checks:
+            if not comparable(value, x):
+                return False
+            try:
+                if (x > y) - (x < y) not in outcomes:
+                    return False
+            except TypeError:  # e.g. a datetime with and one without timezone
+                return False
+        return True
+    return in_range
+
+
+def _comparable_with(bound: Node) -> Optional[Callable[[Literal, object], bool]]:
+    # Whether a literal (and its Python value) can be compared with bound,
+    # following compare. None if nothing can.
+    if type(bound) != Literal or getattr(bound, 'ill_typed', False):
+        return None
+    y = bound.toPython()
+    if isinstance(y, _NUMBERS) and not isinstance(y, bool):
+        return lambda value, x: isinstance(x, _NUMBERS) and not isinstance(x, bool)
+    if isinstance(y, str):
+        language = bound.language
+        return lambda value, x: isinstance(x, str) and value.language == language
+    if isinstance(y, (date, datetime, time, bool)):
+        kind = type(y)
+        return lambda value, x: type(x) == kind
+    return None
+
+
+def compare(left: Node, right: Node) -> Optional[int]:
+    """-1, 0 or 1 when left is less than, equal to or greater than right.
+    None when the two are not comparable (as with SPARQL's '<')."""
+    if type(left) != Literal or type(right) != Literal:
+        return None
+    if getattr(left, 'ill_typed', False) or getattr(right, 'ill_typed', False):
+        return None
+    x, y = left.toPython(), right.toPython()
+    comparable = (
+        (isinstance(x, _NUMBERS) and isinstance(y, _NUMBERS)
+         and not isinstance(x, bool) and not isinstance(y, bool))
+        or (isinstance(x, str) and isinstance(y, str)
+            and left.language == right.language)
+        or (type(x) == type(y) and isinstance(x, (date, datetime, time, bool))))
+    if not comparable:
+        return None
+    try:
+        return (x > y) - (x < y)
+    except TypeError:  # e.g. a datetime with and one without timezone
+        return None
@@ -0,0 +1,132 @@
+"""Profiling of the parse: wall time, calls and triple pattern lookups per
+phase and per parse helper.
+
+Nothing is instrumented outside a profile_parse() block: on entry the
+functions of the parse are replaced by timing wrappers, and on exit the
+originals are put back, so a parse that is not profiled runs the same code
+as before.
+"""
+import re
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, Iterator, Optional
+
+from rdflib import Graph
+
+from slsparser import shapels, utilities
+
+
+class PhaseStats:
+    """The calls of one phase, with their total wall time and triple pattern
+    lookups, including those of the phases nested in it"""
+    __slots__ = ('calls', 'seconds', 'lookups')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.lookups = 0
+
+    def __repr__(self):
+        return f'PhaseStats(calls={self.calls}, seconds={self.seconds:.6f}, lookups={self.lookups})'
+
+
+class ParseProfile:
+    """What profile_parse() measured: the PhaseStats of every phase that
+    ran, by name, and the number of triple pattern lookups made against any
+    rdflib Graph"""
+
+    def __init__(self, callback: Optional[Callable[[str, float, int], None]] = None):
+        self.phases: Dict[str, PhaseStats] = {}
+        self.lookups = 0
+        self._callback = callback
+
+    def _record(self, name: str, seconds: float, lookups: int):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.lookups += lookups
+        if self._callback is not None:
+            self._callback(name, seconds, lookups)
+
+    def __str__(self):
+        lines = [f'{"phase":28} {"calls":>8} {"seconds":>10} {"lookups":>9}']
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].seconds):
+            lines.append(f'{name:28} {stats.calls:8} {stats.seconds:10.4f} {stats.lookups:9}')
+        lines.append(f'{"triple pattern lookups":28} {"":8} {"":10} {self.lookups:9}')
+        return '\n'.join(lines)
+
+
+# the phases that are not a parse helper: (owner, attribute, phase name)
+_PHASES = [
+    (shapels.ShapesGraphIndex, '__init__', 'discovery'),  # the index of the shapes graph
+    (shapels.ShapesGraphIndex, 'collection', 'collection'),  # rdf lists of the index
+    (shapels, 'pparse', 'path'),  # pathls.parse, with its rdf lists
+    (utilities, 'clean_parsetree', 'clean'),
+]
+
+# every _*_parse helper of shapels is a phase of its own
+_HELPER = re.compile(r'_[a-z_]+_parse(_[a-z]+)?')
+
+_active: Optional[ParseProfile] = None
+
+
+@contextmanager
+def profile_parse(callback: Optional[Callable[[str, float, int], None]] = None
+                  ) -> Iterator[ParseProfile]:
+    """Measure the parse (or anything else) run in the block:
+
+        with profile_parse() as report:
+            parse(graph)
+        print(report)
+
+    callback, if given, is called with (phase, seconds, lookups) after every
+    call of a phase. The block affects the whole process, so profiles cannot
+    be nested. A parse on a pool of workers is only measured in the parent
+    process."""
+    global _active
+    if _active is not None:
+        raise RuntimeError('A parse is already being profiled')
+
+    report = ParseProfile(callback)
+    targets = list(_PHASES)
+    targets += [(shapels, name, name) for name, value in vars(shapels).items()
+                if _HELPER.fullmatch(name) and callable(value)]
+    originals = [(owner, attribute, getattr(owner, attribute))
+                 for owner, attribute, _ in targets]
+    originals.append((Graph, 'triples', Graph.triples))
+
+    for owner, attribute, name in targets:
+        setattr(owner, attribute, _timed(report, name, getattr(owner, attribute)))
+    Graph.triples = _counted(report, Graph.triples)
+    _active = report
+    try:
+        yield report
+    finally:
+        for owner, attribute, original in originals:
+            setattr(owner, attribute, original)
+        _active = None
+
+
+def _timed(report: ParseProfile, name: str, function: Callable) -> Callable:
+    @wraps(function)
+    def timed(*args, **kwargs):
+        lookups = report.lookups
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            report._record(name, perf_counter() - start, report.lookups - lookups)
+    return timed
+
+
+def _counted(report: ParseProfile, triples: Callable) -> Callable:
+    # every call of Graph.triples is one lookup: contains, value, objects,
+    # predicate_objects, iteration, ... all go through it
+    @wraps(triples)
+    def counted(graph, pattern, *args, **kwargs):
+        report.lookups += 1
+        return triples(graph, pattern, *args, **kwargs)
+    return counted
@@ -1,15 +1,20 @@
 from __future__ import annotations
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Set, TYPE_CHECKING
 from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum, auto
 
 from rdflib import Graph
 from rdflib import SH, RDF, RDFS
-from rdflib.term import URIRef, Literal, BNode, Node
-from rdflib.collection import Collection
+from rdflib.term import URIRef, Literal, Node
 
 from slsparser.pathls import parse as pparse
 from slsparser.pathls import PANode, POp
+from slsparser.traversal import TreeNode
+from slsparser import pool
+
+if TYPE_CHECKING:
+    from slsparser.interning import NodeInterner
 
 class Op(Enum):
     HASVALUE = auto() # Op.HASVALUE val
@@ -44,145 +49,436 @@ class Op(Enum):
     BOT = auto() # Op.BOT
 
     COUNTRANGE = auto() # Op.COUNTRANGE num num/None PANode SANode
+    CHILDRANGE = auto() # Op.CHILDRANGE num num/None SANode SANode ...
+    # satisfied if the number of satisfied SANode children is in the range
+    IN = auto() # Op.IN frozenset
+    # satisfied by the members of the set (a HASVALUE for many values)
+
 
+class SANode(TreeNode):  # Shape Algebra Node
+    # no per-instance __dict__: expanded trees can have millions of nodes
+    __slots__ = ('op', 'children', 'constraintComponent', '_hash')
 
-class SANode:  # Shape Algebra Node
     def __init__(self, op: Op, children: List, constraintComponent: URIRef | Tuple[URIRef, ...]| None = None):
         self.op = op
         self.children = children
         self.constraintComponent = constraintComponent
-
-    def __eq__(self, other):
-        """ Overwrite the '==' operator """
-        if not isinstance(other, SANode):
-            return False
-        
-        if len(self.children) != len(other.children):
+        self._hash = None  # only set on interned (immutable) nodes
+
+    def _header(self):
+        return (self.op, self.constraintComponent)
+
+    def _repr_header(self):
+        return str(self.op) + '  cc=' + str(self.constraintComponent) + ' '
+
+    def __reduce__(self):
+        # pickles far faster than the generic __slots__ protocol
+        return SANode, (self.op, self.children, self.constraintComponent)
+
+
+# parameters whose object is (or may be) a shape
+_SHAPE_OBJECT_PARAMETERS = frozenset([
+    SH.property, SH.node, SH.qualifiedValueShape, SH['not'],
+])
+
+# parameters whose subject is a shape (constraint components and targets)
+_SHAPE_SUBJECT_PARAMETERS = frozenset([
+    SH.node, SH.qualifiedValueShape, SH.qualifiedMinCount, SH.qualifiedMaxCount,
+    SH['not'], SH['class'], SH.datatype, SH.nodeKind, SH.minCount, SH.maxCount,
+    SH.minExclusive, SH.minInclusive, SH.maxExclusive, SH.maxInclusive,
+    SH.minLength, SH.maxLength, SH.pattern, SH.languageIn, SH.uniqueLang,
+    SH.equals, SH.disjoint, SH.lessThan, SH.lessThanOrEquals, SH.closed,
+    SH.hasValue, SH.targetClass, SH.targetNode, SH.targetObjectsOf,
+    SH.targetSubjectsOf, SH.property,
+])
+
+# parameters whose object is an rdf list of shapes
+_SHAPE_LIST_PARAMETERS = frozenset([SH['or'], SH['and'], SH.xone])
+
+
+class ShapesGraphIndex:
+    """Index of a shapes graph, built in a single pass over its triples.
+
+    It classifies the node shapes and property shapes of the graph, and keeps
+    the rdf lists and sh:property parents around so the discovery phase
+    never has to rescan the graph.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.shapes: Set[Node] = set()
+        self.parents: Dict[Node, List[Node]] = {}  # sh:property object -> subjects
+        self._path_subjects: Set[Node] = set()
+        self._first: Dict[Node, Node] = {}
+        self._rest: Dict[Node, Node] = {}
+        self._parameters: Dict[Node, Dict[Node, List[Node]]] = {}
+
+        # A shape is:
+        # - instance of NodeShape or PropertyShape
+        # - subject of targetClass, target...
+        # - subject of any constraint component parameter
+        # - object of a constraint component parameter that expects a shape
+        list_heads = []
+        for s, p, o in graph:
+            if p in _SHAPE_OBJECT_PARAMETERS:
+                self.shapes.add(o)
+            if p in _SHAPE_SUBJECT_PARAMETERS:
+                self.shapes.add(s)
+
+            if p == RDF.first:
+                self._first[s] = o
+            elif p == RDF.rest:
+                self._rest[s] = o
+            elif p == SH.path:
+                self._path_subjects.add(s)
+            elif p == SH.property:
+                self.parents.setdefault(o, []).append(s)
+            elif p == RDF.type and o in (SH.NodeShape, SH.PropertyShape):
+                self.shapes.add(s)
+            elif p in _SHAPE_LIST_PARAMETERS:
+                list_heads.append(o)
+
+        # also members of a shacl list which are objects of sh:and, sh:or, sh:xone
+        for head in list_heads:
+            for shapename in self.collection(head):
+                if shapename not in self._path_subjects:
+                    self.shapes.add(shapename)
+
+        # propertyshapes follow the spec: shapes that are the subject of
+        # sh:path, all other shapes are nodeshapes
+        self.propertyshapes: Set[Node] = self.shapes & self._path_subjects
+        self.nodeshapes: Set[Node] = self.shapes - self._path_subjects
+
+    def parameters(self, shapename: Node) -> Dict[Node, List[Node]]:
+        """All (predicate, objects) pairs of shapename, read from the graph once"""
+        params = self._parameters.get(shapename)
+        if params is None:
+            params = {}
+            for predicate, obj in self.graph.predicate_objects(shapename):
+                params.setdefault(predicate, []).append(obj)
+            self._parameters[shapename] = params
+        return params
+
+    def collection(self, head: Node) -> List[Node]:
+        """The members of the rdf list starting at head"""
+        members = []
+        while head != RDF.nil and head in self._first:
+            members.append(self._first[head])
+            head = self._rest.get(head, RDF.nil)
+        return members
+
+    def update(self, added: List[Tuple[Node, Node, Node]],
+               removed: List[Tuple[Node, Node, Node]]):
+        """Bring the index up to date with its graph, after the triples added
+        and removed have been applied to it. Only the nodes those triples
+        touch (and the members of the rdf lists they reach) are reclassified.
+
+        The parents of a property shape are kept in the order in which they
+        were added, which for a shape with several parents may differ from
+        the order of a new index. So may the member of an rdf list cell with
+        several rdf:first (or rdf:rest) values.
+        """
+        candidates = set()
+        for s, p, o in added + removed:
+            candidates.update((s, o))
+            self._parameters.pop(s, None)
+            if p == RDF.first or p == RDF.rest:
+                table = self._first if p == RDF.first else self._rest
+                value = self.graph.value(s, p)
+                if value is None:
+                    table.pop(s, None)
+                else:
+                    table[s] = value
+            if p == RDF.rest or p in _SHAPE_LIST_PARAMETERS:
+                candidates.update(self.collection(o))
+            if p == SH.path:
+                if (s, SH.path, None) in self.graph:
+                    self._path_subjects.add(s)
+                else:
+                    self._path_subjects.discard(s)
+        for s, p, o in added:
+            if p == SH.property and s not in self.parents.setdefault(o, []):
+                self.parents[o].append(s)
+        for s, p, o in removed:
+            if p == SH.property and s in self.parents.get(o, []):
+                self.parents[o].remove(s)
+                if not self.parents[o]:
+                    del self.parents[o]
+
+        for node in candidates:
+            predicates = set(self.graph.predicates(node))
+            if self._is_shape(node, predicates):
+                self.shapes.add(node)
+            else:
+                self.shapes.discard(node)
+
+            if node in self.shapes and node in self._path_subjects:
+                self.propertyshapes.add(node)
+                self.nodeshapes.discard(node)
+            elif node in self.shapes:
+                self.nodeshapes.add(node)
+                self.propertyshapes.discard(node)
+            else:
+                self.nodeshapes.discard(node)
+                self.propertyshapes.discard(node)
+
+    def in_shape_list(self, cell: Node) -> bool:
+        """Whether the rdf list cell belongs to the list of an sh:and, sh:or
+        or sh:xone"""
+        seen = {cell}
+        head = cell
+        while True:  # walk back to the head of the list
+            previous = next(self.graph.subjects(RDF.rest, head), None)
+            if previous is None or previous in seen:
+                break
+            seen.add(previous)
+            head = previous
+        return any((None, p, head) in self.graph for p in _SHAPE_LIST_PARAMETERS)
+
+    def _is_shape(self, node: Node, predicates: Set[Node]) -> bool:
+        # the conditions of __init__, for a single node
+        if predicates & _SHAPE_SUBJECT_PARAMETERS:
+            return True
+        if any((node, RDF.type, kind) in self.graph
+               for kind in (SH.NodeShape, SH.PropertyShape)):
+            return True
+        if any(p in _SHAPE_OBJECT_PARAMETERS for p in self.graph.predicates(None, node)):
+            return True
+        if node in self._path_subjects:
             return False
+        return any(self.in_shape_list(cell) for cell in self.graph.subjects(RDF.first, node))
 
-        same_children = True
-        for child_self, child_other in zip(self.children, other.children):
-            if type(child_self) == BNode and type(child_other) == BNode:
-                continue
-            same_children = same_children and child_self == child_other
-
-        return (self.op == other.op) and same_children and\
-            self.constraintComponent == other.constraintComponent
-
-    def __repr__(self):
-        """ Pretty representation of the SANode tree """
-        out = '\n('
-        out += str(self.op) + '  cc=' + str(self.constraintComponent) + ' '
-        for c in self.children:
-            for line in c.__repr__().split('\n'):
-                out += ' ' + line + '\n'
-        out = out[:-1] + ')'
-        return out
-
-
-def _extract_shapes(graph: Graph) -> Set[Node]:
-    # A shape is:
-    # - instance of NodeShape or PropertyShape
-    # - subject of targetClass, target...
-    # - subject of any constraint component parameter
-    # - object of a constraint component parameter that expects a shape
-
-    # parameters whose object is (or may be) a shape
-    object_parameters = [SH.property, SH.node, SH.qualifiedValueShape, SH['not']]
-
-    # parameters whose subject is a shape (constraint components and targets)
-    subject_parameters = [
-        SH.node, SH.qualifiedValueShape, SH.qualifiedMinCount, SH.qualifiedMaxCount,
-        SH['not'], SH['class'], SH.datatype, SH.nodeKind, SH.minCount, SH.maxCount,
-        SH.minExclusive, SH.minInclusive, SH.maxExclusive, SH.maxInclusive,
-        SH.minLength, SH.maxLength, SH.pattern, SH.languageIn, SH.uniqueLang,
-        SH.equals, SH.disjoint, SH.lessThan, SH.lessThanOrEquals, SH.closed,
-        SH.hasValue, SH.targetClass, SH.targetNode, SH.targetObjectsOf,
-        SH.targetSubjectsOf, SH.property,
-    ]
-
-    shapes: Set[Node] = set()
-    for parameter in object_parameters:
-        shapes.update(graph.objects(predicate=parameter))
-    for parameter in subject_parameters:
-        shapes.update(graph.subjects(predicate=parameter))
-    shapes.update(graph.subjects(RDF.type, SH.NodeShape))
-    shapes.update(graph.subjects(RDF.type, SH.PropertyShape))
-
-    # also members of a shacl list which are objects of sh:and, sh:or, sh:xone
-    for parameter in [SH['or'], SH['and'], SH.xone]:
-        for llist in graph.objects(predicate=parameter):
-            for shapename in Collection(graph, llist):
-                if SH.path not in graph.predicates(shapename):
-                    shapes.add(shapename)
-
-    return shapes
-
-
-def _extract_propertyshapes(graph: Graph) -> Set[Node]:
+
+def _extract_shapes(graph: Graph,
+                    index: Optional[ShapesGraphIndex] = None) -> Set[Node]:
+    if index is None:
+        index = ShapesGraphIndex(graph)
+    return set(index.shapes)
+
+
+def _extract_propertyshapes(graph: Graph,
+                            index: Optional[ShapesGraphIndex] = None) -> Set[Node]:
     # this defines what propertyshapes are parsed, should follow the spec on
     # what a propertyshape is.
-    return _extract_shapes(graph).intersection(set(graph.subjects(predicate=SH.path)))
+    if index is None:
+        index = ShapesGraphIndex(graph)
+    return set(index.propertyshapes)
 
-def _extract_nodeshapes(graph: Graph) -> Set[Node]:
+
+def _extract_nodeshapes(graph: Graph,
+                        index: Optional[ShapesGraphIndex] = None) -> Set[Node]:
     # this defines what nodeshapes are parsed, should follow the spec on what a
     # node shape is: a shape that is not the subject of sh:path
-    return _extract_shapes(graph).difference(set(graph.subjects(predicate=SH.path)))
+    if index is None:
+        index = ShapesGraphIndex(graph)
+    return set(index.nodeshapes)
+
+
+def parse(graph: Graph, full: bool = True,
+          interner: Optional[NodeInterner] = None,
+          workers: Optional[int] = None,
+          lazy: bool = False) -> Tuple[Mapping, Mapping]:
+    index = ShapesGraphIndex(graph)
+    nodeshapes = list(_extract_nodeshapes(graph, index))
+    propertyshapes = list(_extract_propertyshapes(graph, index))
+
+    if lazy:
+        if workers is not None and workers > 1:
+            raise ValueError('A lazy parse cannot use workers')
+        shapenames = nodeshapes + propertyshapes
+        return (LazyShapes(shapenames, lambda name: _definition_parse(index, name, full), interner),
+                LazyShapes(shapenames, lambda name: _target_parse(index, name), interner))
+
+    if workers is not None and workers > 1:
+        definitions, target = _parse_in_pool(index, nodeshapes, propertyshapes,
+                                             full, workers)
+    else:
+        definitions, target = _parse_shapes(index, nodeshapes, propertyshapes, full)
 
+    if interner is not None:
+        # structurally identical subtrees (across all shapes) become shared
+        for shapename in definitions:
+            definitions[shapename] = interner.intern(definitions[shapename])
+            target[shapename] = interner.intern(target[shapename])
 
-def parse(graph: Graph, full: bool = True) -> Tuple[Dict, Dict]:
+    return definitions, target
+
+
+def parse_shapes(index: ShapesGraphIndex, shapenames: Iterable[Node],
+                 full: bool = True) -> Tuple[Dict, Dict]:
+    """The definitions and targets of only the given shapes of an index"""
+    shapenames = list(shapenames)
+    return _parse_shapes(index,
+                         [name for name in shapenames if name in index.nodeshapes],
+                         [name for name in shapenames if name in index.propertyshapes],
+                         full)
+
+
+def parse_iter(graph: Graph, full: bool = True,
+               interner: Optional[NodeInterner] = None) -> Iterator[Tuple[Node, SANode, SANode]]:
+    """Parse graph one shape at a time: yields (shapename, definition, target)
+    as soon as a shape is parsed, in the order of parse. Only the index of
+    the shapes graph is kept between shapes."""
+    index = ShapesGraphIndex(graph)
+    nodeshapes = list(_extract_nodeshapes(graph, index))
+    propertyshapes = list(_extract_propertyshapes(graph, index))
+    for shapename, definition, target in _iter_shapes(index, nodeshapes, propertyshapes, full):
+        if interner is not None:
+            definition, target = interner.intern(definition), interner.intern(target)
+        yield shapename, definition, target
+
+
+def _parse_shapes(index: ShapesGraphIndex, nodeshapes: List[Node],
+                  propertyshapes: List[Node], full: bool) -> Tuple[Dict, Dict]:
+    definitions = {}  # a mapping: shapename, SANode
+    target = {}  # a mapping: shapename, target shape
+    for shapename, definition, shape_target in _iter_shapes(index, nodeshapes,
+                                                            propertyshapes, full):
+        definitions[shapename] = definition
+        target[shapename] = shape_target
+    return definitions, target
+
+
+def _iter_shapes(index: ShapesGraphIndex, nodeshapes: List[Node],
+                 propertyshapes: List[Node], full: bool) -> Iterator[Tuple[Node, SANode, SANode]]:
+    for shapename in nodeshapes + propertyshapes:
+        yield (shapename, _definition_parse(index, shapename, full),
+               _target_parse(index, shapename))
+
+
+def _definition_parse(index: ShapesGraphIndex, shapename: Node, full: bool) -> SANode:
     # Imported here (not at module level) to avoid a circular import:
     # slsparser.utilities imports SANode/Op from this module.
     from slsparser.utilities import clean_parsetree
 
-    definitions = {}  # a mapping: shapename, SANode
-    target = {}  # a mapping: shapename, target shape
+    if shapename not in index.propertyshapes:
+        return clean_parsetree(_nodeshape_parse(index, shapename), full)
+    path = _extract_parameter_values(index, shapename, SH.path)[0]
+    parsed_path = pparse(index.graph, path)
+    return clean_parsetree(_propertyshape_parse(index, parsed_path, shapename), full)
 
-    nodeshapes = _extract_nodeshapes(graph)
 
-    for nodeshape in nodeshapes:
-        definitions[nodeshape] = clean_parsetree(_nodeshape_parse(graph, nodeshape), full)
-        target[nodeshape] = _target_parse(graph, nodeshape)
-    
-    propertyshapes = _extract_propertyshapes(graph)
+class LazyShapes(Mapping):
+    """A read-only mapping from shape names to their definitions (or
+    targets), returned by parse(graph, lazy=True). The shape names are known
+    up front; a shape is parsed when it is first read, and then kept."""
+
+    def __init__(self, shapenames: List[Node], parse_shape: Callable[[Node], SANode],
+                 interner: Optional[NodeInterner] = None):
+        self._shapenames = shapenames
+        self._known = set(shapenames)
+        self._parse_shape = parse_shape
+        self._interner = interner
+        self._parsed: Dict[Node, SANode] = {}
+
+    def __getitem__(self, shapename: Node) -> SANode:
+        node = self._parsed.get(shapename)
+        if node is None:
+            if shapename not in self._known:
+                raise KeyError(shapename)
+            node = self._parse_shape(shapename)
+            if self._interner is not None:
+                node = self._interner.intern(node)
+            self._parsed[shapename] = node
+        return node
+
+    def __contains__(self, shapename) -> bool:
+        return shapename in self._known
+
+    def __iter__(self) -> Iterator[Node]:
+        return iter(self._shapenames)
+
+    def __len__(self) -> int:
+        return len(self._shapenames)
+
+    def __reduce__(self):
+        # a pickled copy (e.g. for a process pool) is a dictionary of all shapes
+        return dict, (dict(self.items()),)
+
+
+# The process pool parse: the shape names are split in chunks, parsed by
+# the workers and merged in the serial order. Where processes cannot be
+# forked, every worker receives a copy of the shapes graph made by
+# encode_triples, which keeps the order of every subject's triples. With the
+# sh:property parents shipped as they are, every parameter and sibling list
+# comes out in the same order as in a serial parse.
+
+_CHUNKS_PER_WORKER = 4  # so that slow chunks can be balanced
 
-    for propertyshape in propertyshapes:
-        path = _extract_parameter_values(graph, propertyshape, SH.path)[0]
-        parsed_path = pparse(graph, path)
-        definitions[propertyshape] = clean_parsetree(_propertyshape_parse(graph, parsed_path, propertyshape), full)
-        target[propertyshape] = _target_parse(graph, propertyshape)
+_worker_index: Optional[ShapesGraphIndex] = None
 
+
+def _parse_in_pool(index: ShapesGraphIndex, nodeshapes: List[Node],
+                   propertyshapes: List[Node], full: bool,
+                   workers: int) -> Tuple[Dict, Dict]:
+    if pool.FORK:
+        initializer, initargs = _set_worker_index, (index,)
+    else:
+        terms, triples = pool.encode_triples(index.graph)
+        initializer, initargs = _initialize_worker, (terms, triples, index.parents)
+
+    size = max(1, -(-(len(nodeshapes) + len(propertyshapes)) //
+                    (workers * _CHUNKS_PER_WORKER)))
+    tasks = [(nodeshapes[i:i + size], [], full) for i in range(0, len(nodeshapes), size)]
+    tasks += [([], propertyshapes[i:i + size], full)
+              for i in range(0, len(propertyshapes), size)]
+
+    definitions = {}
+    target = {}
+    with pool.paused_gc(), ProcessPoolExecutor(
+            max_workers=workers, mp_context=pool.context(),
+            initializer=initializer, initargs=initargs) as executor:
+        for chunk_definitions, chunk_target in executor.map(_parse_chunk, tasks):
+            definitions.update(chunk_definitions)
+            target.update(chunk_target)
     return definitions, target
 
 
-def _target_parse(graph: Graph, shapename: Node) -> SANode:
+def _set_worker_index(index: ShapesGraphIndex):
+    global _worker_index
+    _worker_index = index
+
+
+def _initialize_worker(terms: List[Node], triples, parents: Dict[Node, List[Node]]):
+    global _worker_index
+    _worker_index = ShapesGraphIndex(pool.decode_triples(terms, triples))
+    _worker_index.parents = parents
+
+
+def _parse_chunk(task) -> Tuple[Dict, Dict]:
+    nodeshapes, propertyshapes, full = task
+    return _parse_shapes(_worker_index, nodeshapes, propertyshapes, full)
+
+
+def class_path() -> PANode:
+    """rdf:type/rdfs:subClassOf*, the path of sh:class and of class-based targets"""
+    return PANode(POp.COMP, [
+        PANode(POp.PROP, [RDF.type]),
+        PANode(POp.KLEENE, [PANode(POp.PROP, [RDFS.subClassOf])])])
+
+
+def _target_parse(index: ShapesGraphIndex, shapename: Node) -> SANode:
     out = SANode(Op.OR, [])
-    for tnode in _extract_parameter_values(graph, shapename, SH.targetNode):
+    for tnode in _extract_parameter_values(index, shapename, SH.targetNode):
         out.children.append(SANode(Op.HASVALUE, [tnode]))
 
-    for tclass in _extract_parameter_values(graph, shapename, SH.targetClass):
+    for tclass in _extract_parameter_values(index, shapename, SH.targetClass):
         out.children.append(SANode(
             Op.COUNTRANGE,
             [
-                Literal(1), None, PANode(POp.COMP, [
-                    PANode(POp.PROP, [RDF.type]),
-                    PANode(POp.KLEENE, [PANode(POp.PROP, [RDFS.subClassOf])])
-                ]),
+                Literal(1), None, class_path(),
                 SANode(Op.HASVALUE, [tclass])
             ]))
 
-    if (shapename, RDF.type, RDFS.Class) in graph:
+    if RDFS.Class in _extract_parameter_values(index, shapename, RDF.type):
         out.children.append(SANode(
             Op.COUNTRANGE,
             [
-                Literal(1), None, PANode(POp.COMP, [
-                    PANode(POp.PROP, [RDF.type]),
-                    PANode(POp.KLEENE, [PANode(POp.PROP, [RDFS.subClassOf])])
-                ]),
+                Literal(1), None, class_path(),
                 SANode(Op.HASVALUE, [shapename])
             ]))
 
-    for tsub in _extract_parameter_values(graph, shapename,
+    for tsub in _extract_parameter_values(index, shapename,
                                           SH.targetSubjectsOf):
         out.children.append(SANode(Op.COUNTRANGE, [
             Literal(1),
@@ -190,7 +486,7 @@ def _target_parse(graph: Graph, shapename: Node) -> SANode:
             PANode(POp.PROP, [tsub]),
             SANode(Op.TOP, [])]))
 
-    for tobj in _extract_parameter_values(graph, shapename,
+    for tobj in _extract_parameter_values(index, shapename,
                                           SH.targetObjectsOf):
         out.children.append(SANode(Op.COUNTRANGE, [
             Literal(1),
@@ -208,18 +504,18 @@ def _target_parse(graph: Graph, shapename: Node) -> SANode:
     return out
 
 
-def _nodeshape_parse(graph: Graph, shapename: Node) -> SANode:
+def _nodeshape_parse(index: ShapesGraphIndex, shapename: Node) -> SANode:
     # Note: all *_parse(...) functions (e.g. _shape_parse(...)) follow the
     # same pattern: they return list[SANode] representing a conjunction of
     # SANodes. This list can be empty.
-    conj = _shape_parse(graph, shapename) + \
-            _logic_parse(graph, shapename) + \
-            _tests_parse(graph, shapename) + \
-            _value_parse(graph, shapename) + \
-            _in_parse(graph, shapename) + \
-            _closed_parse(graph, shapename) + \
-            _lang_parse_nodeshape(graph, shapename) + \
-            _pair_parse(graph, PANode(POp.ID, []), shapename) # EQ/DISJ id
+    conj = _shape_parse(index, shapename) + \
+            _logic_parse(index, shapename) + \
+            _tests_parse(index, shapename) + \
+            _value_parse(index, shapename) + \
+            _in_parse(index, shapename) + \
+            _closed_parse(index, shapename) + \
+            _lang_parse_nodeshape(index, shapename) + \
+            _pair_parse(index, PANode(POp.ID, []), shapename) # EQ/DISJ id
 
     if conj:
         return SANode(Op.AND, conj)
@@ -227,13 +523,13 @@ def _nodeshape_parse(graph: Graph, shapename: Node) -> SANode:
     return SANode(Op.TOP, [])  # modeled after behaviour of validators
 
 
-def _propertyshape_parse(graph: Graph, path: PANode,
+def _propertyshape_parse(index: ShapesGraphIndex, path: PANode,
                          shapename: Node) -> SANode:
-    conj = _card_parse(graph, path, shapename) + \
-            _pair_parse(graph, path, shapename) + \
-            _qual_parse(graph, path, shapename) + \
-            _all_parse(graph, path, shapename) + \
-            _lang_parse_propertyshape(graph, path, shapename)
+    conj = _card_parse(index, path, shapename) + \
+            _pair_parse(index, path, shapename) + \
+            _qual_parse(index, path, shapename) + \
+            _all_parse(index, path, shapename) + \
+            _lang_parse_propertyshape(index, path, shapename)
     
     if conj:
         return SANode(Op.AND, conj)
@@ -241,88 +537,81 @@ def _propertyshape_parse(graph: Graph, path: PANode,
     return SANode(Op.TOP, [])  # modeled after behaviour of validators
 
 
-def _shape_parse(graph: Graph, shapename: Node) -> list[SANode]:
+def _shape_parse(index: ShapesGraphIndex, shapename: Node) -> list[SANode]:
     shapes = list(
-        zip(graph.objects(shapename, SH.node),
+        zip(_extract_parameter_values(index, shapename, SH.node),
             repeat(SH.NodeConstraintComponent))
     )
     shapes += list(
-        zip(graph.objects(shapename, SH.property),
+        zip(_extract_parameter_values(index, shapename, SH.property),
             repeat(SH.PropertyConstraintComponent))
     )
     return [SANode(Op.HASSHAPE, [shape], cc) for shape, cc in shapes]
 
 
-def _logic_parse(graph: Graph, shapename: Node) -> list[SANode]:
+def _logic_parse(index: ShapesGraphIndex, shapename: Node) -> list[SANode]:
     # Note: RDFlib does not like empty lists. It cannot parse an empty
     # rdf list
     conj_out = []
 
-    for nshape in _extract_parameter_values(graph, shapename, SH['not']):
+    for nshape in _extract_parameter_values(index, shapename, SH['not']):
         conj_out.append(SANode(Op.NOT, [SANode(Op.HASSHAPE, [nshape])], SH.NotConstraintComponent))
 
-    for ashape in _extract_parameter_values(graph, shapename, SH['and']):
-        shacl_list = Collection(graph, ashape)
+    for ashape in _extract_parameter_values(index, shapename, SH['and']):
+        shacl_list = index.collection(ashape)
         conj_list = [SANode(Op.HASSHAPE, [s]) for s in shacl_list]
         conj_out.append(SANode(Op.AND, conj_list, SH.AndConstraintComponent))
 
-    for oshape in _extract_parameter_values(graph, shapename, SH['or']):
-        shacl_list = Collection(graph, oshape)
+    for oshape in _extract_parameter_values(index, shapename, SH['or']):
+        shacl_list = index.collection(oshape)
         disj_list = [SANode(Op.HASSHAPE, [s]) for s in shacl_list]
         conj_out.append(SANode(Op.OR, disj_list, SH.OrConstraintComponent))
 
-    for xshape in _extract_parameter_values(graph, shapename, SH.xone):
-        shacl_list = Collection(graph, xshape)
-        _disj_out = []
-        for s in shacl_list:
-            single_xone = SANode(Op.AND, [SANode(Op.HASSHAPE, [s])])
-            for not_s in shacl_list:
-                if s != not_s:
-                    single_xone.children.append(
-                        SANode(Op.NOT, [SANode(Op.HASSHAPE, [not_s])]))
-            _disj_out.append(single_xone)
-        if _disj_out:
-            conj_out.append(SANode(Op.OR, _disj_out, SH.XoneConstraintComponent))
+    for xshape in _extract_parameter_values(index, shapename, SH.xone):
+        shacl_list = index.collection(xshape)
+        # exactly one of the shapes
+        xone_list = [SANode(Op.HASSHAPE, [s]) for s in shacl_list]
+        if xone_list:
+            conj_out.append(SANode(Op.CHILDRANGE, [Literal(1), Literal(1)] + xone_list,
+                                   SH.XoneConstraintComponent))
 
     return conj_out
 
 
-def _tests_parse(graph: Graph, shapename: Node) -> list[SANode]:
+def _tests_parse(index: ShapesGraphIndex, shapename: Node) -> list[SANode]:
     conj_out = []
 
     # sh:class
-    for sh_class in _extract_parameter_values(graph, shapename, SH['class']):
+    for sh_class in _extract_parameter_values(index, shapename, SH['class']):
         conj_out.append(
-            SANode(Op.COUNTRANGE, [Literal(1), None, PANode(POp.COMP, [
-                PANode(POp.PROP, [RDF.type]),
-                PANode(POp.KLEENE, [PANode(POp.PROP, [RDFS.subClassOf])])]),
+            SANode(Op.COUNTRANGE, [Literal(1), None, class_path(),
                             SANode(Op.HASVALUE, [sh_class])], SH.ClassConstraintComponent))
 
     # sh:datatype
-    for sh_datatype in _extract_parameter_values(graph, shapename,
+    for sh_datatype in _extract_parameter_values(index, shapename,
                                                  SH.datatype):
         conj_out.append(SANode(Op.TEST, [SH.DatatypeConstraintComponent, sh_datatype], SH.DatatypeConstraintComponent))
 
     # sh:nodeKind
-    for sh_nodekind in _extract_parameter_values(graph, shapename,
+    for sh_nodekind in _extract_parameter_values(index, shapename,
                                                  SH.nodeKind):
         conj_out.append(SANode(Op.TEST, [SH.NodeKindConstraintComponent, sh_nodekind], SH.NodeKindConstraintComponent))
 
     # numeric_range
-    numeric_range_shape = _numeric_range_parse(graph, shapename)
+    numeric_range_shape = _numeric_range_parse(index, shapename)
     if numeric_range_shape:
         conj_out.append(numeric_range_shape)
 
     # length_range
-    length_range_shape = _length_range_parse(graph, shapename)
+    length_range_shape = _length_range_parse(index, shapename)
     if length_range_shape:
         conj_out.append(length_range_shape)
 
     # sh:pattern
-    flags = [sh_flags for sh_flags in _extract_parameter_values(graph,
+    flags = [sh_flags for sh_flags in _extract_parameter_values(index,
                                                                 shapename,
                                                                 SH.flags)]
-    for sh_pattern in _extract_parameter_values(graph, shapename, SH.pattern):
+    for sh_pattern in _extract_parameter_values(index, shapename, SH.pattern):
         escaped_pattern = _escape_backslash(str(sh_pattern))
         # something strange is going on with character escapes
         # if a pattern contains a double backslash 'hello\\w' for example
@@ -332,14 +621,14 @@ def _tests_parse(graph: Graph, shapename: Node) -> list[SANode]:
     return conj_out
 
 
-def _length_range_parse(graph: Graph, shapename: Node) -> Optional[SANode]:
+def _length_range_parse(index: ShapesGraphIndex, shapename: Node) -> Optional[SANode]:
     # sh:minLength
     max_minlen = _max_literal(
-        _extract_parameter_values(graph, shapename, SH.minLength))
+        _extract_parameter_values(index, shapename, SH.minLength))
 
     # sh:maxLength
     min_maxlen = _min_literal(
-        _extract_parameter_values(graph, shapename, SH.maxLength))
+        _extract_parameter_values(index, shapename, SH.maxLength))
 
     length_range = ['length_range']
     if max_minlen is not None:
@@ -352,12 +641,12 @@ def _length_range_parse(graph: Graph, shapename: Node) -> Optional[SANode]:
         return SANode(Op.TEST, length_range, tuple(filter(lambda x: isinstance(x, URIRef), length_range)))
 
 
-def _numeric_range_parse(graph: Graph, shapename: Node) -> Optional[SANode]:
+def _numeric_range_parse(index: ShapesGraphIndex, shapename: Node) -> Optional[SANode]:
     # sh:minInclusive / sh:minExclusive
     max_minincl = _max_literal(
-        _extract_parameter_values(graph, shapename, SH.minInclusive))
+        _extract_parameter_values(index, shapename, SH.minInclusive))
     max_minexcl = _max_literal(
-        _extract_parameter_values(graph, shapename, SH.minExclusive))
+        _extract_parameter_values(index, shapename, SH.minExclusive))
     
     # do we use min_exlusive? (instead of inclusive)
     min_exclusive = False
@@ -368,9 +657,9 @@ def _numeric_range_parse(graph: Graph, shapename: Node) -> Optional[SANode]:
     
     # sh:maxInclusive / sh:maxExclusive    
     min_maxincl = _min_literal(
-        _extract_parameter_values(graph, shapename, SH.maxInclusive))
+        _extract_parameter_values(index, shapename, SH.maxInclusive))
     min_maxexcl = _min_literal(
-        _extract_parameter_values(graph, shapename, SH.maxExclusive))
+        _extract_parameter_values(index, shapename, SH.maxExclusive))
         
     # do we use max_exlusive?
     max_exclusive = False
@@ -418,38 +707,35 @@ def _min_literal(literals: List[Literal]) -> Optional[Literal]:
     return _max_literal(literals, invert=True)
 
 
-def _value_parse(graph: Graph, shapename: Node) -> list[SANode]:
+def _value_parse(index: ShapesGraphIndex, shapename: Node) -> list[SANode]:
     conj_out = []
-    for sh_value in _extract_parameter_values(graph, shapename, SH.hasValue):
+    for sh_value in _extract_parameter_values(index, shapename, SH.hasValue):
         conj_out.append(SANode(Op.HASVALUE, [sh_value], SH.HasValueConstraintComponent))
     return conj_out
 
 
-def _in_parse(graph: Graph, shapename: Node) -> list[SANode]:
+def _in_parse(index: ShapesGraphIndex, shapename: Node) -> list[SANode]:
     conj_out = []
-    for sh_in in _extract_parameter_values(graph, shapename, SH['in']):
-        shacl_list = Collection(graph, sh_in)
-        disj = SANode(Op.OR, [], SH.InConstraintComponent)
-        for val in shacl_list:
-            disj.children.append(SANode(Op.HASVALUE, [val]))
-        conj_out.append(disj)
+    for sh_in in _extract_parameter_values(index, shapename, SH['in']):
+        shacl_list = index.collection(sh_in)
+        conj_out.append(SANode(Op.IN, [frozenset(shacl_list)], SH.InConstraintComponent))
     return conj_out
 
 
-def _closed_parse(graph: Graph, shapename: Node) -> list[SANode]:
-    if (shapename, SH.closed, Literal(True)) not in graph:
+def _closed_parse(index: ShapesGraphIndex, shapename: Node) -> list[SANode]:
+    if Literal(True) not in _extract_parameter_values(index, shapename, SH.closed):
         return []
 
-    ignored = _extract_parameter_values(graph, shapename,
+    ignored = _extract_parameter_values(index, shapename,
                                         SH.ignoredProperties)
     sh_ignored = []
     for ig in ignored:
-        shacl_list = Collection(graph, ig)
+        shacl_list = index.collection(ig)
         sh_ignored += list(shacl_list)
 
     direct_props = []
-    for pshape in _extract_parameter_values(graph, shapename, SH.property):
-        path = _extract_parameter_values(graph, pshape, SH.path)[0]
+    for pshape in _extract_parameter_values(index, shapename, SH.property):
+        path = _extract_parameter_values(index, pshape, SH.path)[0]
         if type(path) == URIRef:
             direct_props.append(path)
 
@@ -458,14 +744,14 @@ def _closed_parse(graph: Graph, shapename: Node) -> list[SANode]:
     return [SANode(Op.CLOSED, children, SH.ClosedConstraintComponent)]
 
 
-def _card_parse(graph: Graph, path: PANode, shapename: Node) -> list[SANode]:
+def _card_parse(index: ShapesGraphIndex, path: PANode, shapename: Node) -> list[SANode]:
     # Repeated min/maxCount values are a conjunction of constraints, so the
     # effective range is the most restrictive one: the largest minCount and the
     # smallest maxCount. This matches how _numeric_range_parse aggregates bounds.
     effective_min = _max_literal(
-        _extract_parameter_values(graph, shapename, SH.minCount))
+        _extract_parameter_values(index, shapename, SH.minCount))
     effective_max = _min_literal(
-        _extract_parameter_values(graph, shapename, SH.maxCount))
+        _extract_parameter_values(index, shapename, SH.maxCount))
 
     if effective_min is None and effective_max is None:
         return []
@@ -481,51 +767,52 @@ def _card_parse(graph: Graph, path: PANode, shapename: Node) -> list[SANode]:
                                    path, SANode(Op.TOP, [])], cc)]
 
 
-def _pair_parse(graph: Graph, path: PANode, shapename: Node) -> list[SANode]:
+def _pair_parse(index: ShapesGraphIndex, path: PANode, shapename: Node) -> list[SANode]:
     conj_out = []
 
     # sh:equals
-    for eq in _extract_parameter_values(graph, shapename, SH.equals):
+    for eq in _extract_parameter_values(index, shapename, SH.equals):
         conj_out.append(SANode(Op.EQ, [path,
-                                       pparse(graph, eq)],
+                                       pparse(index.graph, eq)],
                                SH.EqualsConstraintComponent))
 
     # sh:disjoint
-    for disj in _extract_parameter_values(graph, shapename, SH.disjoint):
+    for disj in _extract_parameter_values(index, shapename, SH.disjoint):
         conj_out.append(SANode(Op.DISJ, [path,
-                                         pparse(graph, disj)],
+                                         pparse(index.graph, disj)],
                                SH.DisjointConstraintComponent))
 
     # sh:lessThan
-    for lt in _extract_parameter_values(graph, shapename, SH.lessThan):
+    for lt in _extract_parameter_values(index, shapename, SH.lessThan):
         conj_out.append(SANode(Op.LESSTHAN, [path,
-                                             pparse(graph, lt)],
+                                             pparse(index.graph, lt)],
                                SH.LessThanConstraintComponent))
 
     # sh:lessThanEq
-    for lte in _extract_parameter_values(graph, shapename,
+    for lte in _extract_parameter_values(index, shapename,
                                          SH.lessThanOrEquals):
         conj_out.append(SANode(Op.LESSTHANEQ, [path,
-                                               pparse(graph, lte)],
+                                               pparse(index.graph, lte)],
                                SH.LessThanOrEqualsConstraintComponent))
 
     return conj_out
 
 
-def _qual_parse(graph: Graph, path: PANode, shapename: Node) -> list[SANode]:
-    qual = _extract_parameter_values(graph, shapename,
+def _qual_parse(index: ShapesGraphIndex, path: PANode, shapename: Node) -> list[SANode]:
+    qual = _extract_parameter_values(index, shapename,
                                      SH.qualifiedValueShape)
-    qual_min = _extract_parameter_values(graph, shapename,
+    qual_min = _extract_parameter_values(index, shapename,
                                          SH.qualifiedMinCount)
-    qual_max = _extract_parameter_values(graph, shapename,
+    qual_max = _extract_parameter_values(index, shapename,
                                          SH.qualifiedMaxCount)
 
     sibl = []
-    if (shapename, SH.qualifiedValueShapesDisjoint, Literal(True)) in graph:
-        parents = graph.subjects(SH.property, shapename)
-        for parent in parents:
-            for propshape in graph.objects(parent, SH.property):
-                sibl += list(graph.objects(propshape, SH.qualifiedValueShape))
+    if Literal(True) in _extract_parameter_values(
+            index, shapename, SH.qualifiedValueShapesDisjoint):
+        for parent in index.parents.get(shapename, []):
+            for propshape in _extract_parameter_values(index, parent, SH.property):
+                sibl += _extract_parameter_values(index, propshape,
+                                                  SH.qualifiedValueShape)
 
     conj_out = []
     for qvs in qual:
@@ -565,29 +852,29 @@ def _qual_parse(graph: Graph, path: PANode, shapename: Node) -> list[SANode]:
     return conj_out
 
 
-def _all_parse(graph: Graph, path: PANode, shapename: Node) -> list[SANode]:
+def _all_parse(index: ShapesGraphIndex, path: PANode, shapename: Node) -> list[SANode]:
     conj_out = []
-    forall_conj = _shape_parse(graph, shapename) + \
-                  _logic_parse(graph, shapename) + \
-                  _tests_parse(graph, shapename) + \
-                  _in_parse(graph, shapename) + \
-                  _closed_parse(graph, shapename)
+    forall_conj = _shape_parse(index, shapename) + \
+                  _logic_parse(index, shapename) + \
+                  _tests_parse(index, shapename) + \
+                  _in_parse(index, shapename) + \
+                  _closed_parse(index, shapename)
     if forall_conj:
         conj_out.append(SANode(Op.FORALL, [path, SANode(Op.AND, forall_conj)]))
 
-    for component in _value_parse(graph, shapename):
+    for component in _value_parse(index, shapename):
         conj_out.append(SANode(Op.COUNTRANGE, [Literal(1), None, path, component]))
 
     return conj_out
 
 
-def _lang_parse_nodeshape(graph: Graph, shapename: Node) -> List[SANode]:
+def _lang_parse_nodeshape(index: ShapesGraphIndex, shapename: Node) -> List[SANode]:
     conj_out = []
 
     # sh:languageIn
     literal_list = []
-    for langin in _extract_parameter_values(graph, shapename, SH.languageIn):
-        shacl_list = Collection(graph, langin)
+    for langin in _extract_parameter_values(index, shapename, SH.languageIn):
+        shacl_list = index.collection(langin)
         literal_list += [tag for tag in shacl_list] # TODO: multiple languagein is intersection?
 
     if literal_list:
@@ -597,13 +884,13 @@ def _lang_parse_nodeshape(graph: Graph, shapename: Node) -> List[SANode]:
     return conj_out
 
 
-def _lang_parse_propertyshape(graph: Graph, path: PANode, shapename: Node) -> List[SANode]:
+def _lang_parse_propertyshape(index: ShapesGraphIndex, path: PANode, shapename: Node) -> List[SANode]:
     conj_out = []
 
     # sh:languageIn
     literal_list = []
-    for langin in _extract_parameter_values(graph, shapename, SH.languageIn):
-        shacl_list = Collection(graph, langin)
+    for langin in _extract_parameter_values(index, shapename, SH.languageIn):
+        shacl_list = index.collection(langin)
         literal_list += [tag for tag in shacl_list] # TODO: multiple languagein is intersection?
 
     if literal_list:
@@ -611,14 +898,14 @@ def _lang_parse_propertyshape(graph: Graph, path: PANode, shapename: Node) -> Li
         conj_out.append(SANode(Op.FORALL, [path, _out]))
 
     # sh:uniqueLang
-    if (shapename, SH.uniqueLang, Literal(True)) in graph:
+    if Literal(True) in _extract_parameter_values(index, shapename, SH.uniqueLang):
         conj_out.append(SANode(Op.UNIQUELANG, [path], SH.UniqueLangConstraintComponent))
 
     return conj_out
 
 
-def _extract_parameter_values(graph: Graph, shapename: Node, parameter: URIRef) -> List[Node]:
-    return list(graph.objects(shapename, parameter))
+def _extract_parameter_values(index: ShapesGraphIndex, shapename: Node, parameter: URIRef) -> List[Node]:
+    return list(index.parameters(shapename).get(parameter, []))
 
 
 def _escape_backslash(string: str) -> str:
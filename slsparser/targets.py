@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Set
+
+from rdflib import Graph, RDF, RDFS, Literal
+from rdflib.term import Node
+
+from slsparser.shapels import SANode, Op, class_path
+from slsparser.pathls import POp
+from slsparser.evaluate import Evaluator
+
+
+def target_sets(data_graph: Graph, targets: Dict[Node, SANode],
+                evaluator: Optional[Evaluator] = None) -> Dict[Node, Set[Node]]:
+    """The focus nodes of every shape: the nodes of data_graph that satisfy
+    its target formula (the second dictionary returned by parse).
+
+    All target declarations (sh:targetNode, sh:targetClass, implicit class
+    targets, sh:targetSubjectsOf and sh:targetObjectsOf) are answered from
+    indexes built in one pass over the data graph, and the subclass hierarchy
+    is shared by all shapes. Any other target formula is decided with
+    evaluator (by default an Evaluator of data_graph) for every node of the
+    data graph.
+    """
+    kinds = {shapename: [_kind(child) for child in _alternatives(target)]
+             for shapename, target in targets.items()}
+    index = _TargetIndex(data_graph, kinds)
+
+    if evaluator is None and index.others:
+        evaluator = Evaluator(data_graph)
+    out = {}
+    for shapename, alternatives in kinds.items():
+        focus = set()
+        for kind, argument in alternatives:
+            if kind == _NODE:
+                focus.add(argument)
+            elif kind == _CLASS:
+                focus |= index.instances(argument)
+            elif kind == _SUBJECTS:
+                focus |= index.subjects[argument]
+            elif kind == _OBJECTS:
+                focus |= index.objects[argument]
+            else:
+                focus.update(node for node in index.nodes
+                             if evaluator.holds(argument, node))
+        out[shapename] = focus
+    return out
+
+
+_NODE = 0
+_CLASS = 1
+_SUBJECTS = 2
+_OBJECTS = 3
+_OTHER = 4
+
+_CLASS_PATH = class_path()
+_AT_LEAST_ONE = (Literal(1), None)
+
+
+def _alternatives(target: SANode) -> List[SANode]:
+    if target.op == Op.OR:
+        return list(target.children)
+    if target.op == Op.BOT:
+        return []
+    return [target]
+
+
+def _kind(node: SANode):
+    # (kind, argument) of one target declaration, as built by _target_parse
+    if node.op == Op.HASVALUE:
+        return _NODE, node.children[0]
+    if node.op == Op.COUNTRANGE and tuple(node.children[:2]) == _AT_LEAST_ONE:
+        path, shape = node.children[2], node.children[3]
+        if path == _CLASS_PATH and shape.op == Op.HASVALUE:
+            return _CLASS, shape.children[0]
+        if shape.op == Op.TOP and path.pop == POp.PROP:
+            return _SUBJECTS, path.children[0]
+        if shape.op == Op.TOP and path.pop == POp.INV and \
+                path.children[0].pop == POp.PROP:
+            return _OBJECTS, path.children[0].children[0]
+    return _OTHER, node
+
+
+class _TargetIndex:
+    # The parts of the data graph needed to answer the target declarations,
+    # collected in one pass over its triples.
+
+    def __init__(self, graph: Graph, kinds):
+        needed = {kind: set() for kind in (_SUBJECTS, _OBJECTS)}
+        classes = others = False
+        for alternatives in kinds.values():
+            for kind, argument in alternatives:
+                if kind in needed:
+                    needed[kind].add(argument)
+                classes = classes or kind == _CLASS
+                others = others or kind == _OTHER
+
+        self.others = others
+        self.subjects: Dict[Node, Set[Node]] = {p: set() for p in needed[_SUBJECTS]}
+        self.objects: Dict[Node, Set[Node]] = {p: set() for p in needed[_OBJECTS]}
+        self._typed: Dict[Node, Set[Node]] = {}  # class -> direct instances
+        self._subclasses: Dict[Node, Set[Node]] = {}  # class -> direct subclasses
+        self._instances: Dict[Node, Set[Node]] = {}
+        self.nodes: Set[Node] = set()
+
+        for s, p, o in graph:
+            if p in self.subjects:
+                self.subjects[p].add(s)
+            if p in self.objects:
+                self.objects[p].add(o)
+            if classes:
+                if p == RDF.type:
+                    self._typed.setdefault(o, set()).add(s)
+                elif p == RDFS.subClassOf:
+                    self._subclasses.setdefault(o, set()).add(s)
+            if others:
+                self.nodes.add(s)
+                self.nodes.add(o)
+
+    def instances(self, cls: Node) -> Set[Node]:
+        """The (SHACL) instances of cls: typed by cls or one of its subclasses"""
+        if cls not in self._instances:
+            out = set()
+            seen = {cls}
+            stack = [cls]
+            while stack:
+                current = stack.pop()
+                out |= self._typed.get(current, set())
+                for subclass in self._subclasses.get(current, ()):
+                    if subclass not in seen:
+                        seen.add(subclass)
+                        stack.append(subclass)
+            self._instances[cls] = out
+        return self._instances[cls]
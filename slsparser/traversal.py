@@ -0,0 +1,140 @@
+from typing import Callable, List, Tuple
+
+from rdflib.term import BNode
+
+
+_VISIT = 0
+_FINISH = 1
+
+
+def fold(root, visit: Callable[[object], Tuple[List, Callable[[List], object]]]):
+    """Post-order fold of a tree with an explicit stack (no recursion limit).
+
+    visit(item) returns the child items to fold first and a function that
+    receives their folded results (in order) and returns the folded item.
+    Items are visited in the same depth-first order as a recursive traversal.
+    """
+    results = []
+    stack = [(_VISIT, root, None)]
+    while stack:
+        action, item, finish = stack.pop()
+        if action == _VISIT:
+            items, finish = visit(item)
+            stack.append((_FINISH, len(items), finish))
+            for child in reversed(items):
+                stack.append((_VISIT, child, None))
+        else:
+            if item:
+                folded = results[-item:]
+                del results[-item:]
+            else:
+                folded = []
+            results.append(finish(folded))
+    return results[0]
+
+
+class TreeNode:
+    """Base of SANode and PANode: structural '==', hash and repr.
+
+    Subclasses define _header(), the tuple of their fields besides the
+    children, and _repr_header(), its pretty representation.
+    """
+    __slots__ = ()
+
+    def __eq__(self, other):
+        """ Overwrite the '==' operator """
+        return tree_equal(self, other)
+
+    def __hash__(self):
+        """ Structural hash, consistent with '==' """
+        if self._hash is not None:
+            return self._hash
+        return fold(self, _hash_visit)
+
+    def __repr__(self):
+        """ Pretty representation of the tree """
+        return tree_repr(self)
+
+
+def tree_equal(left, right) -> bool:
+    # Two blank node children are always considered equal.
+    stack = [(left, right)]
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        if not isinstance(a, TreeNode):
+            if isinstance(b, TreeNode) or a != b:
+                return False
+            continue
+        if type(a) != type(b):
+            return False
+        if a._hash is not None and b._hash is not None and a._hash != b._hash:
+            return False
+        if len(a.children) != len(b.children) or a._header() != b._header():
+            return False
+        for child_a, child_b in zip(a.children, b.children):
+            if type(child_a) == BNode and type(child_b) == BNode:
+                continue
+            stack.append((child_a, child_b))
+    return True
+
+
+def _hash_visit(node):
+    if not isinstance(node, TreeNode):
+        return [], lambda _: _term_hash(node)
+    if node._hash is not None:
+        return [], lambda _: node._hash
+    return list(node.children), \
+        lambda hashes: hash((type(node),) + node._header() + tuple(hashes))
+
+
+def _term_hash(term) -> int:
+    # Blank nodes all hash alike, lists (e.g. sh:flags) are hashed as tuples
+    if type(term) == BNode:
+        return hash(BNode)
+    if isinstance(term, (list, tuple)):
+        return hash(tuple(_term_hash(t) for t in term))
+    return hash(term)
+
+
+def tree_repr(root) -> str:
+    # Same output as the recursive definition, where every node renders as
+    # '\n(' + header, followed by the lines of each child indented by one
+    # space (the first one continuing the header line), and a closing ')'.
+    indents = []
+    lines = []  # each line is a list of parts, joined at the end
+    stack = [(_VISIT, root, 0, False)]
+    while stack:
+        action, item, indent, merge = stack.pop()
+        if action == _FINISH:
+            if item:
+                lines[-1].append(')')
+            else:  # drop the trailing space of the header
+                lines[-1][-1] = lines[-1][-1][:-1] + ')'
+            continue
+
+        if not isinstance(item, TreeNode):
+            text = item.__repr__()
+            if merge:
+                lines[-1].append(' ' + text)
+            else:
+                indents.append(indent)
+                lines.append([text])
+            continue
+
+        if merge:
+            lines[-1].append(' ')
+        else:
+            indents.append(indent)
+            lines.append([''])
+        indents.append(indent)
+        lines.append(['(' + item._repr_header()])
+
+        stack.append((_FINISH, len(item.children) > 0, indent, False))
+        for position in range(len(item.children) - 1, -1, -1):
+            stack.append((_VISIT, item.children[position], indent + 1,
+                          position == 0))
+
+    return '\n'.join(' ' * indent + ''.join(parts)
+                     for indent, parts in zip(indents, lines))
@@ -1,84 +1,190 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from rdflib import Literal
 from slsparser.shapels import SANode, Op
+from slsparser.traversal import fold
 
 
-def expand_shape(definitions: Dict, node: SANode) -> SANode:
-    """Removes all hasshape references and replaces them with shapes"""
+def expand_shape(definitions: Dict, node: SANode,
+                 memo: Optional[Dict] = None) -> SANode:
+    """Removes all hasshape references and replaces them with shapes
 
-    if node.op == Op.HASSHAPE:
-        if node.children[0] not in definitions:
-            return SANode(Op.TOP, [])  # mimics real SHACL semantics
-        return expand_shape(definitions, definitions[node.children[0]])
+    Given a memo dict (which may be shared between calls), every referenced
+    shape is expanded only once and its expansion is reused: the result is a
+    DAG with shared subtrees. A reference that closes a cycle is left as a
+    HASSHAPE back-edge instead of being expanded.
 
-    new_children = []
-    for child in node.children:
-        new_child = child
-        if type(child) == SANode:
-            new_child = expand_shape(definitions, child)
-        new_children.append(new_child)
-    return SANode(node.op, new_children)
+    Only shapes that are not part of a reference cycle are memoized: the
+    expansion of a shape on a cycle depends on where the expansion started.
+    """
+    active = {}  # shapes being expanded (on the current path) -> their depth
+
+    # Explicit stack of (node, state): state -1 visits the node, state -2
+    # leaves an expanded reference, and a state n >= 0 rebuilds the node from
+    # the last n results. Next to every result, lows holds the smallest depth
+    # of an active shape it has a back-edge to.
+    results = []
+    lows = []
+    stack = [(node, -1)]
+    while stack:
+        current, state = stack.pop()
+        if state == -1:
+            if current.op == Op.HASSHAPE:
+                shapename = current.children[0]
+                if shapename not in definitions:
+                    results.append(SANode(Op.TOP, []))  # mimics real SHACL semantics
+                    lows.append(_NO_BACK_EDGE)
+                elif shapename in active:  # recursive shape: keep the back-edge
+                    results.append(SANode(Op.HASSHAPE, [shapename]))
+                    lows.append(active[shapename])
+                elif memo is not None and shapename in memo:
+                    results.append(memo[shapename])
+                    lows.append(_NO_BACK_EDGE)
+                else:
+                    active[shapename] = len(active)
+                    stack.append((current, -2))
+                    stack.append((definitions[shapename], -1))
+                continue
+
+            sanodes = _sanode_children(current)
+            stack.append((current, len(sanodes)))
+            for child in reversed(sanodes):
+                stack.append((child, -1))
+        elif state == -2:
+            shapename = current.children[0]
+            depth = active.pop(shapename)
+            if memo is not None and lows[-1] == _NO_BACK_EDGE:
+                memo[shapename] = results[-1]
+            if lows[-1] >= depth:  # the cycles through shapename are closed
+                lows[-1] = _NO_BACK_EDGE
+        else:
+            low = min(lows[len(lows) - state:], default=_NO_BACK_EDGE)
+            del lows[len(lows) - state:]
+            lows.append(low)
+            results.append(SANode(current.op, _rebuilt_children(current, results, state)))
+
+    return results[0]
+
+
+_NO_BACK_EDGE = float('inf')
+
+
+def _sanode_children(node: SANode) -> List[SANode]:
+    return [child for child in node.children if type(child) == SANode]
+
+
+def _rebuilt_children(node: SANode, results: List, count: int) -> List:
+    # node.children, with its count SANode children replaced (in order) by
+    # the last count results, which are popped
+    if count == 0:
+        return list(node.children)
+    new_sanodes = results[-count:]
+    del results[-count:]
+    if count == len(node.children):
+        return new_sanodes
+    return _replace_sanodes(node.children, new_sanodes)
+
+
+def _replace_sanodes(children: List, new_sanodes: List[SANode]) -> List:
+    # children, with its SANode children replaced (in order) by new_sanodes
+    new_sanodes = iter(new_sanodes)
+    return [next(new_sanodes) if type(child) == SANode else child
+            for child in children]
+
+
+def expand_definitions(definitions: Dict) -> Dict:
+    """Expands every definition, sharing subtrees between the expansions
+    (see expand_shape with a memo).
+
+    Without reference cycles this takes time linear in the size of
+    definitions. Shapes on a cycle are expanded again for every reference.
+    """
+    memo = {}
+    return {shapename: expand_shape(definitions, SANode(Op.HASSHAPE, [shapename]), memo)
+            for shapename in definitions}
 
 
 def negation_normal_form(node: SANode) -> SANode:
     # The input should be a node without that has no HASSHAPE in its tree (it is expanded)
+    return fold(node, _nnf_visit)
+
+
+def _nnf_visit(node: SANode):
     if node.op != Op.NOT:
-        new_children = []
-        for child in node.children:
-            if type(child) != SANode:
-                new_children.append(child)
-            else:
-                new_children.append(negation_normal_form(child))
-        return SANode(node.op, new_children)
+        return _sanode_children(node), \
+            lambda new_children: SANode(node.op, _replace_sanodes(node.children, new_children))
 
     nnode = node.children[0]
     if nnode.op == Op.AND:
-        new_children = []
-        for child in nnode.children:
-            new_children.append(
-                negation_normal_form(SANode(Op.NOT, [child])))
-        return SANode(Op.OR, new_children)
+        return [SANode(Op.NOT, [child]) for child in nnode.children], \
+            lambda new_children: SANode(Op.OR, new_children)
 
     if nnode.op == Op.OR:
-        new_children = []
-        for child in nnode.children:
-            new_children.append(
-                negation_normal_form(SANode(Op.NOT, [child])))
-        return SANode(Op.AND, new_children)
+        return [SANode(Op.NOT, [child]) for child in nnode.children], \
+            lambda new_children: SANode(Op.AND, new_children)
 
     if nnode.op == Op.NOT:
-        return nnode.children[0]
+        return [], lambda _: nnode.children[0]
 
     if nnode.op == Op.COUNTRANGE:
-        lower = nnode.children[0]
-        upper = nnode.children[1]
-
-        if int(lower) == 0:
-            return SANode(Op.COUNTRANGE, [Literal(int(upper) + 1), None,
-                                          nnode.children[2],
-                                          nnode.children[3]])
-        
-        if upper is None:
-            return SANode(Op.COUNTRANGE, [Literal(0), Literal(int(lower) - 1),
-                                          nnode.children[2],
-                                          nnode.children[3]])
-
-        return SANode(Op.OR, [
-            SANode(Op.COUNTRANGE, [Literal(int(upper)+1), None,
-                                    nnode.children[2],
-                                    nnode.children[3]]),
-            SANode(Op.COUNTRANGE, [Literal(0), Literal(int(lower) - 1),
-                                   nnode.children[2],
-                                   nnode.children[3]])
-        ])
+        return [], lambda _: _negate_countrange(nnode)
+
+    if nnode.op == Op.CHILDRANGE:
+        # the children are not negated: the complement of the range counts them
+        return nnode.children[2:], \
+            lambda new_children: _negated_childrange(nnode, new_children, SANode)
 
     if nnode.op == Op.FORALL:
-        return SANode(Op.COUNTRANGE, [Literal(1), None, 
-                                      nnode.children[0],
-                                      negation_normal_form(
-                                        SANode(Op.NOT, [nnode.children[1]]))])
+        return [SANode(Op.NOT, [nnode.children[1]])], \
+            lambda new_children: SANode(Op.COUNTRANGE, [Literal(1), None,
+                                                        nnode.children[0],
+                                                        new_children[0]])
     # We do not consider HASSHAPE as this function works on expanded shapes
-    return node
+    return [], lambda _: node
+
+
+def _negate_countrange(nnode: SANode) -> SANode:
+    lower = nnode.children[0]
+    upper = nnode.children[1]
+
+    if int(lower) == 0:
+        if upper is None:  # NOT COUNTRANGE 0 * is unsatisfiable
+            return SANode(Op.BOT, [])
+        return SANode(Op.COUNTRANGE, [Literal(int(upper) + 1), None,
+                                      nnode.children[2],
+                                      nnode.children[3]])
+
+    if upper is None:
+        return SANode(Op.COUNTRANGE, [Literal(0), Literal(int(lower) - 1),
+                                      nnode.children[2],
+                                      nnode.children[3]])
+
+    return SANode(Op.OR, [
+        SANode(Op.COUNTRANGE, [Literal(int(upper)+1), None,
+                                nnode.children[2],
+                                nnode.children[3]]),
+        SANode(Op.COUNTRANGE, [Literal(0), Literal(int(lower) - 1),
+                               nnode.children[2],
+                               nnode.children[3]])
+    ])
+
+
+def _negated_childrange(nnode: SANode, shapes: List[SANode], build) -> SANode:
+    # NOT CHILDRANGE n m, with the children replaced by shapes: the ranges of
+    # the complement share the children, so the tree stays linear. build
+    # makes a node from (op, children).
+    lower = nnode.children[0]
+    upper = nnode.children[1]
+    ranges = []
+    if upper is not None:
+        ranges.append(build(Op.CHILDRANGE, [Literal(int(upper) + 1), None] + shapes))
+    if int(lower) > 0:
+        ranges.append(build(Op.CHILDRANGE, [Literal(0), Literal(int(lower) - 1)] + shapes))
+
+    if not ranges:  # NOT CHILDRANGE 0 * is unsatisfiable
+        return SANode(Op.BOT, [])
+    if len(ranges) == 1:
+        return ranges[0]
+    return build(Op.OR, ranges)
 
 
 def clean_parsetree(sanode: SANode, full: bool = True) -> SANode:
@@ -98,61 +204,235 @@ def clean_parsetree(sanode: SANode, full: bool = True) -> SANode:
     - Replace COUNTRANGE n m E BOT by:
         - BOT if n is not 0
         - TOP else
+    - Replace IN with an empty set by BOT, and IN with one value by HASVALUE
+    - Remove TOP and BOT from CHILDRANGE (lowering the range by the number
+      of TOPs), then replace CHILDRANGE n m by:
+        - BOT if no number of children in the range can be satisfied
+        - TOP if every number of children is in the range
+        - OR of the children if n is 1 and m is at least their number
+        - AND of the children if n is their number
     """
-    
-    new_children = []
-    for child in sanode.children:
-        if type(child) == SANode:
-            new_child = clean_parsetree(child, full)
-            new_children.append(new_child)
+
+    # explicit stack of (node, state): state -1 visits the node, a state
+    # n >= 0 rebuilds and cleans it from the last n results
+    results = []
+    stack = [(sanode, -1)]
+    while stack:
+        node, state = stack.pop()
+        if state == -1:
+            if full and node.constraintComponent is not None:
+                results.append(node)
+                continue
+            sanodes = _sanode_children(node)
+            stack.append((node, len(sanodes)))
+            for child in reversed(sanodes):
+                stack.append((child, -1))
         else:
-            new_children.append(child)
+            results.append(_simplified(node.op, _rebuilt_children(node, results, state)))
 
-    if full and sanode.constraintComponent is not None:
-        return sanode
+    return results[0]
 
-    new_node = SANode(sanode.op, new_children)
 
-    if new_node.op == Op.NOT:
-        if new_node.children[0].op == Op.TOP:
+def _simplified(op: Op, children: List) -> SANode:
+    # one clean_parsetree step, for a node whose children are already clean.
+    # Only the node that survives is allocated.
+    if op == Op.NOT:
+        if children[0].op == Op.TOP:
             return SANode(Op.BOT, [])
-        if new_node.children[0].op == Op.BOT:
+        if children[0].op == Op.BOT:
             return SANode(Op.TOP, [])
-    
-    if new_node.op == Op.AND:
-        if any(map(lambda c: c.op == Op.BOT, new_node.children)):
-            return SANode(Op.BOT, [])
 
-        if any(map(lambda c: c.op == Op.TOP, new_node.children)):
-            new_node.children = list(filter(lambda c: c.op != Op.TOP, new_node.children))
-            if not new_node.children:
-                return SANode(Op.TOP, [])
-            #return new_node
-    
-    if new_node.op == Op.OR:
-        if any(map(lambda c: c.op == Op.TOP, new_node.children)):
-            return SANode(Op.TOP, [])
+    if op in (Op.AND, Op.OR):
+        # BOT absorbs an AND and TOP is neutral in it, vice versa for OR
+        absorbing, neutral = (Op.BOT, Op.TOP) if op == Op.AND else (Op.TOP, Op.BOT)
+        if any(c.op == absorbing for c in children):
+            return SANode(absorbing, [])
+
+        if any(c.op == neutral for c in children):
+            children = [c for c in children if c.op != neutral]
+            if not children:
+                return SANode(neutral, [])
 
-        if any(map(lambda c: c.op == Op.BOT, new_node.children)):
-            new_node.children = list(filter(lambda c: c.op != Op.BOT, new_node.children))
-            if not new_node.children:
-                return SANode(Op.BOT, [])
-            #return new_node
-    
-    if new_node.op in [Op.AND, Op.OR] and len(new_node.children) == 1:
-        return new_node.children[0]
-    
-    if new_node.op == Op.FORALL:
-        if new_node.children[1].op == Op.TOP:
+        if len(children) == 1:
+            return children[0]
+
+    if op == Op.FORALL:
+        if children[1].op == Op.TOP:
             return SANode(Op.TOP, [])
-        if new_node.children[1].op == Op.BOT:
-            return SANode(Op.COUNTRANGE, [Literal(0), Literal(0), new_node.children[0], SANode(Op.TOP, [])])
+        if children[1].op == Op.BOT:
+            return SANode(Op.COUNTRANGE, [Literal(0), Literal(0), children[0], SANode(Op.TOP, [])])
 
-    if new_node.op == Op.COUNTRANGE and new_node.children[3].op == Op.BOT:
+    if op == Op.COUNTRANGE and children[3].op == Op.BOT:
         # children[0] is an rdflib Literal, so compare numerically:
         # Literal(0) == 0 is False, which would wrongly yield BOT here.
-        if int(new_node.children[0]) == 0:
+        if int(children[0]) == 0:
             return SANode(Op.TOP, [])
         return SANode(Op.BOT, [])
-    
-    return new_node
+
+    if op == Op.IN and len(children[0]) < 2:
+        if not children[0]:
+            return SANode(Op.BOT, [])
+        return SANode(Op.HASVALUE, list(children[0]))
+
+    if op == Op.CHILDRANGE:
+        lower, upper, shapes = int(children[0]), children[1], children[2:]
+        upper = None if upper is None else int(upper)
+        if any(c.op in (Op.TOP, Op.BOT) for c in shapes):
+            # a TOP child is always counted, a BOT child never
+            tops = sum(1 for c in shapes if c.op == Op.TOP)
+            shapes = [c for c in shapes if c.op not in (Op.TOP, Op.BOT)]
+            lower = max(lower - tops, 0)
+            upper = None if upper is None else upper - tops
+            children = [Literal(lower), None if upper is None else Literal(upper)] + shapes
+
+        most = len(shapes) if upper is None else min(upper, len(shapes))
+        if lower > most:
+            return SANode(Op.BOT, [])
+        if most == len(shapes):
+            if lower == 0:
+                return SANode(Op.TOP, [])
+            if lower == 1:
+                return _simplified(Op.OR, shapes)
+            if lower == len(shapes):
+                return _simplified(Op.AND, shapes)
+
+    return SANode(op, children)
+
+
+def normalize(definitions: Dict, shapename, memo: Optional[Dict] = None) -> SANode:
+    """Expands, negation normalizes and cleans a shape in a single traversal.
+
+    The result equals
+    clean_parsetree(negation_normal_form(expand_shape(definitions, HASSHAPE shapename)))
+    except that the shape under a double negation or a negated COUNTRANGE is
+    normalized too. Negations are pushed down while walking, and the
+    clean_parsetree rules are applied before a node is allocated, so no
+    intermediate tree is built. References are handled as in expand_shape,
+    including the memo and the HASSHAPE back-edges (negated where needed).
+    """
+    active = {}  # shapes being expanded (on the current path) -> their depth
+
+    # Explicit stack of (action, a, b). Next to every result, lows holds the
+    # smallest depth of an active shape it has a back-edge to (see expand_shape).
+    results = []
+    lows = []
+    stack = [(_VISIT, SANode(Op.HASSHAPE, [shapename]), False)]
+    while stack:
+        action, a, b = stack.pop()
+
+        if action == _VISIT:  # a: node, b: whether it is negated
+            node, negated = a, b
+            op = node.op
+
+            if op == Op.HASSHAPE:
+                name = node.children[0]
+                if name not in definitions:  # mimics real SHACL semantics
+                    results.append(SANode(Op.BOT if negated else Op.TOP, []))
+                    lows.append(_NO_BACK_EDGE)
+                elif name in active:  # recursive shape: keep the back-edge
+                    back_edge = SANode(Op.HASSHAPE, [name])
+                    results.append(SANode(Op.NOT, [back_edge]) if negated else back_edge)
+                    lows.append(active[name])
+                elif memo is not None and (name, negated) in memo:
+                    results.append(memo[(name, negated)])
+                    lows.append(_NO_BACK_EDGE)
+                else:
+                    active[name] = len(active)
+                    stack.append((_LEAVE, name, negated))
+                    stack.append((_VISIT, definitions[name], negated))
+                continue
+
+            if op == Op.NOT:
+                stack.append((_VISIT, node.children[0], not negated))
+                continue
+
+            if op in (Op.TOP, Op.BOT):
+                results.append(SANode(_DUAL[op] if negated else op, []))
+                lows.append(_NO_BACK_EDGE)
+                continue
+
+            if op in (Op.AND, Op.OR):
+                stack.append((_BUILD, _DUAL[op] if negated else op, len(node.children)))
+                for child in reversed(node.children):
+                    stack.append((_VISIT, child, negated))
+                continue
+
+            if op == Op.FORALL:
+                path = node.children[0]
+                if negated:
+                    build = lambda shapes, path=path: _simplified(
+                        Op.COUNTRANGE, [Literal(1), None, path, shapes[0]])
+                else:
+                    build = lambda shapes, path=path: _simplified(
+                        Op.FORALL, [path, shapes[0]])
+                stack.append((_APPLY, build, 1))
+                stack.append((_VISIT, node.children[1], negated))
+                continue
+
+            if op == Op.COUNTRANGE:
+                if negated:
+                    build = lambda shapes, node=node: _negated_countrange(node, shapes[0])
+                else:
+                    build = lambda shapes, node=node: _simplified(
+                        Op.COUNTRANGE, list(node.children[:3]) + [shapes[0]])
+                stack.append((_APPLY, build, 1))
+                stack.append((_VISIT, node.children[3], False))
+                continue
+
+            if op == Op.CHILDRANGE:
+                if negated:
+                    build = lambda shapes, node=node: _negated_childrange(
+                        node, shapes, _simplified)
+                else:
+                    build = lambda shapes, node=node: _simplified(
+                        Op.CHILDRANGE, list(node.children[:2]) + shapes)
+                stack.append((_APPLY, build, len(node.children) - 2))
+                for child in reversed(node.children[2:]):
+                    stack.append((_VISIT, child, False))
+                continue
+
+            # leaves: HASVALUE, IN, TEST, EQ, DISJ, CLOSED, LESSTHAN(EQ), UNIQUELANG
+            leaf = _simplified(op, list(node.children))
+            results.append(_simplified(Op.NOT, [leaf]) if negated else leaf)
+            lows.append(_NO_BACK_EDGE)
+
+        elif action == _LEAVE:  # a: shape name, b: whether it is negated
+            depth = active.pop(a)
+            if memo is not None and lows[-1] == _NO_BACK_EDGE:
+                memo[(a, b)] = results[-1]
+            if lows[-1] >= depth:  # the cycles through a are closed
+                lows[-1] = _NO_BACK_EDGE
+
+        else:  # _BUILD (a: AND/OR) or _APPLY (a: builder), b: result count
+            shapes = results[len(results) - b:]
+            del results[len(results) - b:]
+            low = min(lows[len(lows) - b:], default=_NO_BACK_EDGE)
+            del lows[len(lows) - b:]
+            results.append(_simplified(a, shapes) if action == _BUILD else a(shapes))
+            lows.append(low)
+
+    return results[0]
+
+
+_VISIT, _LEAVE, _BUILD, _APPLY = range(4)
+
+_DUAL = {Op.AND: Op.OR, Op.OR: Op.AND, Op.TOP: Op.BOT, Op.BOT: Op.TOP}
+
+
+def _negated_countrange(nnode: SANode, shape: SANode) -> SANode:
+    # NOT COUNTRANGE n m E shape, with shape already normalized
+    lower = nnode.children[0]
+    upper = nnode.children[1]
+    path = nnode.children[2]
+
+    if int(lower) == 0:
+        if upper is None:  # NOT COUNTRANGE 0 * is unsatisfiable
+            return SANode(Op.BOT, [])
+        return _simplified(Op.COUNTRANGE, [Literal(int(upper) + 1), None, path, shape])
+
+    if upper is None:
+        return _simplified(Op.COUNTRANGE, [Literal(0), Literal(int(lower) - 1), path, shape])
+
+    return _simplified(Op.OR, [
+        _simplified(Op.COUNTRANGE, [Literal(int(upper) + 1), None, path, shape]),
+        _simplified(Op.COUNTRANGE, [Literal(0), Literal(int(lower) - 1), path, shape])])
@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rdflib import Graph
+from rdflib.term import Node
+
+from slsparser.shapels import SANode
+from slsparser.evaluate import Evaluator
+from slsparser.targets import target_sets
+from slsparser import pool
+
+# (shape name, focus node, whether the focus node conforms to the shape)
+Result = Tuple[Node, Node, bool]
+
+_worker_evaluator: Optional[Evaluator] = None
+
+
+def validate(data_graph: Graph, definitions: Dict[Node, SANode], target: Dict[Node, SANode],
+             workers: Optional[int] = None, chunk_size: int = 256) -> Iterator[Result]:
+    """Check every focus node of every shape, yielding a result per pair.
+
+    definitions and target are the dictionaries returned by parse. With
+    workers=N, the (shape, focus nodes) pairs are split in chunks of at most
+    chunk_size focus nodes and checked on a pool of N processes, each with
+    its own Evaluator (whose memo is shared by all its chunks). The results
+    of a chunk are yielded as soon as it finishes, so they do not come in a
+    fixed order.
+
+    Where processes can be forked, the workers share the data graph with the
+    parent (copy on write). Otherwise every worker receives one compact copy.
+    """
+    tasks = []
+    for shapename, focus in target_sets(data_graph, target).items():
+        focus = list(focus)
+        for i in range(0, len(focus), chunk_size):
+            tasks.append((shapename, focus[i:i + chunk_size]))
+
+    if workers is None or workers <= 1:
+        evaluator = Evaluator(data_graph, definitions)
+        for task in tasks:
+            yield from _check(evaluator, task)
+        return
+
+    if pool.FORK:
+        initializer, initargs = _set_worker_evaluator, (data_graph, definitions)
+    else:
+        terms, triples = pool.encode_triples(data_graph)
+        initializer, initargs = _initialize_worker, (terms, triples, definitions)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool.context(),
+                             initializer=initializer, initargs=initargs) as executor:
+        with pool.paused_gc():  # the workers start on the first submit
+            futures = [executor.submit(_check_chunk, task) for task in tasks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def _check(evaluator: Evaluator, task) -> List[Result]:
+    shapename, focus = task
+    return [(shapename, node, evaluator.conforms(shapename, node)) for node in focus]
+
+
+def _set_worker_evaluator(graph: Graph, definitions: Dict[Node, SANode]):
+    global _worker_evaluator
+    _worker_evaluator = Evaluator(graph, definitions)
+
+
+def _initialize_worker(terms: List[Node], triples, definitions: Dict[Node, SANode]):
+    _set_worker_evaluator(pool.decode_triples(terms, triples), definitions)
+
+
+def _check_chunk(task) -> List[Result]:
+    return _check(_worker_evaluator, task)
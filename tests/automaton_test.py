@@ -0,0 +1,70 @@
+import random
+
+from pytest import mark
+
+from rdflib import Graph, Namespace
+
+from slsparser.pathls import PANode, POp
+from slsparser.pathevaluate import PathEvaluator
+from slsparser.automaton import compile_path
+
+EX = Namespace('http://ex.tt/')
+
+
+def _prop(name):
+    return PANode(POp.PROP, [EX[name]])
+
+
+def _kleene(path):
+    return PANode(POp.KLEENE, [path])
+
+
+@mark.parametrize('path, states, accepting', [
+    (PANode(POp.ID, []), 1, {0}),
+    (_prop('p'), 2, {1}),
+    (PANode(POp.INV, [_prop('p')]), 2, {1}),
+    (PANode(POp.COMP, [_prop('p'), _prop('q')]), 3, {2}),
+    (PANode(POp.ALT, [_prop('p'), _prop('q')]), 3, {1, 2}),
+    (PANode(POp.ZEROORONE, [_prop('p')]), 2, {0, 1}),
+    (_kleene(_prop('p')), 2, {0, 1}),
+])
+def test_compile_path(path, states, accepting):
+    automaton = compile_path(path)
+    assert len(automaton) == states
+    assert automaton.accepting == accepting
+
+
+def test_inverse_labels():
+    path = PANode(POp.INV, [PANode(POp.COMP, [_prop('p'), _prop('q')])])
+    automaton = compile_path(path)
+    assert list(automaton.edges[0]) == [(EX.q, True)]
+
+
+def test_nested_kleene_stays_small():
+    path = _prop('p')
+    for _ in range(50):
+        path = _kleene(PANode(POp.COMP, [path, PANode(POp.ZEROORONE, [_prop('q')])]))
+    assert len(compile_path(path)) <= 102
+
+
+def _random_path(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return _prop(rng.choice('pq'))
+    pop = rng.choice([POp.INV, POp.ZEROORONE, POp.KLEENE, POp.COMP, POp.ALT, POp.ID])
+    if pop == POp.ID:
+        return PANode(POp.ID, [])
+    if pop in (POp.COMP, POp.ALT):
+        return PANode(pop, [_random_path(rng, depth - 1) for _ in range(rng.randint(1, 3))])
+    return PANode(pop, [_random_path(rng, depth - 1)])
+
+
+def test_automata_agree_with_set_evaluation():
+    rng = random.Random(7)
+    g = Graph()
+    nodes = [EX[f'n{i}'] for i in range(8)]
+    for _ in range(16):
+        g.add((rng.choice(nodes), EX[rng.choice('pq')], rng.choice(nodes)))
+    for _ in range(200):
+        path = _random_path(rng, 4)
+        assert PathEvaluator(g, automata=True).pairs(path, nodes) == \
+            PathEvaluator(g).pairs(path, nodes)
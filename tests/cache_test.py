@@ -0,0 +1,128 @@
+from pathlib import Path
+
+from pytest import mark, raises
+
+from rdflib import Graph, Namespace, BNode
+
+from slsparser.shapels import parse
+from slsparser.interning import NodeInterner
+from slsparser.utilities import expand_definitions
+from slsparser.cache import ParseCache, fingerprint, dumps, loads
+
+EX = Namespace('http://ex.tt/')
+TESTFILES = Path(__file__).parent / 'sls_testfiles'
+SHAPEFILES = sorted(TESTFILES.glob('*.ttl'))
+
+
+def _read(path):
+    g = Graph()
+    g.parse(path)
+    return g
+
+
+@mark.parametrize('path', SHAPEFILES, ids=lambda path: path.name)
+def test_a_reread_graph_is_a_hit(path, tmp_path):
+    cache = ParseCache(tmp_path)
+    graph = _read(path)
+    assert cache.parse(graph) == parse(graph)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    graph = _read(path)  # new blank nodes
+    definitions, target = cache.parse(graph)
+    assert (cache.hits, cache.misses) == (1, 1)
+    expected = parse(graph)
+    assert (definitions, target) == expected
+    # the blank node shape names are the ones of the graph
+    assert set(definitions) == set(expected[0])
+
+
+def test_fingerprint():
+    g = Graph()
+    g.parse(data="""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        ex:a sh:property [ sh:path ex:p ] , [ sh:path ex:p ] ;
+            sh:or ( [ sh:path ex:p ] [ sh:path ex:p ] ) .
+    """, format='turtle')
+    digest, labels = fingerprint(g)
+    assert len(set(labels.values())) == len(labels) == 6
+
+    relabelled = Graph()
+    renamed = {}
+    for triple in g:
+        relabelled.add(tuple(renamed.setdefault(term, BNode()) if type(term) == BNode
+                             else term for term in triple))
+    assert fingerprint(relabelled)[0] == digest
+    relabelled.add((EX.a, EX.q, EX.b))
+    assert fingerprint(relabelled)[0] != digest
+
+
+def _cycles(*lengths):
+    # disjoint ex:next cycles of blank nodes: colour refinement cannot tell
+    # their members apart, although they are not interchangeable
+    g = Graph()
+    for length in lengths:
+        cycle = [BNode() for _ in range(length)]
+        for i, bnode in enumerate(cycle):
+            g.add((bnode, EX.next, cycle[(i + 1) % length]))
+    return g
+
+
+def test_fingerprint_does_not_depend_on_the_triple_order():
+    digest, labels = fingerprint(_cycles(3, 4))
+    assert len(set(labels.values())) == len(labels) == 7
+    assert fingerprint(_cycles(4, 3))[0] == digest
+    assert fingerprint(_cycles(7))[0] != digest
+
+
+def test_stored_trees_keep_their_sharing():
+    g = _read(TESTFILES / 'expand_test1.ttl')
+    interner = NodeInterner()
+    definitions, target = parse(g, interner=interner)
+    expanded = expand_definitions(definitions)
+    _, labels = fingerprint(g)
+    bnodes = {label: bnode for bnode, label in labels.items()}
+    loaded, _ = loads(dumps(expanded, target, labels), bnodes)
+    assert loaded == expanded
+    interned, _ = loads(dumps(definitions, target, labels), bnodes)
+    assert all(type(node.children) == tuple for node in interned.values())
+
+    def count(trees):
+        seen = set()
+        stack = list(trees)
+        while stack:
+            node = stack.pop()
+            if id(node) not in seen and hasattr(node, 'children'):
+                seen.add(id(node))
+                stack.extend(node.children)
+        return len(seen)
+    assert count(loaded.values()) == count(expanded.values())
+
+
+def test_unreadable_entries_are_invalidated(tmp_path):
+    path = TESTFILES / 'shape_all.ttl'
+    cache = ParseCache(tmp_path)
+    graph = _read(path)
+    cache.parse(graph)
+    cache.parse(graph, full=False)  # a separate entry
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    entry = next(p for p in tmp_path.iterdir() if not p.stem.endswith('-core'))
+    data = entry.read_bytes()
+    entry.write_bytes(data[:4] + b'\x63' + data[5:])  # an other version
+    assert cache.parse(graph) == parse(graph)
+    assert (cache.hits, cache.misses, cache.invalidations) == (0, 2, 1)
+    assert cache.parse(graph) == parse(graph)  # rewritten
+    assert cache.hits == 1
+
+    entry.write_bytes(entry.read_bytes()[:-5])
+    with raises(ValueError):
+        loads(entry.read_bytes(), {})
+    cache.parse(_read(path))
+    assert cache.invalidations == 2
+
+    cache.invalidate(_read(path))
+    assert cache.invalidations == 4
+    assert list(tmp_path.iterdir()) == []
+    cache.parse(_read(path))
+    assert cache.misses == 3
@@ -0,0 +1,65 @@
+import random
+
+from pytest import importorskip, mark
+
+from rdflib import Graph, Namespace, Literal
+
+from slsparser.pathls import PANode, POp
+from slsparser.pathevaluate import PathEvaluator
+
+importorskip('numpy')
+from slsparser.csr import CSRGraph, CSRPathEvaluator  # noqa: E402
+
+EX = Namespace('http://ex.tt/')
+
+
+def _prop(name):
+    return PANode(POp.PROP, [EX[name]])
+
+
+def _random_path(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return _prop(rng.choice('pqr'))
+    pop = rng.choice([POp.INV, POp.ZEROORONE, POp.KLEENE, POp.COMP, POp.ALT, POp.ID])
+    if pop == POp.ID:
+        return PANode(POp.ID, [])
+    if pop in (POp.COMP, POp.ALT):
+        return PANode(pop, [_random_path(rng, depth - 1) for _ in range(rng.randint(1, 3))])
+    return PANode(pop, [_random_path(rng, depth - 1)])
+
+
+def test_csr_graph_encoding():
+    g = Graph()
+    g.add((EX.a, EX.p, EX.b))
+    g.add((EX.a, EX.p, Literal(1)))
+    g.add((EX.b, EX.q, EX.a))
+    csr = CSRGraph(g)
+    assert len(csr) == 3
+    assert set(csr.terms) == {EX.a, EX.b, Literal(1)}
+    assert all(csr.terms[csr.ids[term]] == term for term in csr.terms)
+    assert CSRPathEvaluator(csr).values(_prop('p'), EX.a) == {EX.b, Literal(1)}
+
+
+@mark.parametrize('path, start, expected', [
+    (PANode(POp.ID, []), EX.unknown, {EX.unknown}),
+    (_prop('p'), EX.unknown, set()),
+    (PANode(POp.KLEENE, [_prop('p')]), EX.unknown, {EX.unknown}),
+    (_prop('missing'), EX.a, set()),
+])
+def test_nodes_and_predicates_outside_the_graph(path, start, expected):
+    g = Graph()
+    g.add((EX.a, EX.p, EX.b))
+    assert CSRPathEvaluator(CSRGraph(g)).values(path, start) == expected
+
+
+def test_csr_agrees_with_rdflib_evaluation():
+    rng = random.Random(11)
+    g = Graph()
+    nodes = [EX[f'n{i}'] for i in range(10)]
+    for _ in range(25):
+        g.add((rng.choice(nodes), EX[rng.choice('pqr')], rng.choice(nodes)))
+    paths = CSRPathEvaluator(CSRGraph(g))
+    starts = nodes + [EX.outside]
+    for _ in range(200):
+        path = _random_path(rng, 4)
+        assert paths.pairs(path, starts) == PathEvaluator(g).pairs(path, starts)
@@ -0,0 +1,165 @@
+from pathlib import Path
+
+from pytest import mark
+
+from rdflib.namespace import RDF, RDFS, XSD, SH
+from rdflib import Graph, Namespace, Literal
+
+from slsparser.shapels import parse, Op, SANode
+from slsparser.pathls import PANode, POp
+from slsparser.evaluate import Evaluator
+
+EX = Namespace('http://ex.tt/')
+TESTFILES = Path(__file__).parent / 'sls_testfiles'
+
+DATA = """
+    @prefix ex: <http://ex.tt/> .
+    @prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+    ex:alice a ex:Student ;
+        ex:name "Alice"@en, "Alicia"@es ;
+        ex:age 21 ;
+        ex:start 2010 ; ex:end 2014 ;
+        ex:knows ex:bob, ex:carol .
+    ex:bob a ex:Person ;
+        ex:name "Bob"@en, "Bobby"@en ;
+        ex:age "old" ;
+        ex:start 2014 ; ex:end 2014 ;
+        ex:knows ex:alice .
+    ex:carol ex:knows ex:carol .
+    ex:Student rdfs:subClassOf ex:Person .
+"""
+
+
+def _evaluator(definitions=None):
+    g = Graph()
+    g.parse(data=DATA, format='turtle')
+    return Evaluator(g, definitions)
+
+
+def _class(cls):
+    return SANode(Op.COUNTRANGE, [Literal(1), None, PANode(POp.COMP, [
+        PANode(POp.PROP, [RDF.type]),
+        PANode(POp.KLEENE, [PANode(POp.PROP, [RDFS.subClassOf])])]),
+        SANode(Op.HASVALUE, [cls])])
+
+
+@mark.parametrize('node, focus, expected', [
+    (_class(EX.Person), EX.alice, True),
+    (_class(EX.Student), EX.bob, False),
+    (SANode(Op.COUNTRANGE, [Literal(2), Literal(2), PANode(POp.PROP, [EX.knows]), SANode(Op.TOP, [])]),
+     EX.alice, True),
+    (SANode(Op.COUNTRANGE, [Literal(0), Literal(0), PANode(POp.INV, [PANode(POp.PROP, [EX.knows])]),
+                            SANode(Op.TOP, [])]), EX.carol, False),
+    (SANode(Op.FORALL, [PANode(POp.PROP, [EX.age]),
+                        SANode(Op.TEST, [SH.DatatypeConstraintComponent, XSD.integer])]), EX.alice, True),
+    (SANode(Op.FORALL, [PANode(POp.PROP, [EX.age]),
+                        SANode(Op.TEST, [SH.DatatypeConstraintComponent, XSD.integer])]), EX.bob, False),
+    (SANode(Op.TEST, [SH.NodeKindConstraintComponent, SH.BlankNodeOrIRI]), EX.bob, True),
+    (SANode(Op.TEST, [SH.PatternConstraintComponent, '^ali', [Literal('i')]]), Literal('Alice'), True),
+    (SANode(Op.TEST, ['numeric_range', SH.MinExclusiveConstraintComponent, Literal(1),
+                      SH.MaxInclusiveConstraintComponent, Literal(10)]), Literal(10), True),
+    (SANode(Op.TEST, ['numeric_range', SH.MinExclusiveConstraintComponent, Literal(1)]),
+     Literal('5'), False),
+    (SANode(Op.TEST, ['length_range', SH.MaxLengthConstraintComponent, Literal(3)]), Literal('Bob'), True),
+    (SANode(Op.TEST, [SH.LanguageInConstraintComponent, [Literal('en')]]), Literal('x', lang='en-GB'), True),
+    (SANode(Op.EQ, [PANode(POp.ID, []), PANode(POp.PROP, [EX.knows])]), EX.carol, True),
+    (SANode(Op.DISJ, [PANode(POp.ID, []), PANode(POp.PROP, [EX.knows])]), EX.alice, True),
+    (SANode(Op.LESSTHAN, [PANode(POp.PROP, [EX.start]), PANode(POp.PROP, [EX.end])]), EX.alice, True),
+    (SANode(Op.LESSTHAN, [PANode(POp.PROP, [EX.start]), PANode(POp.PROP, [EX.end])]), EX.bob, False),
+    (SANode(Op.LESSTHANEQ, [PANode(POp.PROP, [EX.start]), PANode(POp.PROP, [EX.end])]), EX.bob, True),
+    (SANode(Op.LESSTHAN, [PANode(POp.PROP, [EX.age]), PANode(POp.PROP, [EX.end])]), EX.bob, False),
+    (SANode(Op.UNIQUELANG, [PANode(POp.PROP, [EX.name])]), EX.alice, True),
+    (SANode(Op.UNIQUELANG, [PANode(POp.PROP, [EX.name])]), EX.bob, False),
+    (SANode(Op.CLOSED, [PANode(POp.PROP, [EX.knows])]), EX.carol, True),
+    (SANode(Op.CLOSED, [PANode(POp.PROP, [EX.knows])]), EX.bob, False),
+    (SANode(Op.OR, [SANode(Op.HASVALUE, [EX.bob]), SANode(Op.NOT, [SANode(Op.TOP, [])])]), EX.bob, True),
+    (SANode(Op.AND, [SANode(Op.HASVALUE, [EX.bob]), SANode(Op.BOT, [])]), EX.bob, False),
+    (SANode(Op.HASSHAPE, [EX.undefined]), EX.bob, True),
+    (SANode(Op.IN, [frozenset([EX.bob, EX.carol, Literal(21)])]), EX.carol, True),
+    (SANode(Op.IN, [frozenset([EX.bob, EX.carol, Literal(21)])]), Literal('21'), False),
+    (SANode(Op.NOT, [SANode(Op.IN, [frozenset([EX.bob])])]), EX.alice, True),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), _class(EX.Person), _class(EX.Student),
+                            SANode(Op.HASVALUE, [EX.bob])]), EX.bob, False),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), _class(EX.Person), _class(EX.Student),
+                            SANode(Op.HASVALUE, [EX.bob])]), EX.carol, False),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), _class(EX.Student),
+                            SANode(Op.HASVALUE, [EX.bob])]), EX.bob, True),
+    (SANode(Op.CHILDRANGE, [Literal(2), None, _class(EX.Person), _class(EX.Student),
+                            SANode(Op.HASVALUE, [EX.bob])]), EX.alice, True),
+])
+def test_holds(node, focus, expected):
+    assert _evaluator().holds(node, focus) == expected
+
+
+def test_recursive_shape():
+    # everyone known (transitively) by carol is carol: a recursive shape
+    definitions = {EX.s: SANode(Op.AND, [
+        SANode(Op.HASVALUE, [EX.carol]),
+        SANode(Op.FORALL, [PANode(POp.PROP, [EX.knows]), SANode(Op.HASSHAPE, [EX.s])])])}
+    evaluator = _evaluator(definitions)
+
+    assert evaluator.conforms(EX.s, EX.carol)
+    assert not evaluator.conforms(EX.s, EX.alice)
+
+
+@mark.parametrize('first', [EX.a, EX.b])
+def test_recursion_assumption_is_not_memoized(first):
+    # a references b, b holds for no focus node, so neither holds
+    definitions = {EX.a: SANode(Op.HASSHAPE, [EX.b]),
+                   EX.b: SANode(Op.AND, [SANode(Op.HASSHAPE, [EX.a]), SANode(Op.BOT, [])])}
+    evaluator = _evaluator(definitions)
+
+    assert not evaluator.conforms(first, EX.bob)
+    assert not evaluator.conforms(EX.a, EX.bob)
+    assert not evaluator.conforms(EX.b, EX.bob)
+
+
+def test_conforms_reuses_its_memo():
+    evaluator = _evaluator({EX.s: _class(EX.Person)})
+
+    assert evaluator.conforms(EX.s, EX.alice)
+    memo, pinned = len(evaluator._memo), len(evaluator._pinned)
+    assert evaluator.conforms(EX.s, EX.alice)
+    assert (len(evaluator._memo), len(evaluator._pinned)) == (memo, pinned)
+
+
+def test_parsed_shapes():
+    g = Graph()
+    g.parse(str(TESTFILES / 'shape_card_qual.ttl'))
+    definitions = parse(g)[0]
+
+    data = Graph()
+    data.parse(data="""
+        @prefix ex: <http://ex.tt/> .
+        ex:n ex:p1 1, 2, 3 .
+        ex:m ex:p1 1 .
+    """, format='turtle')
+    evaluator = Evaluator(data, definitions)
+
+    assert evaluator.conforms(EX.shape1, EX.n)
+    assert not evaluator.conforms(EX.shape1, EX.m)
+
+
+@mark.parametrize('value, expected', [
+    (Literal('123'), True),
+    (Literal('12a'), False),
+    (Literal('\\ddd'), False),
+])
+def test_parsed_pattern(value, expected):
+    g = Graph()
+    g.parse(data=r"""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        ex:s a sh:NodeShape ; sh:pattern "^\\d+$" .
+    """, format='turtle')
+    evaluator = Evaluator(Graph(), parse(g)[0])
+
+    assert evaluator.conforms(EX.s, value) == expected
+
+
+def test_deep_shape():
+    shape = SANode(Op.HASVALUE, [EX.bob])
+    for _ in range(5000):
+        shape = SANode(Op.NOT, [SANode(Op.NOT, [shape])])
+
+    assert _evaluator().holds(shape, EX.bob)
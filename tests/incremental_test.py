@@ -0,0 +1,241 @@
+import random
+from pathlib import Path
+
+from pytest import mark
+
+from rdflib import Graph, Namespace, Literal, BNode
+from rdflib.namespace import RDF, RDFS, SH
+
+from slsparser.shapels import parse, SANode, Op
+from slsparser.incremental import IncrementalParser, IncrementalValidator
+from slsparser.evaluate import Evaluator
+from slsparser.targets import target_sets
+
+EX = Namespace('http://ex.tt/')
+TESTFILES = Path(__file__).parent / 'sls_testfiles'
+
+
+def _graph(data):
+    g = Graph()
+    g.parse(data=data, format='turtle')
+    return g
+
+
+def _copy(graph):
+    copy = Graph()
+    for triple in graph:
+        copy.add(triple)
+    return copy
+
+
+def test_update_reparses_only_affected_shapes():
+    g = _graph("""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        ex:a a sh:NodeShape ; sh:property [ sh:path ex:p ; sh:minCount 1 ] .
+        ex:b a sh:NodeShape ; sh:in ( ex:x ex:y ) .
+        ex:c a sh:NodeShape ; sh:node ex:a .
+    """)
+    parser = IncrementalParser(g)
+    in_list = g.value(EX.b, SH['in'])
+    second_cell = g.value(in_list, RDF.rest)
+    assert parser.update(added=[(second_cell, RDF.first, EX.z)],
+                         removed=[(second_cell, RDF.first, EX.y)]) == {EX.b}
+    assert parser.definitions == parse(g)[0]
+
+    assert parser.update(added=[(EX.d, SH.node, EX.c)]) == {EX.d}
+    assert parser.definitions[EX.d] == SANode(Op.HASSHAPE, [EX.c], SH.NodeConstraintComponent)
+
+    assert parser.update(removed=[(EX.d, SH.node, EX.c)]) == {EX.d}
+    assert EX.d not in parser.definitions
+    assert parser.update(added=[(EX.a, SH.node, EX.c)]) == {EX.a}
+
+
+def test_qualified_siblings_are_reparsed():
+    g = _graph("""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        ex:a a sh:NodeShape ; sh:property ex:q1, ex:q2 .
+        ex:q1 sh:path ex:p ; sh:qualifiedValueShape ex:s1 ;
+            sh:qualifiedMinCount 1 ; sh:qualifiedValueShapesDisjoint true .
+        ex:q2 sh:path ex:p ; sh:qualifiedValueShape ex:s2 ;
+            sh:qualifiedMinCount 1 ; sh:qualifiedValueShapesDisjoint true .
+    """)
+    parser = IncrementalParser(g)
+    affected = parser.update(added=[(EX.q2, SH.qualifiedValueShape, EX.s3)])
+    assert {EX.q1, EX.q2} <= affected
+    assert parser.definitions == parse(g)[0]
+
+
+def test_closed_parents_are_reparsed():
+    g = _graph("""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        ex:s a sh:NodeShape ; sh:closed true ; sh:property ex:p .
+        ex:p sh:path ex:a .
+    """)
+    parser = IncrementalParser(g)
+    assert parser.update(added=[(EX.p, SH.path, EX.b)],
+                         removed=[(EX.p, SH.path, EX.a)]) == {EX.s, EX.p}
+    assert parser.definitions == parse(g)[0]
+
+
+@mark.parametrize('graph_file', sorted(p.name for p in TESTFILES.glob('*.ttl')))
+def test_random_updates_match_a_full_parse(graph_file):
+    rng = random.Random(graph_file)
+    g = Graph()
+    g.parse(str(TESTFILES / graph_file))
+    parser = IncrementalParser(g)
+    removed = []
+    terms = sorted({term for triple in g for term in triple}, key=str)
+    predicates = [SH.node, SH.property, SH['not'], SH.minCount, RDF.first, SH.path,
+                  SH.qualifiedValueShapesDisjoint, SH.targetNode, RDF.type]
+    for _ in range(40):
+        triples = sorted(g, key=str)
+        roll = rng.random()
+        if roll < 0.4 and triples:
+            added, deleted = [], [rng.choice(triples)]
+        elif roll < 0.7 and removed:
+            added, deleted = [removed.pop(rng.randrange(len(removed)))], []
+        else:
+            obj = rng.choice(terms + [Literal(True), Literal(2), BNode()])
+            added, deleted = [(rng.choice(terms), rng.choice(predicates), obj)], []
+
+        if any(p in (RDF.first, RDF.rest) and (s, p, None) in g for s, p, _ in added):
+            continue  # a list cell with two members has no defined parse
+        trial = _copy(g)
+        for triple in deleted:
+            trial.remove(triple)
+        for triple in added:
+            trial.add(triple)
+        try:
+            parse(trial)
+        except Exception:  # not a well-formed shapes graph: skip the change
+            continue
+
+        parser.update(added, deleted)
+        removed += deleted
+        expected = parse(g)  # the same graph, so parameters come in the same order
+        assert parser.definitions == expected[0]
+        assert parser.target == expected[1]
+
+
+VALIDATION_SHAPES = """
+    @prefix ex: <http://ex.tt/> .
+    @prefix sh: <http://www.w3.org/ns/shacl#> .
+    @prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+    ex:PersonShape a sh:NodeShape ;
+        sh:targetClass ex:Person ;
+        sh:property [ sh:path ex:name ; sh:minCount 1 ; sh:maxCount 1 ] ;
+        sh:property [ sh:path ( ex:knows ex:name ) ; sh:node ex:NameShape ] ;
+        sh:property [ sh:path ex:knows ; sh:node ex:NamedShape ] ;
+        sh:property [ sh:path [ sh:inversePath ex:knows ] ; sh:maxCount 2 ] .
+    ex:NameShape a sh:NodeShape ;
+        sh:targetObjectsOf ex:name ;
+        sh:nodeKind sh:Literal .
+    ex:NamedShape a sh:NodeShape ;
+        sh:property [ sh:path ex:name ; sh:minCount 1 ] .
+    ex:ClosedShape a sh:NodeShape ;
+        sh:targetSubjectsOf ex:knows ;
+        sh:closed true ; sh:ignoredProperties ( ex:knows ex:name ) .
+    ex:FriendShape a sh:NodeShape ;
+        sh:targetNode ex:a ;
+        sh:property [ sh:path [ sh:zeroOrMorePath ex:knows ] ;
+                      sh:qualifiedValueShape [ sh:hasValue ex:c ] ;
+                      sh:qualifiedMinCount 1 ] .
+"""
+
+NODES = [EX.a, EX.b, EX.c, EX.d, EX.Person, EX.Student, Literal('x'), Literal('y')]
+PREDICATES = [EX.knows, EX.name, EX.other, RDF.type, RDFS.subClassOf]
+
+
+def _validation(data_graph, definitions, target):
+    evaluator = Evaluator(data_graph, definitions)
+    return {(shapename, node): evaluator.conforms(shapename, node)
+            for shapename, focus in target_sets(data_graph, target).items()
+            for node in focus}
+
+
+def test_validator_rechecks_only_affected_focus_nodes():
+    definitions, target = parse(_graph(VALIDATION_SHAPES))
+    data = _graph("""
+        @prefix ex: <http://ex.tt/> .
+        ex:a a ex:Person ; ex:name "a" ; ex:knows ex:b .
+        ex:b a ex:Person ; ex:name "b" ; ex:knows ex:c .
+        ex:c a ex:Person ; ex:name "c" .
+    """)
+    validator = IncrementalValidator(data, definitions, target)
+    assert validator.update(added=[(EX.c, EX.name, Literal('d'))]) == {
+        (EX.PersonShape, EX.c), (EX.PersonShape, EX.b), (EX.NameShape, Literal('d'))}
+    assert not validator.results[(EX.PersonShape, EX.c)]
+    assert validator.update(added=[(EX.c, EX.unrelated, EX.a)]) == set()
+    assert validator.results == _validation(data, definitions, target)
+
+
+@mark.parametrize('shapes, added, removed, expected', [
+    # the name is looked up at the nodes a knows
+    ("""ex:s sh:targetNode ex:a ;
+            sh:property [ sh:path ( ex:knows ex:name ) ; sh:nodeKind sh:Literal ] .""",
+     [(EX.b, EX.name, EX.c)], [], {(EX.s, EX.a): False}),
+    # through a chain of references
+    ("""ex:s sh:targetNode ex:a ; sh:node ex:t .
+        ex:t sh:node ex:u .
+        ex:u sh:property [ sh:path ex:other ; sh:minCount 1 ] .""",
+     [(EX.a, EX.other, EX.c)], [], {(EX.s, EX.a): True}),
+    # at the end of the inverse of a zero-or-more path
+    ("""ex:s sh:targetNode ex:c ;
+            sh:property [ sh:path [ sh:zeroOrMorePath [ sh:inversePath ex:knows ] ] ;
+                          sh:class ex:Person ] .""",
+     [], [(EX.a, RDF.type, EX.Person)], {(EX.s, EX.c): False}),
+    # any predicate of a closed shape
+    ("""ex:s sh:targetClass ex:Person ; sh:closed true ;
+            sh:ignoredProperties ( rdf:type ex:knows ex:name ) .""",
+     [(EX.b, EX.other, EX.c)], [], {(EX.s, EX.b): False}),
+    # in the children of an sh:xone
+    ("""ex:s sh:targetNode ex:a ;
+            sh:xone ( [ sh:class ex:Robot ] [ sh:property [ sh:path ex:other ; sh:minCount 1 ] ] ) .""",
+     [(EX.a, EX.other, EX.c)], [], {(EX.s, EX.a): True}),
+    # a node that enters a target
+    ("""ex:s sh:targetSubjectsOf ex:other ; sh:class ex:Person .""",
+     [(EX.c, EX.other, EX.a)], [], {(EX.s, EX.c): False}),
+    # and one that leaves it
+    ("""ex:s sh:targetClass ex:Person .""",
+     [], [(EX.b, RDF.type, EX.Person)], {(EX.s, EX.b): None}),
+])
+def test_validator_follows_the_lookups(shapes, added, removed, expected):
+    shapes = _graph("""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        @prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+    """ + shapes)
+    definitions, target = parse(shapes)
+    data = _graph("""
+        @prefix ex: <http://ex.tt/> .
+        ex:a a ex:Person ; ex:name "a" ; ex:knows ex:b .
+        ex:b a ex:Person ; ex:name "b" ; ex:knows ex:c .
+    """)
+    validator = IncrementalValidator(data, definitions, target)
+    assert validator.update(added=added, removed=removed) == set(expected)
+    for pair, conforms in expected.items():
+        assert validator.results.get(pair) == conforms
+    assert validator.results == _validation(data, definitions, target)
+
+
+@mark.parametrize('seed', range(5))
+def test_random_validation_updates_match_a_full_validation(seed):
+    definitions, target = parse(_graph(VALIDATION_SHAPES))
+    rng = random.Random(seed)
+    data = Graph()
+    for node in NODES[:4]:
+        data.add((node, RDF.type, EX.Person))
+    validator = IncrementalValidator(data, definitions, target)
+    for _ in range(100):
+        triples = [(rng.choice(NODES[:5]), rng.choice(PREDICATES), rng.choice(NODES))
+                   for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.4:
+            existing = list(data)
+            removed = rng.sample(existing, min(len(existing), rng.randint(1, 2)))
+            validator.update(removed=removed)
+        else:
+            validator.update(added=triples)
+        assert validator.results == _validation(data, definitions, target)
@@ -0,0 +1,115 @@
+from pathlib import Path
+
+from rdflib.namespace import RDF, RDFS, SH
+from rdflib import Graph, Namespace, Literal, BNode
+
+from slsparser.shapels import parse, Op, SANode
+from slsparser.pathls import PANode, POp
+from slsparser.interning import NodeInterner, eliminate_common_subexpressions, SUBFORMULA
+from slsparser.evaluate import Evaluator
+
+EX = Namespace('http://ex.tt/')
+TESTFILES = Path(__file__).parent / 'sls_testfiles'
+
+
+def _tree():
+    return SANode(Op.COUNTRANGE, [
+        Literal(1), None,
+        PANode(POp.COMP, [PANode(POp.PROP, [RDF.type]),
+                          PANode(POp.KLEENE, [PANode(POp.PROP, [RDFS.subClassOf])])]),
+        SANode(Op.HASVALUE, [EX.c])], SH.ClassConstraintComponent)
+
+
+def test_hash_consistent_with_eq():
+    assert _tree() == _tree()
+    assert hash(_tree()) == hash(_tree())
+    assert len({_tree(), _tree()}) == 1
+    # '==' treats blank node children as equal, so must the hash
+    assert hash(SANode(Op.HASSHAPE, [BNode()])) == hash(SANode(Op.HASSHAPE, [BNode()]))
+
+
+def test_interning_shares_instances():
+    interner = NodeInterner()
+    first = interner.intern(_tree())
+    second = interner.intern(_tree())
+
+    assert first is second
+    assert first == _tree()
+    assert hash(first) == hash(_tree())
+    assert interner.intern(first) is first
+    assert isinstance(first.children, tuple)
+    assert interner.panode(POp.PROP, [RDF.type]) is first.children[2].children[0]
+
+
+def test_interning_keeps_blank_nodes_apart():
+    interner = NodeInterner()
+    left = interner.sanode(Op.HASSHAPE, [BNode()])
+    right = interner.sanode(Op.HASSHAPE, [BNode()])
+
+    assert left is not right
+
+
+def test_parse_with_interner():
+    g = Graph()
+    g.parse(data="""
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        @prefix ex: <http://ex.tt/> .
+        ex:s1 a sh:NodeShape ; sh:class ex:c ; sh:targetClass ex:c .
+        ex:s2 a sh:NodeShape ; sh:class ex:c ; sh:targetClass ex:d .
+    """, format='turtle')
+
+    definitions, target = parse(g, interner=NodeInterner())
+
+    assert definitions[EX.s1] is definitions[EX.s2]
+    assert target[EX.s1].children[2] is target[EX.s2].children[2]
+    assert definitions == parse(g)[0]
+
+
+def test_common_subexpressions_are_shared():
+    definitions = {
+        EX.s: SANode(Op.AND, [_tree(), SANode(Op.NOT, [_tree()])]),
+        EX.t: SANode(Op.OR, [_tree(), SANode(Op.TEST, [SH.NodeKindConstraintComponent, SH.IRI])]),
+        EX.u: _tree(),
+    }
+    shared, report = eliminate_common_subexpressions(definitions)
+    assert shared == definitions
+    assert shared[EX.s].children[0] is shared[EX.s].children[1].children[0] is shared[EX.u]
+    assert report == (14 + 8 + 6, 6 + 4, 0)
+
+    named, report = eliminate_common_subexpressions(definitions, names=True)
+    # the class check is the definition of ex:u, so it is referred to by that name
+    reference = SANode(Op.HASSHAPE, [EX.u])
+    assert named[EX.s] == SANode(Op.AND, [reference, SANode(Op.NOT, [reference])])
+    assert named[EX.t].children[0] == reference
+    assert named[EX.u] == _tree()
+    assert report.names == 0
+
+
+def test_named_subexpressions_keep_the_semantics():
+    g = Graph()
+    g.parse(str(TESTFILES / 'shape_logic.ttl'))
+    g.parse(data="""
+        @prefix ex: <http://ex.tt/> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        ex:s1 sh:class ex:C ; sh:property [ sh:path ex:p ; sh:minCount 1 ] .
+        ex:s2 sh:class ex:C ; sh:xone ( ex:or1 ex:s1 ) .
+    """, format='turtle')
+    definitions, _ = parse(g)
+    named, report = eliminate_common_subexpressions(definitions, names=True)
+    assert report.names > 0 and report.after < report.before
+    synthetic = [name for name in named if name.startswith(SUBFORMULA)]
+    assert len(synthetic) == report.names
+    assert all(named[name].op not in (Op.TEST, Op.HASSHAPE) for name in synthetic)
+
+    data = Graph()
+    data.parse(data="""
+        @prefix ex: <http://ex.tt/> .
+        ex:a ex:p ex:b, "x" ; ex:q 1, 2 ; a ex:C .
+        ex:b ex:p ex:a ; ex:q "y"@en .
+        ex:c ex:r ex:c .
+    """, format='turtle')
+    nodes = set(data.subjects()) | set(data.objects())
+    original, shared = Evaluator(data, definitions), Evaluator(data, named)
+    for shapename in definitions:
+        for node in nodes:
+            assert original.conforms(shapename, node) == shared.conforms(shapename, node)
@@ -0,0 +1,68 @@
+from pytest import mark
+
+from rdflib import Graph, Namespace
+
+from slsparser.pathls import PANode, POp
+from slsparser.pathevaluate import PathEvaluator
+
+EX = Namespace('http://ex.tt/')
+
+DATA = """
+    @prefix ex: <http://ex.tt/> .
+    ex:a ex:p ex:b .
+    ex:b ex:p ex:c .
+    ex:c ex:p ex:a .
+    ex:c ex:q ex:d .
+    ex:d ex:q ex:e .
+"""
+
+
+def _prop(name):
+    return PANode(POp.PROP, [EX[name]])
+
+
+def _paths(automata=False):
+    g = Graph()
+    g.parse(data=DATA, format='turtle')
+    return PathEvaluator(g, automata)
+
+
+@mark.parametrize('path, start, expected', [
+    (PANode(POp.ID, []), EX.a, {EX.a}),
+    (_prop('p'), EX.a, {EX.b}),
+    (PANode(POp.INV, [_prop('p')]), EX.a, {EX.c}),
+    (PANode(POp.COMP, [_prop('p'), _prop('p')]), EX.a, {EX.c}),
+    (PANode(POp.COMP, [_prop('p'), _prop('q')]), EX.b, {EX.d}),
+    (PANode(POp.ALT, [_prop('p'), _prop('q')]), EX.c, {EX.a, EX.d}),
+    (PANode(POp.ZEROORONE, [_prop('q')]), EX.c, {EX.c, EX.d}),
+    (PANode(POp.KLEENE, [_prop('p')]), EX.a, {EX.a, EX.b, EX.c}),
+    (PANode(POp.KLEENE, [_prop('q')]), EX.c, {EX.c, EX.d, EX.e}),
+    (PANode(POp.KLEENE, [_prop('q')]), EX.e, {EX.e}),
+    (PANode(POp.INV, [PANode(POp.KLEENE, [_prop('q')])]), EX.e, {EX.c, EX.d, EX.e}),
+    (PANode(POp.INV, [PANode(POp.COMP, [_prop('p'), _prop('q')])]), EX.d, {EX.b}),
+])
+@mark.parametrize('automata', [False, True])
+def test_values(path, start, expected, automata):
+    assert _paths(automata).values(path, start) == expected
+
+
+def test_pairs_agree_with_values():
+    paths = _paths()
+    starts = [EX.a, EX.b, EX.c, EX.d, EX.e]
+    path = PANode(POp.COMP, [PANode(POp.KLEENE, [_prop('p')]),
+                             PANode(POp.ZEROORONE, [_prop('q')])])
+    pairs = paths.pairs(path, starts)
+    assert pairs == {start: _paths().values(path, start) for start in starts}
+
+
+def test_kleene_closures_are_cached_per_path():
+    paths = _paths()
+    kleene = PANode(POp.KLEENE, [_prop('q')])
+    paths.values(kleene, EX.d)
+    paths.values(kleene, EX.c)  # reuses the closure of ex:d
+    closures = paths._closures[_prop('q')]
+    assert closures == {EX.c: {EX.c, EX.d, EX.e}, EX.d: {EX.d, EX.e}}
+    # a structurally equal path uses the same cache
+    assert paths.values(PANode(POp.KLEENE, [_prop('q')]), EX.d) == {EX.d, EX.e}
+    assert list(paths._closures) == [_prop('q')]
+
@@ -4,7 +4,7 @@ from pytest import mark
 from rdflib import Graph, URIRef, Namespace
 
 
-from slsparser.pathls import POp, PANode, parse
+from slsparser.pathls import POp, PANode, parse, inverse
 
 EX = Namespace('http://ex.tt/')
 TESTFILES = Path(__file__).parent / 'sls_testfiles'
@@ -54,3 +54,10 @@ def test_path_parsing(graph_file, expected_path):
     parsed = parse(g, path)
 
     assert parsed == expected_path
+
+
+def test_inverse():
+    p, q = PANode(POp.PROP, [EX.p]), PANode(POp.PROP, [EX.q])
+    path = PANode(POp.COMP, [p, PANode(POp.INV, [q])])
+    assert inverse(path) == PANode(POp.COMP, [q, PANode(POp.INV, [p])])
+    assert inverse(inverse(path)) == path
@@ -0,0 +1,73 @@
+from datetime import date
+from decimal import Decimal
+
+from pytest import mark, raises
+
+from rdflib.namespace import RDF, XSD, SH
+from rdflib import Namespace, Literal, BNode
+
+from slsparser.shapels import Op, SANode
+from slsparser.predicates import compile_test, compare
+
+EX = Namespace('http://ex.tt/')
+
+
+def _test(*children):
+    return SANode(Op.TEST, list(children))
+
+
+@mark.parametrize('node, value, expected', [
+    (_test(SH.DatatypeConstraintComponent, XSD.integer), Literal(1), True),
+    (_test(SH.DatatypeConstraintComponent, XSD.integer), Literal('one', datatype=XSD.integer), False),
+    (_test(SH.DatatypeConstraintComponent, XSD.string), Literal('one'), True),
+    (_test(SH.DatatypeConstraintComponent, XSD.string), Literal('one', lang='en'), False),
+    (_test(SH.DatatypeConstraintComponent, RDF.langString), Literal('one', lang='en'), True),
+    (_test(SH.DatatypeConstraintComponent, XSD.string), EX.one, False),
+    (_test(SH.NodeKindConstraintComponent, SH.BlankNodeOrLiteral), BNode(), True),
+    (_test(SH.NodeKindConstraintComponent, SH.IRI), Literal('x'), False),
+    (_test(SH.PatternConstraintComponent, '^ex', []), EX.one, False),
+    (_test(SH.PatternConstraintComponent, '^HTTP', [Literal('i')]), EX.one, True),
+    (_test(SH.PatternConstraintComponent, '.', []), BNode(), False),
+    (_test(SH.PatternConstraintComponent, '^\\\\d+$', []), Literal('42'), True),  # as parsed
+    (_test(SH.LanguageInConstraintComponent, [Literal('EN')]), Literal('x', lang='en-gb'), True),
+    (_test(SH.LanguageInConstraintComponent, [Literal('en')]), Literal('x', lang='eng'), False),
+    (_test(SH.LanguageInConstraintComponent, [Literal('*')]), Literal('x'), False),
+    (_test('length_range', SH.MinLengthConstraintComponent, Literal(2),
+           SH.MaxLengthConstraintComponent, Literal(3)), Literal('abc'), True),
+    (_test('length_range', SH.MinLengthConstraintComponent, Literal(2)), Literal('a'), False),
+    (_test('length_range', SH.MaxLengthConstraintComponent, Literal(3)), BNode(), False),
+    (_test('numeric_range', SH.MinExclusiveConstraintComponent, Literal(1),
+           SH.MaxInclusiveConstraintComponent, Literal(10)), Literal(Decimal('10.0')), True),
+    (_test('numeric_range', SH.MinInclusiveConstraintComponent, Literal(1)), Literal('5'), False),
+    (_test('numeric_range', SH.MinInclusiveConstraintComponent, Literal('b')), Literal('c'), True),
+    (_test('numeric_range', SH.MaxExclusiveConstraintComponent, Literal(date(2020, 1, 1))),
+     Literal(date(2019, 1, 1)), True),
+    (_test('numeric_range', SH.MaxExclusiveConstraintComponent, EX.one), Literal(1), False),
+])
+def test_compiled_test(node, value, expected):
+    assert compile_test(node)(value) == expected
+
+
+_OUTCOMES = {SH.MinExclusiveConstraintComponent: (1,),
+             SH.MinInclusiveConstraintComponent: (0, 1),
+             SH.MaxExclusiveConstraintComponent: (-1,),
+             SH.MaxInclusiveConstraintComponent: (-1, 0)}
+
+_LITERALS = [Literal(0), Literal(2), Literal(2.5), Literal(Decimal('2')), Literal(True),
+             Literal('2'), Literal('2', lang='en'), Literal('b'), Literal(date(2000, 1, 1)),
+             Literal('x', datatype=XSD.integer), EX.two]
+
+
+@mark.parametrize('component', list(_OUTCOMES))
+@mark.parametrize('bound', _LITERALS)
+def test_numeric_range_follows_compare(component, bound):
+    test = compile_test(_test('numeric_range', component, bound))
+    for value in _LITERALS:
+        assert test(value) == (compare(value, bound) in _OUTCOMES[component])
+
+
+def test_compile_rejects_other_nodes():
+    with raises(ValueError):
+        compile_test(SANode(Op.HASVALUE, [EX.one]))
+    with raises(ValueError):
+        compile_test(_test(EX.unknownTest, EX.one))
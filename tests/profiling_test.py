@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from pytest import mark, raises
+
+from rdflib import Graph
+
+from slsparser import shapels, utilities
+from slsparser.shapels import parse
+from slsparser.profiling import profile_parse
+
+TESTFILES = Path(__file__).parent / 'sls_testfiles'
+
+
+def _read(name):
+    g = Graph()
+    g.parse(str(TESTFILES / name))
+    return g
+
+
+@mark.parametrize('name', ['shape_logic.ttl', 'shape_pair.ttl', 'shape_card_qual.ttl'])
+def test_profile_counts_phases_and_lookups(name):
+    graph = _read(name)
+    expected = parse(graph)
+
+    with profile_parse() as report:
+        assert parse(graph) == expected
+
+    phases = report.phases
+    assert phases['discovery'].calls == 1
+    assert phases['_definition_parse'].calls == len(expected[0])
+    assert phases['_target_parse'].calls == len(expected[1])
+    assert phases['clean'].calls == len(expected[0])
+    assert report.lookups > 0
+    assert phases['discovery'].lookups == 1  # a single pass over the graph
+    assert all(stats.lookups <= report.lookups for stats in phases.values())
+
+
+def test_profile_restores_the_parse():
+    helpers = dict(vars(shapels))
+    clean, triples = utilities.clean_parsetree, Graph.triples
+
+    with raises(ValueError):
+        with profile_parse():
+            assert shapels._tests_parse is not helpers['_tests_parse']
+            raise ValueError
+
+    assert dict(vars(shapels)) == helpers
+    assert utilities.clean_parsetree is clean
+    assert Graph.triples is triples
+    with profile_parse():  # a new profile can start
+        pass
+
+
+def test_profile_callback_and_nesting():
+    events = []
+    with profile_parse(lambda *event: events.append(event)) as report:
+        with raises(RuntimeError):
+            with profile_parse():
+                pass
+        parse(_read('shape_logic.ttl'))
+
+    assert sum(1 for name, _, _ in events if name == 'discovery') == 1
+    assert len(events) == sum(stats.calls for stats in report.phases.values())
+    assert 'triple pattern lookups' in str(report)
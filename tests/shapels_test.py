@@ -5,7 +5,8 @@ from pytest import mark
 from rdflib.namespace import RDF, RDFS, XSD, SH
 from rdflib import Graph, Namespace, Literal
 
-from slsparser.shapels import parse, Op, SANode
+from slsparser import pool, shapels
+from slsparser.shapels import parse, parse_iter, Op, SANode, ShapesGraphIndex
 from slsparser.pathls import PANode, POp
 from slsparser.utilities import expand_shape
 
@@ -33,20 +34,11 @@ TESTFILES = Path(__file__).parent / 'sls_testfiles'
              SANode(Op.HASSHAPE, [EX.or1]),
              SANode(Op.HASSHAPE, [EX.or2]),
              SANode(Op.HASSHAPE, [EX.or3])], SH.OrConstraintComponent),
-         SANode(Op.OR, [
-             SANode(Op.AND, [
-                 SANode(Op.HASSHAPE, [EX.xone1]),
-                 SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.xone2])]),
-                 SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.xone3])])]),
-             SANode(Op.AND, [
-                 SANode(Op.HASSHAPE, [EX.xone2]),
-                 SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.xone1])]),
-                 SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.xone3])])]),
-             SANode(Op.AND, [
-                 SANode(Op.HASSHAPE, [EX.xone3]),
-                 SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.xone1])]),
-                 SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.xone2])])])],
-                SH.XoneConstraintComponent)])}),
+         SANode(Op.CHILDRANGE, [
+             Literal(1), Literal(1),
+             SANode(Op.HASSHAPE, [EX.xone1]),
+             SANode(Op.HASSHAPE, [EX.xone2]),
+             SANode(Op.HASSHAPE, [EX.xone3])], SH.XoneConstraintComponent)])}),
     ('shape_tests.ttl',
      {EX.shape: SANode(Op.AND, [
          SANode(Op.COUNTRANGE, [Literal(1), 
@@ -67,10 +59,7 @@ TESTFILES = Path(__file__).parent / 'sls_testfiles'
          SANode(Op.HASSHAPE, [EX.pshape1], SH.PropertyConstraintComponent),
          SANode(Op.HASSHAPE, [EX.pshape2], SH.PropertyConstraintComponent),
          SANode(Op.HASVALUE, [EX.val1], SH.HasValueConstraintComponent),
-         SANode(Op.OR, [
-             SANode(Op.HASVALUE, [EX.val2]),
-             SANode(Op.HASVALUE, [EX.val3]),
-             SANode(Op.HASVALUE, [EX.val4])], SH.InConstraintComponent),
+         SANode(Op.IN, [frozenset([EX.val2, EX.val3, EX.val4])], SH.InConstraintComponent),
          SANode(Op.CLOSED, [PANode(POp.PROP, [EX.p1]), PANode(POp.PROP, [EX.p2]), PANode(POp.PROP, [EX.p3])], SH.ClosedConstraintComponent)]),
       EX.pshape1: SANode(Op.COUNTRANGE, [Literal(1), None, PANode(POp.PROP, [EX.p3]),
                                          SANode(Op.HASVALUE, [EX.val5], SH.HasValueConstraintComponent)]),
@@ -202,3 +191,99 @@ def test_repeated_qualified_mincount_keeps_most_restrictive():
     assert shape.children[0] == Literal(20)
 
 
+def test_shapes_graph_index_classification():
+    g = Graph()
+    g.parse(str(TESTFILES / 'shape_card_qual.ttl'))
+
+    index = ShapesGraphIndex(g)
+
+    assert index.nodeshapes == {EX.shape, EX.shape4, EX.shape5}
+    assert index.propertyshapes == {EX.shape1, EX.shape2, EX.shape3}
+    assert index.parents[EX.shape2] == [EX.shape]
+
+
+def test_shapes_graph_index_list_members():
+    g = Graph()
+    g.parse(str(TESTFILES / 'shape_logic.ttl'))
+
+    index = ShapesGraphIndex(g)
+    head = next(g.objects(EX.shape, SH['and']))
+
+    assert index.collection(head) == [EX.and1, EX.and2, EX.and3]
+    assert {EX.xone1, EX.xone2, EX.xone3} <= index.nodeshapes
+    assert not index.propertyshapes
+
+
+def test_shapes_graph_index_parameters():
+    g = Graph()
+    g.parse(str(TESTFILES / 'shape_card_qual.ttl'))
+
+    index = ShapesGraphIndex(g)
+    params = index.parameters(EX.shape2)
+
+    assert params[SH.path] == [EX.p2]
+    assert params[SH.qualifiedValueShape] == [EX.shape4]
+    assert index.parameters(EX.shape2) is params
+
+
+def test_nodes_have_no_instance_dict():
+    assert not hasattr(SANode(Op.TOP, []), '__dict__')
+    assert not hasattr(PANode(POp.ID, []), '__dict__')
+
+
+@mark.parametrize('fork', [True, False])
+def test_parallel_parse_is_identical_to_serial(fork, monkeypatch):
+    # without fork, the workers parse a shipped copy of the shapes graph
+    monkeypatch.setattr(pool, 'FORK', fork)
+    for graph_file in sorted(TESTFILES.glob('*.ttl')):
+        g = Graph()
+        g.parse(str(graph_file))
+        definitions, target = parse(g)
+        parallel_definitions, parallel_target = parse(g, workers=2)
+        assert list(parallel_definitions) == list(definitions)
+        assert list(parallel_target) == list(target)
+        assert parallel_definitions == definitions
+        assert parallel_target == target
+
+
+def test_parse_iter_yields_the_shapes_of_parse(monkeypatch):
+    for graph_file in sorted(TESTFILES.glob('*.ttl')):
+        g = Graph()
+        g.parse(str(graph_file))
+        definitions, target = parse(g)
+        assert [(shapename, definitions[shapename], target[shapename])
+                for shapename in definitions] == list(parse_iter(g))
+
+    parsed = []
+    target_parse = shapels._target_parse
+    monkeypatch.setattr(shapels, '_target_parse',
+                        lambda index, shapename: parsed.append(shapename) or
+                        target_parse(index, shapename))
+    shapes = parse_iter(g)
+    shapename, _, _ = next(shapes)
+    assert parsed == [shapename]  # the other shapes are not parsed yet
+
+
+def test_lazy_parse_parses_shapes_on_first_access(monkeypatch):
+    for graph_file in sorted(TESTFILES.glob('*.ttl')):
+        g = Graph()
+        g.parse(str(graph_file))
+        definitions, target = parse(g)
+        lazy_definitions, lazy_target = parse(g, lazy=True)
+        assert list(lazy_definitions) == list(definitions)
+        assert lazy_definitions == definitions
+        assert lazy_target == target
+
+    parsed = []
+    nodeshape_parse = shapels._nodeshape_parse
+    monkeypatch.setattr(shapels, '_nodeshape_parse',
+                        lambda index, shapename: parsed.append(shapename) or
+                        nodeshape_parse(index, shapename))
+    lazy_definitions, _ = parse(g, lazy=True)
+    shapename = next(name for name in lazy_definitions if name in definitions and
+                     name not in ShapesGraphIndex(g).propertyshapes)
+    assert shapename in lazy_definitions and parsed == []
+    assert lazy_definitions[shapename] == definitions[shapename]
+    assert lazy_definitions[shapename] is lazy_definitions[shapename]
+    assert parsed == [shapename]
+    assert EX.unknown not in lazy_definitions
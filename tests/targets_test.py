@@ -0,0 +1,74 @@
+from pytest import mark
+
+from rdflib import Graph, Namespace, Literal
+
+from slsparser.shapels import parse, SANode, Op
+from slsparser.pathls import PANode, POp
+from slsparser.evaluate import Evaluator
+from slsparser.targets import target_sets
+
+EX = Namespace('http://ex.tt/')
+
+SHAPES = """
+    @prefix ex: <http://ex.tt/> .
+    @prefix sh: <http://www.w3.org/ns/shacl#> .
+    @prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+    ex:nodeTarget a sh:NodeShape ; sh:targetNode ex:alice, ex:nobody .
+    ex:classTarget a sh:NodeShape ; sh:targetClass ex:Person .
+    ex:Student a sh:NodeShape, rdfs:Class .
+    ex:subjectsTarget a sh:NodeShape ; sh:targetSubjectsOf ex:knows .
+    ex:objectsTarget a sh:PropertyShape ; sh:path ex:name ; sh:targetObjectsOf ex:knows .
+    ex:mixedTarget a sh:NodeShape ; sh:targetNode ex:dave ; sh:targetObjectsOf ex:name .
+    ex:noTarget a sh:NodeShape ; sh:class ex:Person .
+"""
+
+DATA = """
+    @prefix ex: <http://ex.tt/> .
+    @prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+    ex:alice a ex:Student ; ex:knows ex:bob ; ex:name "Alice" .
+    ex:bob a ex:Person ; ex:knows ex:carol .
+    ex:carol a ex:PhDStudent .
+    ex:PhDStudent rdfs:subClassOf ex:Student .
+    ex:Student rdfs:subClassOf ex:Person .
+    ex:Person rdfs:subClassOf ex:Student .
+"""
+
+
+def _graphs():
+    shapes, data = Graph(), Graph()
+    shapes.parse(data=SHAPES, format='turtle')
+    data.parse(data=DATA, format='turtle')
+    return shapes, data
+
+
+@mark.parametrize('shapename, expected', [
+    (EX.nodeTarget, {EX.alice, EX.nobody}),
+    (EX.classTarget, {EX.alice, EX.bob, EX.carol}),
+    (EX.Student, {EX.alice, EX.bob, EX.carol}),  # the hierarchy has a cycle
+    (EX.subjectsTarget, {EX.alice, EX.bob}),
+    (EX.objectsTarget, {EX.bob, EX.carol}),
+    (EX.mixedTarget, {EX.dave, Literal('Alice')}),
+    (EX.noTarget, set()),
+])
+def test_target_sets(shapename, expected):
+    shapes, data = _graphs()
+    _, targets = parse(shapes)
+    assert target_sets(data, targets)[shapename] == expected
+
+
+def test_target_sets_agree_with_evaluation():
+    shapes, data = _graphs()
+    _, targets = parse(shapes)
+    evaluator = Evaluator(data)
+    nodes = set(data.subjects()) | set(data.objects())
+    for shapename, focus in target_sets(data, targets).items():
+        expected = {node for node in nodes if evaluator.holds(targets[shapename], node)}
+        assert focus & nodes == expected
+
+
+def test_other_formulas_fall_back_to_evaluation():
+    _, data = _graphs()
+    knows_two = SANode(Op.COUNTRANGE, [Literal(1), None, PANode(POp.COMP, [
+        PANode(POp.PROP, [EX.knows]), PANode(POp.PROP, [EX.knows])]), SANode(Op.TOP, [])])
+    targets = {EX.shape: SANode(Op.OR, [knows_two, SANode(Op.HASVALUE, [EX.dave])])}
+    assert target_sets(data, targets) == {EX.shape: {EX.alice, EX.dave}}
@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from pytest import mark
 
 from rdflib.namespace import RDF, RDFS, XSD, SH
@@ -5,7 +7,8 @@ from rdflib import Graph, Namespace, Literal, URIRef
 
 from slsparser.shapels import parse, Op, SANode
 from slsparser.pathls import PANode, POp
-from slsparser.utilities import clean_parsetree
+from slsparser.utilities import (clean_parsetree, expand_shape, expand_definitions,
+                                 negation_normal_form, normalize)
 
 EX = Namespace('http://example.org/')
 
@@ -62,9 +65,201 @@ EX = Namespace('http://example.org/')
      SANode(Op.BOT, [])),
     (SANode(Op.AND, [SANode(Op.OR, [SANode(Op.TOP, []), SANode(Op.HASVALUE, [EX.one])]),
                      SANode(Op.HASVALUE, [EX.dantes])]),
-     SANode(Op.HASVALUE, [EX.dantes]))
+     SANode(Op.HASVALUE, [EX.dantes])),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.BOT, []), SANode(Op.HASVALUE, [EX.two])]),
+     SANode(Op.CHILDRANGE, [Literal(1), Literal(1), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.HASVALUE, [EX.two])])),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.TOP, []), SANode(Op.HASVALUE, [EX.two])]),
+     SANode(Op.CHILDRANGE, [Literal(0), Literal(0), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.HASVALUE, [EX.two])])),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), SANode(Op.TOP, []), SANode(Op.TOP, []),
+                            SANode(Op.HASVALUE, [EX.one])]),
+     SANode(Op.BOT, [])),
+    (SANode(Op.CHILDRANGE, [Literal(1), Literal(1), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.BOT, [])]),
+     SANode(Op.HASVALUE, [EX.one])),
+    (SANode(Op.CHILDRANGE, [Literal(1), None, SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.HASVALUE, [EX.two])]),
+     SANode(Op.OR, [SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASVALUE, [EX.two])])),
+    (SANode(Op.CHILDRANGE, [Literal(2), Literal(5), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.HASVALUE, [EX.two])]),
+     SANode(Op.AND, [SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASVALUE, [EX.two])])),
+    (SANode(Op.CHILDRANGE, [Literal(0), Literal(2), SANode(Op.HASVALUE, [EX.one]),
+                            SANode(Op.HASVALUE, [EX.two])]),
+     SANode(Op.TOP, [])),
+    (SANode(Op.IN, [frozenset()]),
+     SANode(Op.BOT, [])),
+    (SANode(Op.NOT, [SANode(Op.IN, [frozenset()])]),
+     SANode(Op.TOP, [])),
+    (SANode(Op.IN, [frozenset([EX.one])]),
+     SANode(Op.HASVALUE, [EX.one])),
+    (SANode(Op.IN, [frozenset([EX.one, EX.two])]),
+     SANode(Op.IN, [frozenset([EX.two, EX.one])])),
 ])
 def test_clean_parsetree(tree, expected):
     clean = clean_parsetree(tree) 
     print(clean)
-    assert clean == expected
\ No newline at end of file
+    assert clean == expected
+
+
+def test_expand_shape_memo_shares_subtrees():
+    definitions = {
+        EX.a: SANode(Op.AND, [SANode(Op.HASSHAPE, [EX.c]),
+                              SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.c])])]),
+        EX.c: SANode(Op.HASVALUE, [EX.one])}
+
+    expanded = expand_shape(definitions, definitions[EX.a], {})
+
+    assert expanded == SANode(Op.AND, [SANode(Op.HASVALUE, [EX.one]),
+                                       SANode(Op.NOT, [SANode(Op.HASVALUE, [EX.one])])])
+    assert expanded.children[0] is expanded.children[1].children[0]
+
+
+def test_expand_shape_keeps_cycle_back_edge():
+    definitions = {
+        EX.a: SANode(Op.FORALL, [PANode(POp.PROP, [EX.p]), SANode(Op.HASSHAPE, [EX.b])]),
+        EX.b: SANode(Op.OR, [SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASSHAPE, [EX.a])])}
+
+    expected = SANode(Op.FORALL, [PANode(POp.PROP, [EX.p]), SANode(Op.OR, [
+        SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASSHAPE, [EX.a])])])
+
+    root = SANode(Op.HASSHAPE, [EX.a])
+    assert expand_shape(definitions, root) == expected
+    assert expand_shape(definitions, root, {}) == expected
+
+
+def test_expand_definitions():
+    definitions = {
+        EX.a: SANode(Op.HASSHAPE, [EX.b]),
+        EX.b: SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.missing])])}
+
+    expanded = expand_definitions(definitions)
+
+    assert expanded[EX.b] == SANode(Op.NOT, [SANode(Op.TOP, [])])
+    assert expanded[EX.a] is expanded[EX.b]
+
+
+def test_expand_definitions_matches_expand_shape_on_cycles():
+    definitions = {
+        EX.a: SANode(Op.FORALL, [PANode(POp.PROP, [EX.p]), SANode(Op.HASSHAPE, [EX.b])]),
+        EX.b: SANode(Op.OR, [SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASSHAPE, [EX.a])]),
+        EX.c: SANode(Op.AND, [SANode(Op.HASSHAPE, [EX.b]), SANode(Op.HASSHAPE, [EX.a])])}
+
+    for order in (list(definitions), list(reversed(definitions))):
+        expanded = expand_definitions({name: definitions[name] for name in order})
+        for name in definitions:
+            assert expanded[name] == expand_shape(definitions, SANode(Op.HASSHAPE, [name]))
+
+
+def _deep_tree(depth):
+    tree = SANode(Op.HASVALUE, [EX.one])
+    for i in range(depth):
+        tree = SANode(Op.NOT, [SANode(Op.AND, [tree, SANode(Op.TOP, [])])])
+    return tree
+
+
+def _negations(depth):
+    tree = SANode(Op.HASVALUE, [EX.one])
+    for i in range(depth):
+        tree = SANode(Op.NOT, [tree])
+    return tree
+
+
+def test_transformations_beyond_recursion_limit():
+    depth = 3000
+    tree = _deep_tree(depth)
+
+    assert _deep_tree(depth) == tree
+    assert hash(_deep_tree(depth)) == hash(tree)
+    assert expand_shape({}, tree) == tree
+    assert clean_parsetree(tree, full=False) == _negations(depth)
+    assert negation_normal_form(tree).op == Op.OR
+    assert repr(tree).count('Op.NOT') == depth
+
+
+@mark.parametrize('graph_file', sorted(
+    path.name for path in (Path(__file__).parent / 'sls_testfiles').glob('*.ttl')))
+def test_normalize_matches_pipeline(graph_file):
+    g = Graph()
+    g.parse(str(Path(__file__).parent / 'sls_testfiles' / graph_file))
+    definitions = parse(g)[0]
+
+    for shapename in definitions:
+        expanded = expand_shape(definitions, SANode(Op.HASSHAPE, [shapename]))
+        expected = clean_parsetree(negation_normal_form(expanded))
+        assert normalize(definitions, shapename) == expected
+        assert normalize(definitions, shapename, {}) == expected
+
+
+def test_normalize_pushes_negation_through_references():
+    definitions = {
+        EX.a: SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.b])]),
+        EX.b: SANode(Op.NOT, [SANode(Op.OR, [SANode(Op.HASVALUE, [EX.one]),
+                                             SANode(Op.NOT, [SANode(Op.TOP, [])])])]),
+        EX.c: SANode(Op.NOT, [SANode(Op.FORALL, [PANode(POp.PROP, [EX.p]),
+                                                 SANode(Op.HASSHAPE, [EX.c])])])}
+
+    assert normalize(definitions, EX.a) == SANode(Op.HASVALUE, [EX.one])
+    assert normalize(definitions, EX.b) == SANode(Op.NOT, [SANode(Op.HASVALUE, [EX.one])])
+    assert normalize(definitions, EX.c) == SANode(Op.COUNTRANGE, [
+        Literal(1), None, PANode(POp.PROP, [EX.p]),
+        SANode(Op.NOT, [SANode(Op.HASSHAPE, [EX.c])])])
+    assert normalize(definitions, EX.missing) == SANode(Op.TOP, [])
+
+
+def test_negation_normal_form_of_unbounded_countrange():
+    path = PANode(POp.PROP, [EX.p])
+    tree = SANode(Op.NOT, [SANode(Op.COUNTRANGE, [Literal(0), None, path,
+                                                  SANode(Op.HASVALUE, [EX.one])])])
+
+    assert negation_normal_form(tree) == SANode(Op.BOT, [])
+
+
+@mark.parametrize('lower, upper, expected', [
+    (1, 1, SANode(Op.OR, [
+        SANode(Op.CHILDRANGE, [Literal(2), None, SANode(Op.HASVALUE, [EX.one]),
+                               SANode(Op.HASVALUE, [EX.two])]),
+        SANode(Op.CHILDRANGE, [Literal(0), Literal(0), SANode(Op.HASVALUE, [EX.one]),
+                               SANode(Op.HASVALUE, [EX.two])])])),
+    (0, 1, SANode(Op.CHILDRANGE, [Literal(2), None, SANode(Op.HASVALUE, [EX.one]),
+                                  SANode(Op.HASVALUE, [EX.two])])),
+    (0, None, SANode(Op.BOT, [])),
+])
+def test_negation_normal_form_of_childrange(lower, upper, expected):
+    # the children are kept (in negation normal form), only the range is negated
+    tree = SANode(Op.NOT, [SANode(Op.CHILDRANGE, [
+        Literal(lower), None if upper is None else Literal(upper),
+        SANode(Op.HASVALUE, [EX.one]),
+        SANode(Op.NOT, [SANode(Op.NOT, [SANode(Op.HASVALUE, [EX.two])])])])])
+
+    nnf = negation_normal_form(tree)
+    assert nnf == expected
+    if nnf.op == Op.OR:  # the ranges share the children
+        assert nnf.children[0].children[2] is nnf.children[1].children[2]
+
+
+def test_normalize_negates_childrange():
+    definitions = {
+        EX.a: SANode(Op.NOT, [SANode(Op.CHILDRANGE, [
+            Literal(1), Literal(2), SANode(Op.HASSHAPE, [EX.b]),
+            SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASVALUE, [EX.two])])]),
+        EX.b: SANode(Op.NOT, [SANode(Op.HASVALUE, [EX.three])])}
+
+    expanded = expand_shape(definitions, SANode(Op.HASSHAPE, [EX.a]))
+    assert normalize(definitions, EX.a) == clean_parsetree(negation_normal_form(expanded))
+    assert normalize(definitions, EX.a).children[1] == SANode(Op.CHILDRANGE, [
+        Literal(0), Literal(0), SANode(Op.NOT, [SANode(Op.HASVALUE, [EX.three])]),
+        SANode(Op.HASVALUE, [EX.one]), SANode(Op.HASVALUE, [EX.two])])
+
+
+def test_normalize_simplifies_negated_in():
+    definitions = {EX.a: SANode(Op.NOT, [SANode(Op.IN, [frozenset()])]),
+                   EX.b: SANode(Op.NOT, [SANode(Op.IN, [frozenset([EX.one, EX.two])])])}
+
+    for shapename in definitions:
+        expanded = expand_shape(definitions, SANode(Op.HASSHAPE, [shapename]))
+        assert normalize(definitions, shapename) == clean_parsetree(negation_normal_form(expanded))
+    assert normalize(definitions, EX.a) == SANode(Op.TOP, [])
+    assert negation_normal_form(definitions[EX.b]) == definitions[EX.b]
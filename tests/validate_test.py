@@ -0,0 +1,65 @@
+from pytest import mark
+
+from rdflib import Graph, Namespace, Literal
+
+from slsparser.shapels import parse
+from slsparser.validate import validate
+from slsparser import pool
+
+EX = Namespace('http://ex.tt/')
+
+SHAPES = """
+    @prefix ex: <http://ex.tt/> .
+    @prefix sh: <http://www.w3.org/ns/shacl#> .
+    ex:PersonShape a sh:NodeShape ;
+        sh:targetClass ex:Person ;
+        sh:property [ sh:path ex:name ; sh:minCount 1 ] ;
+        sh:property [ sh:path ex:knows ; sh:node ex:PersonShape ] .
+    ex:NameShape a sh:NodeShape ;
+        sh:targetObjectsOf ex:name ;
+        sh:nodeKind sh:Literal .
+"""
+
+DATA = """
+    @prefix ex: <http://ex.tt/> .
+    ex:alice a ex:Person ; ex:name "Alice" ; ex:knows ex:bob .
+    ex:bob a ex:Person ; ex:name ex:bobsName ; ex:knows ex:alice .
+    ex:carol a ex:Person ; ex:knows ex:alice .
+    ex:dave a ex:Person ; ex:name "Dave" ; ex:knows ex:carol .
+"""
+
+EXPECTED = {
+    (EX.PersonShape, EX.alice, True),
+    (EX.PersonShape, EX.bob, True),
+    (EX.PersonShape, EX.carol, False),
+    (EX.PersonShape, EX.dave, False),
+    (EX.NameShape, EX.bobsName, False),
+    (EX.NameShape, Literal('Alice'), True),
+    (EX.NameShape, Literal('Dave'), True),
+}
+
+
+def _graphs():
+    shapes, data = Graph(), Graph()
+    shapes.parse(data=SHAPES, format='turtle')
+    data.parse(data=DATA, format='turtle')
+    return shapes, data
+
+
+@mark.parametrize('workers, fork', [(None, True), (2, True), (2, False)])
+def test_validate(workers, fork, monkeypatch):
+    # without fork, the workers evaluate a shipped copy of the data graph
+    monkeypatch.setattr(pool, 'FORK', fork)
+    shapes, data = _graphs()
+    definitions, target = parse(shapes)
+    results = list(validate(data, definitions, target, workers=workers, chunk_size=1))
+    assert len(results) == len(EXPECTED)
+    assert set(results) == EXPECTED
+
+
+def test_validate_streams_results():
+    shapes, data = _graphs()
+    definitions, target = parse(shapes)
+    results = validate(data, definitions, target, workers=2)
+    assert next(results) in EXPECTED
+    results.close()  # shuts the pool down